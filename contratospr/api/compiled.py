@@ -0,0 +1,277 @@
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PKOnlyObject, RelatedField
+
+OWNER_COLUMN = "compiled_owner_id"
+
+
+class CompileError(Exception):
+    """Raised when a serializer can't be rendered from values() rows."""
+
+
+class CompiledRow(dict):
+    """
+    A values() row with attribute access, passed to serializer method fields in
+    place of a model instance.
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def get_model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+class SerializerPlan:
+    """
+    Rendering plan for one serializer over the rows of a values() query.
+
+    Nested serializers for foreign keys add their columns to the same query
+    under a lookup prefix, while to-many relations are fetched with one extra
+    query each and grouped by owner. Fields reuse their own
+    `to_representation()`, so the output matches the serializer exactly.
+    """
+
+    def __init__(self, serializer, model, prefix="", root=None, annotations=()):
+        self.serializer = serializer
+        self.model = model
+        self.prefix = prefix
+        self.root = root or self
+        self.columns = []
+        self.relations = []
+        self.renderers = []
+        self.pk_column = self.add_column(model._meta.pk.attname)
+        self.compile(annotations)
+
+    def add_column(self, name):
+        column = f"{self.prefix}{name}"
+
+        if column not in self.root.columns:
+            self.root.columns.append(column)
+
+        return column
+
+    def compile(self, annotations):
+        for field_name, field in self.serializer.fields.items():
+            if field.write_only:
+                continue
+
+            self.renderers.append((field_name, self.compile_field(field, annotations)))
+
+    def compile_field(self, field, annotations):
+        if isinstance(field, serializers.SerializerMethodField):
+            return self.render_method(field)
+
+        if field.source == "*" or len(field.source_attrs) != 1:
+            raise CompileError(f"Unsupported source for field {field.field_name!r}")
+
+        source = field.source
+        model_field = get_model_field(self.model, source)
+
+        if isinstance(field, serializers.ListSerializer):
+            relation = self.add_relation(model_field, field)
+            return self.render_many(relation, relation.plan.render)
+
+        if isinstance(field, ManyRelatedField):
+            relation = self.add_relation(model_field, field)
+            child = field.child_relation.to_representation
+            return self.render_many(relation, lambda row: child(PKOnlyObject(row)))
+
+        if isinstance(field, (serializers.BaseSerializer, RelatedField)):
+            if model_field is None or not model_field.many_to_one:
+                raise CompileError(f"Unsupported relation {source!r}")
+
+            fk_column = self.add_column(model_field.attname)
+
+            if isinstance(field, RelatedField):
+                if not field.use_pk_only_optimization():
+                    raise CompileError(f"Unsupported related field {source!r}")
+
+                to_representation = field.to_representation
+                return self.render_value(
+                    fk_column, lambda value: to_representation(PKOnlyObject(value))
+                )
+
+            plan = SerializerPlan(
+                field,
+                model_field.related_model,
+                prefix=f"{self.prefix}{source}__",
+                root=self.root,
+            )
+            return self.render_nested(fk_column, plan)
+
+        if model_field is not None and model_field.concrete:
+            if model_field.is_relation:
+                raise CompileError(f"Unsupported relation {source!r}")
+
+            column = self.add_column(model_field.attname)
+            return self.render_value(column, field.to_representation)
+
+        if source in annotations:
+            return self.render_value(self.add_column(source), field.to_representation)
+
+        # Missing attributes render as null, like Field.get_attribute() does
+        if field.default is serializers.empty and field.allow_null:
+            return lambda row: None
+
+        raise CompileError(f"Unsupported field {field.field_name!r}")
+
+    def add_relation(self, model_field, field):
+        if model_field is None or not (
+            model_field.one_to_many or model_field.many_to_many
+        ):
+            raise CompileError(f"Unsupported relation {field.source!r}")
+
+        if model_field.auto_created:
+            lookup = model_field.field.name
+        else:
+            lookup = model_field.related_query_name()
+
+        plan = None
+
+        if isinstance(field, serializers.ListSerializer):
+            plan = SerializerPlan(field.child, model_field.related_model)
+
+        relation = RelatedRows(
+            model_field.related_model,
+            lookup,
+            self.pk_column,
+            plan=plan,
+            list_serializer=field if plan else None,
+        )
+        self.root.relations.append(relation)
+        return relation
+
+    def render_value(self, column, to_representation):
+        def render(row):
+            value = row[column]
+            return None if value is None else to_representation(value)
+
+        return render
+
+    def render_nested(self, fk_column, plan):
+        def render(row):
+            return None if row[fk_column] is None else plan.render(row)
+
+        return render
+
+    def render_many(self, relation, render_item):
+        pk_column = self.pk_column
+        rows_by_owner = relation.rows_by_owner
+
+        def render(row):
+            return [render_item(item) for item in rows_by_owner.get(row[pk_column], [])]
+
+        return render
+
+    def render_method(self, field):
+        prefix = self.prefix
+        pk_column = self.pk_column
+
+        def render(row):
+            obj = CompiledRow(
+                (column[len(prefix) :], value)
+                for column, value in row.items()
+                if column.startswith(prefix)
+            )
+            obj["pk"] = row[pk_column]
+            return field.to_representation(obj)
+
+        return render
+
+    def fetch_relations(self, rows):
+        for relation in self.relations:
+            relation.fetch(rows)
+
+    def render(self, row):
+        return {field_name: render(row) for field_name, render in self.renderers}
+
+
+class RelatedRows:
+    """Rows of a to-many relation, fetched with a single query."""
+
+    def __init__(self, model, lookup, owner_column, plan=None, list_serializer=None):
+        self.model = model
+        self.lookup = lookup
+        self.owner_column = owner_column
+        self.plan = plan
+        self.list_serializer = list_serializer
+        self.rows_by_owner = {}
+
+    def fetch(self, owner_rows):
+        owner_ids = {row[self.owner_column] for row in owner_rows}
+        owner_ids.discard(None)
+        rows_by_owner = defaultdict(list)
+
+        if owner_ids:
+            queryset = self.model._default_manager.filter(
+                **{f"{self.lookup}__in": owner_ids}
+            )
+
+            if self.plan:
+                columns = self.plan.columns
+            else:
+                columns = [self.model._meta.pk.attname]
+
+            rows = list(queryset.values(*columns, **{OWNER_COLUMN: F(self.lookup)}))
+
+            for row in rows:
+                owner_id = row.pop(OWNER_COLUMN)
+                rows_by_owner[owner_id].append(row if self.plan else row[columns[0]])
+
+            if self.plan:
+                self.plan.fetch_relations(rows)
+                prime_list_serializer(self.list_serializer, self.plan, rows)
+
+        self.rows_by_owner.clear()
+        self.rows_by_owner.update(rows_by_owner)
+
+
+def prime_list_serializer(list_serializer, plan, rows):
+    prime = getattr(list_serializer, "prime", None)
+
+    if prime is not None:
+        prime(row[plan.pk_column] for row in rows)
+
+
+class CompiledSerializer:
+    """
+    Read-only rendering of `serializer` (a `many=True` model serializer) from
+    `values()` rows instead of model instances.
+
+    Call `get_queryset()` for the rows to fetch and `render()` with the rows
+    of the page to get the same data the serializer would return.
+    Raises `CompileError` for fields that can't be compiled.
+    """
+
+    def __init__(self, serializer, queryset):
+        self.serializer = serializer
+        self.queryset = queryset
+        self.plan = SerializerPlan(
+            serializer.child, queryset.model, annotations=queryset.query.annotations,
+        )
+
+    def get_queryset(self, extra_columns=()):
+        # Extra columns, like the ones pagination needs, aren't rendered
+        columns = self.plan.columns + [
+            column for column in extra_columns if column not in self.plan.columns
+        ]
+        return (
+            self.queryset.select_related(None).prefetch_related(None).values(*columns)
+        )
+
+    def render(self, rows):
+        rows = list(rows)
+        self.plan.fetch_relations(rows)
+        prime_list_serializer(self.serializer, self.plan, rows)
+        return [self.plan.render(row) for row in rows]
@@ -0,0 +1,167 @@
+import contextvars
+import csv
+import datetime
+import zlib
+from collections import defaultdict
+
+import orjson
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from ..contracts.models import Contract
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Output column and the values() lookup it's read from
+EXPORT_FIELDS = [
+    ("id", "id"),
+    ("slug", "slug"),
+    ("source_id", "source_id"),
+    ("number", "number"),
+    ("amendment", "amendment"),
+    ("parent_id", "parent_id"),
+    ("date_of_grant", "date_of_grant"),
+    ("effective_date_from", "effective_date_from"),
+    ("effective_date_to", "effective_date_to"),
+    ("cancellation_date", "cancellation_date"),
+    ("amount_to_pay", "amount_to_pay"),
+    ("has_amendments", "has_amendments"),
+    ("exempt_id", "exempt_id"),
+    ("entity_id", "entity_id"),
+    ("entity_name", "entity__name"),
+    ("service_id", "service_id"),
+    ("service_name", "service__name"),
+    ("service_group_id", "service__group_id"),
+    ("service_group_name", "service__group__name"),
+    ("document_url", "document__source_url"),
+]
+
+
+def iter_chunks(iterable, size):
+    chunk = []
+
+    for item in iterable:
+        chunk.append(item)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def get_contractors(contract_ids):
+    contractors = defaultdict(list)
+    rows = (
+        Contract.contractors.through.objects.filter(contract_id__in=contract_ids)
+        .order_by("contractor__name")
+        .values_list("contract_id", "contractor_id", "contractor__name")
+    )
+
+    for contract_id, contractor_id, name in rows:
+        contractors[contract_id].append({"id": contractor_id, "name": name})
+
+    return contractors
+
+
+def iter_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield chunks of contract rows, reading contracts with a server-side cursor
+    and their contractors with one query per chunk, so memory use doesn't
+    grow with the number of contracts.
+    """
+    rows = (
+        queryset.select_related(None)
+        .prefetch_related(None)
+        .values(*[lookup for _, lookup in EXPORT_FIELDS])
+        .iterator(chunk_size=chunk_size)
+    )
+
+    for chunk in iter_chunks(rows, chunk_size):
+        contractors = get_contractors([row["id"] for row in chunk])
+
+        yield [
+            dict(
+                [(column, row[lookup]) for column, lookup in EXPORT_FIELDS],
+                contractors=contractors.get(row["id"], []),
+            )
+            for row in chunk
+        ]
+
+
+class Echo:
+    """File-like object that returns what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def format_csv_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+
+    return value
+
+
+def iter_csv(queryset):
+    writer = csv.writer(Echo())
+    columns = [column for column, _ in EXPORT_FIELDS]
+    yield writer.writerow(columns + ["contractor_ids", "contractor_names"])
+
+    for chunk in iter_export_rows(queryset):
+        lines = []
+
+        for row in chunk:
+            contractors = row.pop("contractors")
+            values = [format_csv_value(value) for value in row.values()]
+            values.append("|".join(str(contractor["id"]) for contractor in contractors))
+            values.append("|".join(contractor["name"] for contractor in contractors))
+            lines.append(writer.writerow(values))
+
+        yield "".join(lines)
+
+
+def iter_jsonl_gzip(queryset):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    encoder = JSONEncoder()
+    options = orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE
+
+    for chunk in iter_export_rows(queryset):
+        lines = b"".join(
+            orjson.dumps(row, default=encoder.default, option=options) for row in chunk
+        )
+        compressed = compressor.compress(lines)
+
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv; charset=utf-8", "contracts.csv"),
+    "jsonl": (iter_jsonl_gzip, "application/gzip", "contracts.jsonl.gz"),
+}
+
+
+def iter_in_context(iterable, context):
+    """
+    Iterate in `context`, like a copy of the request's, so that content
+    streamed after the view returned keeps its database routing.
+    """
+    iterator = iter(iterable)
+
+    while True:
+        try:
+            yield context.run(next, iterator)
+        except StopIteration:
+            return
+
+
+def export_contracts(queryset, export_format):
+    iter_content, content_type, filename = EXPORT_FORMATS[export_format]
+    content = iter_in_context(iter_content(queryset), contextvars.copy_context())
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -1,10 +1,10 @@
-from django.contrib.postgres.search import SearchQuery
 from django.db.models import Count, F, Q, Sum
 from django.template import loader
 from django_filters import rest_framework as django_filters
 from rest_framework.filters import BaseFilterBackend, OrderingFilter
 
 from ..contracts.models import Contract, Contractor, Entity, Service, ServiceGroup
+from ..contracts.search import get_search_backend, search_contract_ids
 
 
 class SimpleDjangoFilterBackend(django_filters.DjangoFilterBackend):
@@ -26,7 +26,14 @@ class SearchQueryFilter(BaseFilterBackend):
         if not search_term:
             return queryset
 
-        return queryset.filter(search_vector=SearchQuery(search_term))
+        contract_ids = search_contract_ids(search_term)
+
+        if contract_ids is None:
+            return get_search_backend().filter(queryset, search_term)
+
+        # Other filters run against the cached matches instead of repeating
+        # the full text search
+        return queryset.filter(pk__in=contract_ids)
 
     def to_html(self, request, queryset, view):
         search_term = self.get_search_term(request) or ""
@@ -0,0 +1,52 @@
+from django.db.models import F
+
+from ..contracts.models import Entity
+
+CONTRACTOR_ENTITIES_LOADER = "contractor_entities_loader"
+
+
+class ContractorEntitiesLoader:
+    """
+    Batch loads the entities each contractor has contracts with.
+
+    Contractor ids are primed while walking a page of results and all pending
+    ids are resolved with a single query the first time one is loaded.
+    """
+
+    def __init__(self):
+        self.pending = set()
+        self.results = {}
+
+    def prime(self, contractor_ids):
+        self.pending.update(pk for pk in contractor_ids if pk not in self.results)
+
+    def load(self, contractor_id):
+        if contractor_id not in self.results:
+            self.prime([contractor_id])
+            self.fetch()
+
+        return self.results[contractor_id]
+
+    def fetch(self):
+        contractor_ids, self.pending = self.pending, set()
+
+        for contractor_id in contractor_ids:
+            self.results[contractor_id] = []
+
+        entities = (
+            Entity.objects.filter(contract__contractors__in=contractor_ids)
+            .annotate(contractor_id=F("contract__contractors"))
+            .distinct()
+        )
+
+        for entity in entities:
+            self.results[entity.contractor_id].append(entity)
+
+
+def get_contractor_entities_loader(context):
+    # Nested serializers share the root serializer's context, so a single
+    # loader serves every contractor rendered in a response.
+    if CONTRACTOR_ENTITIES_LOADER not in context:
+        context[CONTRACTOR_ENTITIES_LOADER] = ContractorEntitiesLoader()
+
+    return context[CONTRACTOR_ENTITIES_LOADER]
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ...compiled import CompiledSerializer
+from ...viewsets import ContractorViewSet, ContractViewSet
+
+BENCHMARK_VIEWSETS = {
+    "contracts": (ContractViewSet, "/v1/contracts/"),
+    "contractors": (ContractorViewSet, "/v1/contractors/"),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare rendering list pages with the regular and compiled serializers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", nargs="?", type=int, default=100)
+        parser.add_argument("--iterations", nargs="?", type=int, default=10)
+        parser.add_argument("--host", nargs="?", type=str, default="localhost")
+
+    def handle(self, *args, **options):
+        for name, (viewset_class, path) in BENCHMARK_VIEWSETS.items():
+            view = self.get_view(viewset_class, path, options["host"])
+            queryset = view.filter_queryset(view.get_queryset())
+            page_size = options["page_size"]
+
+            def render_regular():
+                rows = list(queryset[:page_size])
+                data = view.get_serializer(rows, many=True).data
+                return JSONRenderer().render(data)
+
+            def render_compiled():
+                serializer = CompiledSerializer(
+                    view.get_serializer(many=True), queryset
+                )
+                rows = serializer.get_queryset()[:page_size]
+                return JSONRenderer().render(serializer.render(rows))
+
+            if render_regular() != render_compiled():
+                self.stderr.write(f"{name}: compiled output differs")
+
+            regular = self.measure(render_regular, options["iterations"])
+            compiled = self.measure(render_compiled, options["iterations"])
+            self.stdout.write(
+                f"{name}: regular {regular * 1000:.1f}ms, "
+                f"compiled {compiled * 1000:.1f}ms, "
+                f"{regular / compiled:.1f}x faster"
+            )
+
+    def get_view(self, viewset_class, path, host):
+        request = APIRequestFactory().get(path, HTTP_HOST=host)
+        view = viewset_class(action="list", format_kwarg=None)
+        view.request = Request(request)
+        return view
+
+    def measure(self, render, iterations):
+        # Best of `iterations` runs, database time included
+        timings = []
+
+        for _ in range(iterations):
+            start = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - start)
+
+        return min(timings)
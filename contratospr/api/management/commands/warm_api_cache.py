@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...tasks import warm_api_cache
+
+
+class Command(BaseCommand):
+    help = "Pre-render the home, trends and list pages into the API cache"
+
+    def handle(self, *args, **options):
+        warmed = warm_api_cache()
+        self.stdout.write(f"Warmed {warmed} API responses")
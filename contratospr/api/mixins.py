@@ -1,45 +1,481 @@
 import hashlib
+import math
+import random
+import time
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
 from django.utils.encoding import iri_to_uri
+from django.utils.http import http_date
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.response import Response
 
-CACHE_PREFIX = "views.cache"
+from ..contracts.search import search_contract_results
+from ..contracts.versions import get_data_version
+from ..utils.compression import (
+    compress_variants,
+    get_content_encoding,
+    set_compressed_content,
+)
+from ..utils.routers import may_read_stale_data, use_replica
+from .compiled import CompiledSerializer, CompileError
+from .pagination import (
+    KeysetPagination,
+    PageNumberPagination,
+    SearchResultList,
+    use_keyset_pagination,
+)
+
+CACHE_PREFIX = "views.response"
+CACHE_LOCK_PREFIX = "views.lock"
+CACHE_WAIT_INTERVAL = 0.05
 CACHE_HEADER_LIST = ["Accept", "Content-Type"]
 
 
-def get_cache_key(request):
+def normalize_accept(value):
+    """
+    Reduce the Accept header to the representation it negotiates, so that
+    clients sending different but equivalent headers share cache entries.
+    """
+    if not value:
+        return "application/json"
+
+    if value.startswith("text/html"):
+        return "text/html"
+
+    if "text/html" not in value and ("application/json" in value or "*/*" in value):
+        return "application/json"
+
+    return value
+
+
+def get_cache_key(request, version=None):
     headers_hash = hashlib.md5()
     for header in CACHE_HEADER_LIST:
         value = request.headers.get(header)
+        if header == "Accept":
+            value = normalize_accept(value)
         if value is not None:
             headers_hash.update(value.encode())
 
     uri = iri_to_uri(request.build_absolute_uri())
     hash_key = f"{request.method}.{uri}"
     request_hash = hashlib.md5(hash_key.encode())
-    return f"{CACHE_PREFIX}.{headers_hash.hexdigest()}.{request_hash.hexdigest()}"
+    cache_key = f"{CACHE_PREFIX}.{headers_hash.hexdigest()}.{request_hash.hexdigest()}"
+
+    # Entries cached for older versions of the data become unreachable
+    if version is not None:
+        cache_key = f"{cache_key}.{version!r}"
 
+    return cache_key
 
-def cache_response(response, cache_key):
+
+def cache_response(response, cache_key, started_at):
     """
+    Cache the rendered body and headers, so cache hits don't unpickle and
+    render the response again. The body is also stored compressed with each
+    supported encoding, so cache hits aren't compressed either. The time it
+    took to compute the response is kept for early refreshes, see
+    `should_refresh()`.
+
     Note: It's important to return `None` here to avoid
     changing return value of .render()
     """
-    cache.set(cache_key, response, settings.API_CACHE_TIMEOUT)
+    now = time.time()
+    expires_at = now + settings.API_CACHE_TIMEOUT
+    cached = (
+        response.content,
+        list(response.items()),
+        expires_at,
+        now - started_at,
+        compress_variants(response.content),
+    )
+    cache.set(cache_key, cached, settings.API_CACHE_TIMEOUT)
     return None
 
 
-class CachedAPIViewMixin:
+def get_cached_response(cached, request):
+    content, headers = cached[:2]
+    variants = cached[4] if len(cached) > 4 else {}
+    response = HttpResponse(content)
+
+    for header, value in headers:
+        response[header] = value
+
+    if variants:
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = get_content_encoding(request, available=variants)
+
+        if encoding:
+            set_compressed_content(response, variants[encoding], encoding)
+
+    return response
+
+
+def should_refresh(cached, beta=1.0):
+    """
+    Probabilistic early expiration (XFetch). The closer an entry is to
+    expiring, and the longer it took to compute, the likelier a request is
+    to recompute it ahead of time. That way hot entries are refreshed by a
+    single request instead of all of them missing at once.
+    """
+    expires_at, delta = cached[2:4]
+    return time.time() - delta * beta * math.log(1 - random.random()) >= expires_at
+
+
+def wait_for_cache(cache_key, timeout):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        time.sleep(CACHE_WAIT_INTERVAL)
+        cached = cache.get(cache_key)
+
+        if cached:
+            return cached
+
+    return None
+
+
+class DataVersionMixin:
+    """
+    Views list the data they depend on in `data_resources`, see
+    `contratospr.contracts.versions`.
+    """
+
+    data_resources = ()
+
+    def get_data_version(self):
+        if not self.data_resources:
+            return None
+
+        if not hasattr(self, "_data_version"):
+            self._data_version = get_data_version(self.data_resources)
+
+        return self._data_version
+
+    def reflects_data_version(self):
+        """
+        Whether responses are known to reflect the current data version, so
+        they can be cached and validated by it.
+        """
+        return True
+
+
+class ReplicaReadMixin(DataVersionMixin):
+    """
+    Read from the database replicas, if there are any.
+
+    Until the replica has replayed the latest changes, as of its last lag
+    measurement, responses aren't cached or validated by the data version,
+    which might be newer than the data they were computed from.
+    """
+
     def dispatch(self, request, *args, **kwargs):
-        cache_key = get_cache_key(request)
-        response = cache.get(cache_key)
-        if response:
-            return response
+        with use_replica(bool(settings.DATABASE_REPLICAS)):
+            return super().dispatch(request, *args, **kwargs)
+
+    def reflects_data_version(self):
+        return not may_read_stale_data(self.get_data_version())
+
+
+class ConditionalGetMixin(DataVersionMixin):
+    """
+    Add ETag and Last-Modified headers derived from the version of the data a
+    view depends on, and answer matching conditional requests with a 304
+    before the view runs.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        version = self.get_data_version()
+
+        if version is None or request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+
+        if not self.reflects_data_version():
+            return super().dispatch(request, *args, **kwargs)
+
+        # Weak, since compressed and uncompressed bodies share the same ETag
+        etag_hash = hashlib.md5(get_cache_key(request, version).encode())
+        etag = f"W/{quote_etag(etag_hash.hexdigest())}"
+        last_modified = math.ceil(version)
+
+        # HTTP dates are whole seconds, so a later change within the same
+        # second would look unmodified. Leave the date out until it's over.
+        if time.time() < last_modified:
+            last_modified = None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+
+        return response
+
+
+class CachedAPIViewMixin(DataVersionMixin):
+    """
+    Cache rendered responses, computing each one in a single request at a
+    time. Concurrent requests get the response cached for the previous data
+    version if there is one, or wait for it to be computed.
+    """
+
+    # Viewset actions whose responses are never cached, like streamed ones
+    cache_exempt_actions = []
+
+    def is_cache_exempt(self, request):
+        action_map = getattr(self, "action_map", None) or {}
+        return action_map.get(request.method.lower()) in self.cache_exempt_actions
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.is_cache_exempt(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        version = self.get_data_version()
+        cache_key = get_cache_key(request, version)
+        cached = cache.get(cache_key)
 
-        response = super().dispatch(request, *args, **kwargs)
+        # Responses already cached for the version, like warmed ones, reflect
+        # it. Those computed from data that might not aren't cached.
+        if not self.reflects_data_version():
+            if cached:
+                return get_cached_response(cached, request)
 
-        if response.status_code == 200:
-            response.add_post_render_callback(lambda r: cache_response(r, cache_key))
+            return super().dispatch(request, *args, **kwargs)
+
+        if cached and not should_refresh(cached):
+            return get_cached_response(cached, request)
+
+        lock_key = f"{CACHE_LOCK_PREFIX}.{cache_key}"
+
+        if not cache.add(lock_key, True, settings.API_CACHE_LOCK_TIMEOUT):
+            cached = cached or self.get_stale_cache(request, version)
+
+            if not cached:
+                cached = wait_for_cache(cache_key, settings.API_CACHE_LOCK_WAIT)
+
+            if cached:
+                return get_cached_response(cached, request)
+
+        started_at = time.time()
+
+        # Whatever happens, release the lock, so that other requests don't
+        # wait for a response that will never be cached
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+
+            if response.status_code == 200 and isinstance(response, Response):
+                # Rendered here instead of by the handler, so that the lock
+                # is still held
+                response.render()
+                self.finalize_cache(response, request, version, started_at)
+        finally:
+            cache.delete(lock_key)
 
         return response
+
+    def finalize_cache(self, response, request, version, started_at):
+        cache_response(response, get_cache_key(request, version), started_at)
+
+        # Remember the latest version cached for the request, so that it can
+        # be served while the response for a newer one is computed
+        if version is not None:
+            latest_key = get_cache_key(request)
+            cache.set(latest_key, version, settings.API_CACHE_TIMEOUT)
+
+    def get_stale_cache(self, request, version):
+        latest_version = cache.get(get_cache_key(request))
+
+        if version is None or latest_version in (None, version):
+            return None
+
+        return cache.get(get_cache_key(request, latest_version))
+
+
+class KeysetPaginationMixin:
+    """
+    Switch to keyset pagination when the request includes a `cursor` parameter.
+    """
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and use_keyset_pagination(self.request):
+            self._paginator = KeysetPagination()
+
+        return super().paginator
+
+
+class CompiledListMixin:
+    """
+    Render list responses from `values()` rows with a compiled serializer,
+    falling back to the regular serializer when it can't be compiled.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        try:
+            serializer = CompiledSerializer(self.get_serializer(many=True), queryset)
+        except CompileError:
+            return super().list(request, *args, **kwargs)
+
+        rows = serializer.get_queryset(self.get_pagination_columns(queryset))
+        page = self.paginate_queryset(rows)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.render(page))
+
+        return Response(serializer.render(rows))
+
+    def get_pagination_columns(self, queryset):
+        # Keyset cursors are built from the ordering column of the page's rows
+        if not isinstance(self.paginator, KeysetPagination):
+            return []
+
+        field = self.paginator.get_ordering(self.request, queryset, self).lstrip("-")
+        return ["id" if field == "pk" else field]
+
+
+class SearchResultsMixin:
+    """
+    Page through the cached results of a contract search when the request has
+    no other filters, instead of filtering, ordering and counting the matches
+    again.
+    """
+
+    search_param = "search"
+    # Parameters that don't change which results are listed or their order
+    search_result_params = {
+        "search",
+        "ordering",
+        "page",
+        "page_size",
+        "fields",
+        "expand",
+        "format",
+        "facets",
+    }
+
+    def list(self, request, *args, **kwargs):
+        self.search_results = self.get_search_results(request)
+
+        try:
+            return super().list(request, *args, **kwargs)
+        finally:
+            self.search_results = None
+
+    def get_search_results(self, request):
+        query = request.query_params.get(self.search_param)
+
+        if not query or not set(request.query_params) <= self.search_result_params:
+            return None
+
+        if not isinstance(self.paginator, PageNumberPagination):
+            return None
+
+        ordering = self.get_search_ordering(request)
+
+        if ordering is None:
+            return None
+
+        return search_contract_results(query, ordering), query, ordering
+
+    def get_search_ordering(self, request):
+        for backend in self.filter_backends:
+            if issubclass(backend, OrderingFilter):
+                queryset = self.get_queryset()
+                ordering = backend().get_ordering(request, queryset, self)
+
+                # Results are cached for one field at a time
+                return ordering[0] if ordering and len(ordering) == 1 else None
+
+        return None
+
+    def filter_queryset(self, queryset):
+        # The cached results are the filtered and ordered matches
+        if getattr(self, "search_results", None):
+            return queryset
+
+        return super().filter_queryset(queryset)
+
+    def paginate_queryset(self, queryset):
+        if getattr(self, "search_results", None):
+            results, query, ordering = self.search_results
+            queryset = SearchResultList(results, queryset, query, ordering)
+
+        return super().paginate_queryset(queryset)
+
+    def get_pagination_columns(self, queryset):
+        columns = super().get_pagination_columns(queryset)
+
+        # Rows are matched to the cached ids
+        if getattr(self, "search_results", None):
+            columns = [*columns, "id"]
+
+        return columns
+
+
+class BatchRetrieveMixin:
+    """
+    Retrieve up to `batch_max_size` objects in one request, by `?ids=` or
+    `?slugs=` separated by commas. Results follow the requested order and
+    leave out ids or slugs that don't exist.
+    """
+
+    batch_max_size = 100
+    batch_params = {"ids": "pk", "slugs": "slug"}
+
+    @action(detail=False)
+    def batch(self, request):
+        lookup, values = self.get_batch_values(request)
+        queryset = self.get_queryset().filter(**{f"{lookup}__in": values})
+        objects = {getattr(obj, lookup): obj for obj in queryset}
+        results = [objects[value] for value in values if value in objects]
+        serializer = self.get_serializer(results, many=True)
+        return Response({"results": serializer.data})
+
+    def get_batch_values(self, request):
+        params = [param for param in self.batch_params if param in request.query_params]
+
+        if len(params) != 1:
+            raise ValidationError(
+                {"detail": f"Pass exactly one of: {', '.join(self.batch_params)}"}
+            )
+
+        param = params[0]
+        lookup = self.batch_params[param]
+        values = request.query_params[param].split(",")
+        values = list(dict.fromkeys(value.strip() for value in values if value.strip()))
+
+        if not values:
+            raise ValidationError({param: "This field may not be blank."})
+
+        if len(values) > self.batch_max_size:
+            raise ValidationError(
+                {param: f"Ensure there are no more than {self.batch_max_size} values."}
+            )
+
+        if lookup == "pk":
+            try:
+                values = [int(value) for value in values]
+            except ValueError:
+                raise ValidationError({param: "Ids must be integers."})
+        else:
+            try:
+                self.get_queryset().model._meta.get_field(lookup)
+            except FieldDoesNotExist:
+                raise ValidationError({param: f"Lookup by {param} isn't supported."})
+
+        return lookup, values
@@ -1,7 +1,192 @@
+import base64
+import binascii
+import datetime
+import decimal
+import hashlib
+import json
 from collections import OrderedDict
+from urllib.parse import urlencode
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from ..contracts.search import get_search_backend, get_search_order_by
+
+COUNT_CACHE_PREFIX = "views.count"
+COUNT_CACHE_IGNORED_PARAMS = [
+    "page",
+    "page_size",
+    "ordering",
+    "cursor",
+    "format",
+    "fields",
+    "expand",
+]
+
+
+def get_count_cache_key(request, version=None):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        if key not in COUNT_CACHE_IGNORED_PARAMS
+        for value in values
+    )
+    request_hash = hashlib.md5(f"{request.path}?{urlencode(params)}".encode())
+    cache_key = f"{COUNT_CACHE_PREFIX}.{request_hash.hexdigest()}"
+
+    if version is not None:
+        cache_key = f"{cache_key}.{version!r}"
+
+    return cache_key
+
+
+def estimate_count(queryset):
+    """
+    Return the planner's row estimate for `queryset`, or `None` when the
+    database can't provide one.
+    """
+    connection = connections[queryset.db]
+
+    if connection.vendor != "postgresql":
+        return None
+
+    sql, params = queryset.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that caches counts and falls back to the planner's estimate for
+    large result sets, instead of running an exact COUNT on every request.
+
+    Estimates can be off in either direction, so they don't reject pages:
+    pages past an estimate are served while they have rows, and the count
+    is corrected with the rows each page sees.
+    """
+
+    def __init__(self, *args, cache_key=None, estimate_threshold=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.estimate_threshold = estimate_threshold
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        cached = cache.get(self.cache_key) if self.cache_key else None
+
+        if cached is None:
+            cached = self.get_count()
+
+            if self.cache_key:
+                count, exact = cached
+                timeout = settings.API_CACHE_TIMEOUT
+
+                # The data version doesn't change as the planner's
+                # statistics do, so estimates are refreshed sooner
+                if not exact:
+                    timeout = settings.API_COUNT_ESTIMATE_TIMEOUT
+
+                cache.set(self.cache_key, cached, timeout)
+
+        count, self.count_exact = cached
+        return count
+
+    def get_count(self):
+        if self.estimate_threshold and hasattr(self.object_list, "query"):
+            estimate = estimate_count(self.object_list)
+
+            if estimate is not None and estimate > self.estimate_threshold:
+                return estimate, False
+
+        return super().count, True
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # `page` checks for rows past an estimate instead
+            if self.count_exact or int(number) < 1:
+                raise
+
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+
+        if self.count_exact:
+            return super().page(number)
+
+        bottom = (number - 1) * self.per_page
+        # One more row than the page tells whether there's a next page
+        object_list = list(self.object_list[bottom : bottom + self.per_page + 1])
+
+        if not object_list and number > 1:
+            raise EmptyPage("That page contains no results")
+
+        if len(object_list) > self.per_page:
+            self.set_count(max(self.count, bottom + len(object_list)), False)
+        else:
+            # The last page, so the count of everything is known
+            self.set_count(bottom + len(object_list), True)
+
+        return self._get_page(object_list[: self.per_page], number, self)
+
+    def set_count(self, count, exact):
+        self.__dict__["count"] = count
+        self.__dict__.pop("num_pages", None)
+        self.count_exact = exact
+
+
+class SearchResultList:
+    """
+    The rows of cached search results, fetched by id a page at a time, so that
+    the matches aren't searched, ordered or counted again for every page.
+    Pages past the cached ids run the search.
+    """
+
+    def __init__(self, results, queryset, search_query, ordering):
+        self.results = results
+        self.queryset = queryset
+        self.search_query = search_query
+        self.ordering = ordering
+
+    def count(self):
+        return self.results.count
+
+    def __len__(self):
+        return self.results.count
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+
+        start, stop, _ = index.indices(self.results.count)
+
+        if stop > len(self.results.ids):
+            matches = get_search_backend().filter(self.queryset, self.search_query)
+            order_by = get_search_order_by(self.ordering)
+            return list(matches.order_by(*order_by)[start:stop])
+
+        contract_ids = self.results.ids[start:stop]
+        rows = {
+            row["id"] if isinstance(row, dict) else row.pk: row
+            for row in self.queryset.filter(pk__in=contract_ids).order_by()
+        }
+        return [rows[pk] for pk in contract_ids if pk in rows]
 
 
 class PageNumberPagination(pagination.PageNumberPagination):
@@ -9,6 +194,22 @@ class PageNumberPagination(pagination.PageNumberPagination):
     page_size_query_param = "page_size"
     max_page_size = 100
 
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def django_paginator_class(self, object_list, per_page):
+        get_data_version = getattr(self.view, "get_data_version", None)
+        version = get_data_version() if get_data_version else None
+
+        return CachedCountPaginator(
+            object_list,
+            per_page,
+            cache_key=get_count_cache_key(self.request, version),
+            estimate_threshold=settings.API_COUNT_ESTIMATE_THRESHOLD,
+        )
+
     def get_paginated_response(self, data):
         return Response(
             OrderedDict(
@@ -21,9 +222,278 @@ class PageNumberPagination(pagination.PageNumberPagination):
                         },
                     ),
                     ("count", self.page.paginator.count),
+                    ("count_exact", self.page.paginator.count_exact),
                     ("total_pages", self.page.paginator.num_pages),
                     ("page", self.page.number),
                     ("results", data),
                 ]
             )
         )
+
+
+def use_keyset_pagination(request):
+    return KeysetPagination.cursor_query_param in request.query_params
+
+
+def encode_cursor_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+
+    return value
+
+
+class PageSizeMixin:
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+
+class KeysetPagination(PageSizeMixin, pagination.BasePagination):
+    """
+    Opt-in pagination by `(ordering field, pk)` instead of OFFSET.
+
+    Every page costs the same no matter how deep it is, and no COUNT query is
+    run. Pass an empty `cursor` parameter to request the first page.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 12
+    max_page_size = 100
+    ordering = "-pk"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = self.get_ordering(request, queryset, view)
+        self.field = ordering.lstrip("-")
+        self.descending = ordering.startswith("-")
+        self.ordering_value = ordering
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor["r"])
+
+        if cursor:
+            queryset = queryset.filter(
+                self.get_position_filter(cursor["v"], cursor["pk"], after=not reverse)
+            )
+
+        queryset = queryset.order_by(*self.get_order_by(reverse=reverse))
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        # Follow the view's ordering filter so cursors honor `?ordering=`
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+
+                if ordering:
+                    return ordering[0]
+
+        return self.ordering
+
+    def is_pk_ordering(self):
+        return self.field in ("pk", "id")
+
+    def get_order_by(self, reverse=False):
+        descending = self.descending != reverse
+
+        if self.is_pk_ordering():
+            return ["-pk" if descending else "pk"]
+
+        # Nulls always sort last in the requested direction
+        if descending:
+            field = F(self.field).desc(nulls_last=not reverse, nulls_first=reverse)
+        else:
+            field = F(self.field).asc(nulls_last=not reverse, nulls_first=reverse)
+
+        return [field, "-pk" if descending else "pk"]
+
+    def get_position_filter(self, value, pk, after=True):
+        descending = self.descending != (not after)
+        op = "lt" if descending else "gt"
+
+        if self.is_pk_ordering():
+            return Q(**{f"pk__{op}": pk})
+
+        null_rows = Q(**{f"{self.field}__isnull": True})
+
+        if value is None:
+            same_value = null_rows & Q(**{f"pk__{op}": pk})
+            return same_value if after else ~null_rows | same_value
+
+        position = Q(**{f"{self.field}__{op}": value}) | Q(
+            **{self.field: value, f"pk__{op}": pk}
+        )
+        return position | null_rows if after else position
+
+    def get_item_value(self, item, field):
+        if isinstance(item, dict):
+            return item["id" if field == "pk" else field]
+
+        return getattr(item, field)
+
+    def encode_cursor(self, item, reverse):
+        value = None
+
+        if not self.is_pk_ordering():
+            value = self.get_item_value(item, self.field)
+
+        data = {
+            "o": self.ordering_value,
+            "v": encode_cursor_value(value),
+            "pk": self.get_item_value(item, "pk"),
+            "r": reverse,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if not encoded:
+            return None
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            cursor = {"v": data["v"], "pk": int(data["pk"]), "r": bool(data["r"])}
+        except (binascii.Error, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if data.get("o") != self.ordering_value:
+            raise NotFound(self.invalid_cursor_message)
+
+        return cursor
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        if not self.page:
+            url = self.request.build_absolute_uri()
+            return replace_query_param(url, self.cursor_query_param, "")
+
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    (
+                        "links",
+                        {
+                            "next": self.get_next_link(),
+                            "previous": self.get_previous_link(),
+                        },
+                    ),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Pagination cursor. Pass an empty value to start.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class SequencePagination(PageSizeMixin, pagination.BasePagination):
+    """
+    Pagination for append-only feeds whose primary keys increase in commit
+    order. Returns the items after the `since` key, and the `cursor` to pass
+    as `since` on the next poll.
+    """
+
+    since_query_param = "since"
+    page_size = 100
+    max_page_size = 1000
+    invalid_since_message = "Invalid since"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.since = self.get_since(request)
+
+        queryset = queryset.filter(pk__gt=self.since).order_by("pk")
+        results = list(queryset[: self.page_size + 1])
+        self.has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_since(self, request):
+        try:
+            since = int(request.query_params.get(self.since_query_param, 0))
+        except ValueError:
+            raise NotFound(self.invalid_since_message)
+
+        if since < 0:
+            raise NotFound(self.invalid_since_message)
+
+        return since
+
+    def get_cursor(self):
+        return self.page[-1].pk if self.page else self.since
+
+    def get_next_link(self):
+        if not self.has_more:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.since_query_param, self.get_cursor())
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("links", {"next": self.get_next_link()}),
+                    ("cursor", self.get_cursor()),
+                    ("has_more", self.has_more),
+                    ("results", data),
+                ]
+            )
+        )
@@ -0,0 +1,35 @@
+import orjson
+from rest_framework import renderers
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    JSON renderer backed by orjson.
+
+    Values orjson doesn't handle natively, like `Decimal`, and datetimes, so
+    they keep DRF's formatting, go through DRF's JSON encoder. Indented output
+    falls back to the stdlib renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        if indent or not (self.compact and self.ensure_ascii is False):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        ret = orjson.dumps(data, default=encoder.default, option=ORJSON_OPTIONS)
+
+        # Like JSONRenderer, escape the line separators JSON allows but
+        # JavaScript doesn't
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028")
+            ret = ret.replace(b"\xe2\x80\xa9", b"\\u2029")
+
+        return ret
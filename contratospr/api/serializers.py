@@ -1,7 +1,10 @@
-from django.core import serializers as django_serializers
+import orjson
+from django.db import models
+from django.utils.functional import cached_property
 from rest_framework import serializers
 
 from ..contracts.models import (
+    Change,
     CollectionArtifact,
     CollectionJob,
     Contract,
@@ -12,6 +15,8 @@ from ..contracts.models import (
     ServiceGroup,
 )
 from ..contracts.utils import get_current_fiscal_year
+from .loaders import get_contractor_entities_loader
+from .renderers import ORJSONRenderer
 
 INITIAL_FISCAL_YEAR = 2016
 CURRENT_FISCAL_YEAR = get_current_fiscal_year()
@@ -31,7 +36,100 @@ class HomeSerializer(serializers.Serializer):
     )
 
 
-class ContractorSerializer(serializers.ModelSerializer):
+class AutocompleteSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=255, trim_whitespace=True)
+    limit = serializers.IntegerField(min_value=1, max_value=20, default=5)
+
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def get_query_param_set(request, name):
+    """
+    Return the comma separated values of the `name` query parameter as a set,
+    or `None` when the parameter isn't present.
+    """
+    if request is None or name not in request.query_params:
+        return None
+
+    values = ",".join(request.query_params.getlist(name))
+    return {value.strip() for value in values.split(",") if value.strip()}
+
+
+def get_requested_fields(request):
+    return get_query_param_set(request, FIELDS_PARAM)
+
+
+def get_expanded_fields(request):
+    return get_query_param_set(request, EXPAND_PARAM)
+
+
+class SparseFieldsetsMixin:
+    """
+    Limit the rendered fields with `?fields=` and render nested relations that
+    are not listed in `?expand=` as primary keys. Only applies to the top
+    level serializer of a viewset's response.
+    """
+
+    def is_top_level(self):
+        parent = self.parent
+
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+
+        if "view" not in self.context or not self.is_top_level():
+            return fields
+
+        requested = get_requested_fields(request)
+        expanded = get_expanded_fields(request)
+
+        if requested is not None:
+            for field_name in list(fields):
+                if field_name not in requested:
+                    fields.pop(field_name)
+
+        if expanded is not None:
+            for field_name, field in list(fields.items()):
+                if field_name in expanded:
+                    continue
+
+                if isinstance(field, serializers.ListSerializer):
+                    fields[field_name] = serializers.PrimaryKeyRelatedField(
+                        many=True, read_only=True, source=field.source
+                    )
+                elif isinstance(field, serializers.BaseSerializer):
+                    fields[field_name] = serializers.PrimaryKeyRelatedField(
+                        read_only=True, source=field.source
+                    )
+
+        return fields
+
+
+def get_list_items(data):
+    if isinstance(data, models.Manager):
+        data = data.all()
+
+    return list(data)
+
+
+class ContractorListSerializer(serializers.ListSerializer):
+    def prime(self, contractor_ids):
+        get_contractor_entities_loader(self.context).prime(contractor_ids)
+
+    def to_representation(self, data):
+        contractors = get_list_items(data)
+        self.prime(contractor.pk for contractor in contractors)
+        return super().to_representation(contractors)
+
+
+class ContractorSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     contracts_total = serializers.DecimalField(
         max_digits=20, decimal_places=2, allow_null=True
     )
@@ -49,16 +147,23 @@ class ContractorSerializer(serializers.ModelSerializer):
             "entity_id",
             "contracts_count",
             "contracts_total",
+            "first_contract_date",
+            "last_contract_date",
             "entities",
         ]
+        list_serializer_class = ContractorListSerializer
+
+    @cached_property
+    def entity_serializer(self):
+        # Built once and reused, instead of building its fields per contractor
+        return EntitySerializer()
 
     def get_entities(self, obj):
-        contracts = obj.contract_set.all().only("id")
-        entities = Entity.objects.filter(contract__in=contracts).distinct()
-        return EntitySerializer(entities, many=True).data
+        entities = get_contractor_entities_loader(self.context).load(obj.pk)
+        return [self.entity_serializer.to_representation(entity) for entity in entities]
 
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = Document
         fields = [
@@ -72,7 +177,7 @@ class DocumentSerializer(serializers.ModelSerializer):
         ]
 
 
-class ServiceGroupSerializer(serializers.ModelSerializer):
+class ServiceGroupSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     contracts_total = serializers.DecimalField(
         max_digits=20, decimal_places=2, allow_null=True
     )
@@ -87,12 +192,14 @@ class ServiceGroupSerializer(serializers.ModelSerializer):
             "name",
             "contracts_count",
             "contracts_total",
+            "first_contract_date",
+            "last_contract_date",
             "created_at",
             "modified_at",
         ]
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     group = ServiceGroupSerializer()
 
     contracts_total = serializers.DecimalField(
@@ -110,12 +217,14 @@ class ServiceSerializer(serializers.ModelSerializer):
             "group",
             "contracts_count",
             "contracts_total",
+            "first_contract_date",
+            "last_contract_date",
             "created_at",
             "modified_at",
         ]
 
 
-class EntitySerializer(serializers.ModelSerializer):
+class EntitySerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     contracts_total = serializers.DecimalField(
         max_digits=20, decimal_places=2, allow_null=True
     )
@@ -130,6 +239,8 @@ class EntitySerializer(serializers.ModelSerializer):
             "source_id",
             "contracts_total",
             "contracts_count",
+            "first_contract_date",
+            "last_contract_date",
             "created_at",
             "modified_at",
         ]
@@ -150,7 +261,31 @@ class SimpleContractSerializer(serializers.ModelSerializer):
         ]
 
 
-class BaseContractSerializer(serializers.ModelSerializer):
+class ContractListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        contracts = get_list_items(data)
+        loader = get_contractor_entities_loader(self.context)
+        fields = self.child.fields
+        prime_contractors = isinstance(
+            fields.get("contractors"), serializers.ListSerializer
+        )
+        prime_parent = isinstance(fields.get("parent"), serializers.BaseSerializer)
+
+        # Prime every contractor rendered in the page so their entities are
+        # loaded together instead of once per contractor.
+        for contract in contracts:
+            if prime_contractors:
+                loader.prime(contractor.pk for contractor in contract.contractors.all())
+
+            if prime_parent and contract.parent:
+                loader.prime(
+                    contractor.pk for contractor in contract.parent.contractors.all()
+                )
+
+        return super().to_representation(contracts)
+
+
+class BaseContractSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     date_of_grant = serializers.DateTimeField(format="%Y-%m-%d")
     entity = EntitySerializer()
     service = ServiceSerializer()
@@ -183,6 +318,7 @@ class BaseContractSerializer(serializers.ModelSerializer):
             "created_at",
             "modified_at",
         ]
+        list_serializer_class = ContractListSerializer
 
 
 class ParentContractSerializer(BaseContractSerializer):
@@ -194,71 +330,101 @@ class ContractSerializer(BaseContractSerializer):
     amendments = SimpleContractSerializer(many=True)
 
 
+# Artifacts record the objects a collection job scraped, so they list the
+# scraped fields explicitly, without totals computed from other rows. The
+# 0013 migration backfilled older artifacts with the same fields.
 class CollectionArtifactContractSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contract
-        exclude = ["contractors"]
+        fields = [
+            "id",
+            "created_at",
+            "modified_at",
+            "source_id",
+            "number",
+            "amendment",
+            "slug",
+            "date_of_grant",
+            "effective_date_from",
+            "effective_date_to",
+            "cancellation_date",
+            "amount_to_pay",
+            "has_amendments",
+            "exempt_id",
+            "entity",
+            "service",
+            "document",
+            "parent",
+        ]
 
 
 class CollectionArtifactEntitySerializer(serializers.ModelSerializer):
     class Meta:
         model = Entity
-        fields = "__all__"
+        fields = ["id", "created_at", "modified_at", "name", "source_id", "slug"]
 
 
 class CollectionArtifactServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Service
-        fields = "__all__"
+        fields = ["id", "created_at", "modified_at", "name", "slug", "group"]
 
 
 class CollectionArtifactServiceGroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceGroup
-        fields = "__all__"
+        fields = ["id", "created_at", "modified_at", "name", "slug"]
 
 
 class CollectionArtifactContractorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contractor
-        fields = "__all__"
+        fields = [
+            "id",
+            "created_at",
+            "modified_at",
+            "name",
+            "source_id",
+            "entity_id",
+            "slug",
+        ]
 
 
 class CollectionArtifactDocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
-        fields = "__all__"
+        fields = ["id", "created_at", "modified_at", "source_id", "source_url", "file"]
+
+
+ARTIFACT_SERIALIZERS = {
+    "Contract": CollectionArtifactContractSerializer,
+    "Entity": CollectionArtifactEntitySerializer,
+    "Service": CollectionArtifactServiceSerializer,
+    "ServiceGroup": CollectionArtifactServiceGroupSerializer,
+    "Contractor": CollectionArtifactContractorSerializer,
+    "Document": CollectionArtifactDocumentSerializer,
+}
+
+ARTIFACT_TYPES = {name.lower() for name in ARTIFACT_SERIALIZERS}
+
+
+def serialize_artifact(obj):
+    """
+    Return an object as the artifacts endpoint renders it, as JSON data that
+    can be stored with the artifact.
+    """
+    artifact_serializer = ARTIFACT_SERIALIZERS.get(obj._meta.object_name)
+
+    if not artifact_serializer:
+        return None
+
+    return orjson.loads(ORJSONRenderer().render(artifact_serializer(obj).data))
 
 
 class CollectionArtifactSerializer(serializers.ModelSerializer):
     class Meta:
         model = CollectionArtifact
-        fields = "__all__"
-
-    def to_representation(self, instance):
-        artifact_serializers = {
-            "Contract": CollectionArtifactContractSerializer,
-            "Entity": CollectionArtifactEntitySerializer,
-            "Service": CollectionArtifactServiceSerializer,
-            "ServiceGroup": CollectionArtifactServiceGroupSerializer,
-            "Contractor": CollectionArtifactContractorSerializer,
-            "Document": CollectionArtifactDocumentSerializer,
-        }
-        for deserialized_object in django_serializers.deserialize(
-            "json", instance.serialized_data
-        ):
-            model = deserialized_object.object
-            artifact_serializer = artifact_serializers.get(model._meta.object_name)
-
-            if artifact_serializer:
-                serializer = artifact_serializer(model)
-                return {
-                    "type": model._meta.model_name,
-                    "created": instance.created,
-                    "data": serializer.data,
-                }
-
-        return {}
+        fields = ["type", "created", "data"]
 
 
 class CollectionJobSerializer(serializers.ModelSerializer):
@@ -271,3 +437,9 @@ class CollectionJobSerializer(serializers.ModelSerializer):
             "created_at",
             "modified_at",
         ]
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Change
+        fields = ["id", "resource", "object_id", "action", "created_at"]
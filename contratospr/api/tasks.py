@@ -0,0 +1,88 @@
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.test import RequestFactory
+from django.urls import resolve
+from structlog import get_logger
+
+from ..tasks import app
+from ..utils.routers import use_primary
+from .serializers import FISCAL_YEAR_CHOICES
+
+logger = get_logger(__name__)
+
+WARM_PAGE_PATHS = [
+    "/v1/pages/home/",
+    "/v1/pages/trends/general/",
+    "/v1/pages/trends/services/",
+]
+
+WARM_LIST_PATHS = [
+    "/v1/contracts/",
+    "/v1/contractors/",
+    "/v1/entities/",
+    "/v1/services/",
+    "/v1/service-groups/",
+]
+
+
+def get_warm_requests():
+    for path in WARM_PAGE_PATHS:
+        yield path, {}
+
+        for fiscal_year, _ in FISCAL_YEAR_CHOICES:
+            yield path, {"fiscal_year": fiscal_year}
+
+    for path in WARM_LIST_PATHS:
+        yield path, {}
+
+
+def warm_url(factory, path, params):
+    """
+    Render `path` through its view so the response lands in the API cache
+    under the same key a client request would use.
+    """
+    request = factory.get(path, params)
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+
+    if hasattr(response, "render"):
+        response.render()
+
+    return response.status_code
+
+
+@app.task
+def warm_api_cache():
+    if not settings.API_CACHE_WARMING_URL:
+        logger.warning("Skipping API cache warming, API_CACHE_WARMING_URL not set")
+        return 0
+
+    url = urlsplit(settings.API_CACHE_WARMING_URL)
+    factory = RequestFactory(HTTP_HOST=url.netloc, secure=url.scheme == "https")
+    started_at = time.perf_counter()
+    warmed = 0
+
+    # Warming follows writes, which replicas may not have replayed yet, and
+    # responses read from them then aren't cached
+    with use_primary():
+        for path, params in get_warm_requests():
+            request_started_at = time.perf_counter()
+            status_code = warm_url(factory, path, params)
+            warmed += 1
+
+            logger.info(
+                "Warmed API cache",
+                path=path,
+                params=params,
+                status_code=status_code,
+                elapsed=round(time.perf_counter() - request_started_at, 3),
+            )
+
+    logger.info(
+        "Finished warming API cache",
+        count=warmed,
+        elapsed=round(time.perf_counter() - started_at, 3),
+    )
+    return warmed
@@ -0,0 +1,106 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from contratospr.contracts import models
+
+from ..compiled import CompileError
+
+
+class TestCompiledSerializer(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        group = models.ServiceGroup.objects.create(name="Servicios Profesionales")
+        service = models.Service.objects.create(name="Consultoría", group=group)
+        entity = models.Entity.objects.create(name="Departamento", source_id=1)
+        document = models.Document.objects.create(
+            source_id="1", source_url="https://example.com/1"
+        )
+
+        parent = None
+
+        for source_id in range(1, 5):
+            contract = models.Contract.objects.create(
+                entity=entity if source_id % 2 else None,
+                service=service if source_id < 3 else None,
+                document=document if source_id == 1 else None,
+                parent=parent,
+                source_id=source_id,
+                number=f"T{source_id}",
+                amendment=f"A{source_id}" if parent else None,
+                date_of_grant=date_of_grant - datetime.timedelta(days=source_id),
+                effective_date_from=date_of_grant,
+                effective_date_to=date_of_grant,
+                cancellation_date=date_of_grant if source_id == 2 else None,
+                amount_to_pay="1234.50",
+                has_amendments=parent is None,
+            )
+            contractor = models.Contractor.objects.create(
+                name=f"Contractor {source_id}", source_id=source_id
+            )
+            contract.contractors.add(contractor)
+            parent = parent or contract
+
+    def setUp(self):
+        cache.clear()
+
+    def assertCompiledResponse(self, url, params=None):
+        compiled = self.client.get(url, params)
+
+        cache.clear()
+
+        with mock.patch(
+            "contratospr.api.mixins.CompiledSerializer", side_effect=CompileError
+        ):
+            expected = self.client.get(url, params)
+
+        self.assertEqual(compiled.status_code, 200)
+        self.assertEqual(compiled.content, expected.content)
+
+    def test_contract_list(self):
+        self.assertCompiledResponse(reverse("v1:contract-list"))
+
+    def test_contract_list_sparse_fields(self):
+        self.assertCompiledResponse(
+            reverse("v1:contract-list"),
+            {"fields": "id,parent,amendments,contractors", "expand": "contractors"},
+        )
+
+    def test_contract_list_cursor(self):
+        self.assertCompiledResponse(
+            reverse("v1:contract-list"),
+            {"cursor": "", "page_size": 2, "ordering": "amount_to_pay"},
+        )
+
+    def test_contractor_list(self):
+        self.assertCompiledResponse(
+            reverse("v1:contractor-list"), {"ordering": "-contracts_total"}
+        )
+
+    def test_contract_list_cursor_sparse_fields(self):
+        url = reverse("v1:contract-list")
+        params = {"cursor": "", "page_size": 1, "fields": "number"}
+        self.assertCompiledResponse(url, params)
+
+        data = self.client.get(url, params).json()
+        self.assertEqual(list(data["results"][0]), ["number"])
+
+        next_response = self.client.get(data["links"]["next"])
+        self.assertEqual(next_response.status_code, 200)
+        self.assertNotEqual(next_response.json()["results"], data["results"])
+
+    def test_contractor_list_cursor_sparse_fields(self):
+        self.assertCompiledResponse(
+            reverse("v1:contractor-list"),
+            {
+                "cursor": "",
+                "page_size": 2,
+                "fields": "id",
+                "ordering": "-contracts_total",
+            },
+        )
@@ -0,0 +1,297 @@
+import gzip
+import math
+import time
+from unittest import mock
+
+import brotli
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+
+from contratospr.contracts import models
+from contratospr.contracts.versions import DATA_RESOURCES, get_data_version_key
+
+from ...utils.routers import (
+    ReplicaRouter,
+    get_read_replica,
+    measure_replica_lag,
+    use_primary,
+    use_replica,
+)
+from ..mixins import should_refresh
+
+
+class TestCachedAPIViewMixin(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_response(self):
+        url = reverse("v1:entity-list")
+        response = self.client.get(url)
+        cached_response = self.client.get(url)
+
+        self.assertEqual(cached_response.status_code, status.HTTP_200_OK)
+        self.assertIs(type(cached_response), HttpResponse)
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response["Content-Type"], response["Content-Type"])
+        self.assertEqual(cached_response["Vary"], response["Vary"])
+
+    def test_cached_response_invalidated_by_data_changes(self):
+        url = reverse("v1:entity-list")
+        self.assertEqual(self.client.get(url).json()["count"], 0)
+
+        models.Entity.objects.create(name="Test Entity", source_id=1)
+
+        self.assertEqual(self.client.get(url).json()["count"], 1)
+
+    def test_cached_response_precompressed(self):
+        for source_id in range(1, 10):
+            models.Entity.objects.create(
+                name=f"Entity {source_id}", source_id=source_id
+            )
+
+        url = reverse("v1:entity-list")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+
+        # Cache hits are served from the stored variants
+        with mock.patch("contratospr.utils.compression.brotli.compress") as compress:
+            cached_response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        compress.assert_not_called()
+        self.assertEqual(cached_response["Content-Encoding"], "br")
+        self.assertEqual(cached_response.content, response.content)
+        self.assertIn("Accept-Encoding", cached_response["Vary"])
+
+        cached_response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(cached_response["Content-Encoding"], "gzip")
+        self.assertEqual(
+            gzip.decompress(cached_response.content),
+            brotli.decompress(response.content),
+        )
+
+        cached_response = self.client.get(url, HTTP_ACCEPT_ENCODING="br;q=0, identity")
+        self.assertFalse(cached_response.has_header("Content-Encoding"))
+        self.assertEqual(cached_response.content, brotli.decompress(response.content))
+
+        # Refused encodings aren't accepted through `*`, and quality wins
+        for accept_encoding, encoding in [
+            ("br;q=0, *", "gzip"),
+            ("gzip;q=1, br;q=0.5", "gzip"),
+            ("gzip;q=0.5, *;q=0.8", "br"),
+        ]:
+            cached_response = self.client.get(url, HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(cached_response["Content-Encoding"], encoding)
+
+    def test_stale_response_while_locked(self):
+        url = reverse("v1:entity-list")
+        self.client.get(url)
+
+        models.Entity.objects.create(name="Test Entity", source_id=1)
+
+        # Another request holds the lock for the new version
+        with mock.patch.object(cache, "add", return_value=False):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+
+        self.assertEqual(response.json()["count"], 0)
+        self.assertEqual(len(context), 0)
+
+    @override_settings(API_CACHE_LOCK_WAIT=0.1)
+    def test_computes_response_after_waiting_for_lock(self):
+        url = reverse("v1:entity-list")
+
+        with mock.patch.object(cache, "add", return_value=False):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 0)
+
+    def test_lock_released_when_rendering_fails(self):
+        url = reverse("v1:entity-list")
+
+        with mock.patch(
+            "contratospr.api.renderers.ORJSONRenderer.render", side_effect=ValueError
+        ):
+            with self.assertRaises(ValueError):
+                self.client.get(url)
+
+        with mock.patch("contratospr.api.mixins.wait_for_cache") as wait_for_cache:
+            response = self.client.get(url)
+
+        wait_for_cache.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_should_refresh(self):
+        now = time.time()
+
+        self.assertTrue(should_refresh((b"", [], now - 1, 0.5)))
+        self.assertFalse(should_refresh((b"", [], now + 60 * 60, 0.5)))
+
+
+class TestConditionalGetMixin(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def set_data_versions(self, version):
+        cache.set_many(
+            {get_data_version_key(resource): version for resource in DATA_RESOURCES},
+            None,
+        )
+
+    def test_not_modified(self):
+        self.set_data_versions(time.time() - 60)
+        url = reverse("v1:entity-list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(len(context), 0)
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_modified_after_data_changes(self):
+        url = reverse("v1:entity-list")
+        etag = self.client.get(url)["ETag"]
+
+        models.Entity.objects.create(name="Test Entity", source_id=1)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_last_modified_after_second_ends(self):
+        version = math.floor(time.time()) - 10 + 0.2
+        self.set_data_versions(version)
+        url = reverse("v1:entity-list")
+
+        # A change later in the same second would get the same date
+        with mock.patch("time.time", return_value=version + 0.5):
+            response = self.client.get(url)
+
+        self.assertTrue(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        with mock.patch("time.time", return_value=version + 1):
+            response = self.client.get(url)
+
+        self.assertEqual(response["Last-Modified"], http_date(math.ceil(version)))
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class TestReplicaReadMixin(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_router(self):
+        router = ReplicaRouter()
+
+        with mock.patch("contratospr.utils.routers.get_replica_lag", return_value=0):
+            self.assertEqual(router.db_for_read(models.Entity), "default")
+
+            with use_replica():
+                self.assertEqual(router.db_for_read(models.Entity), "replica1")
+                self.assertEqual(router.db_for_write(models.Entity), "default")
+
+                # Reads after a write see it
+                self.assertEqual(router.db_for_read(models.Entity), "default")
+
+            with use_replica():
+                self.assertEqual(router.db_for_read(models.Entity), "replica1")
+
+        with mock.patch("contratospr.utils.routers.get_replica_lag", return_value=60):
+            with use_replica():
+                self.assertEqual(router.db_for_read(models.Entity), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica1", "replica2", "replica3"])
+    def test_router_one_replica_per_context(self):
+        router = ReplicaRouter()
+
+        with mock.patch("contratospr.utils.routers.get_replica_lag", return_value=0):
+            with use_replica():
+                aliases = {router.db_for_read(models.Entity) for _ in range(20)}
+
+            with use_primary():
+                with use_replica():
+                    self.assertEqual(router.db_for_read(models.Entity), "default")
+
+        self.assertEqual(len(aliases), 1)
+
+    def test_measure_replica_lag_before_postgresql_10(self):
+        replica = mock.MagicMock(vendor="postgresql", pg_version=90600)
+        cursor = replica.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (None,)
+
+        connections = {"replica1": replica}
+
+        with mock.patch("contratospr.utils.routers.connections", connections):
+            self.assertEqual(measure_replica_lag("replica1"), 0)
+
+        self.assertIn("pg_last_xlog_replay_location", cursor.execute.call_args[0][0])
+
+    @mock.patch(
+        "contratospr.utils.routers.get_available_replicas", return_value=["default"]
+    )
+    def test_recent_changes_not_cached(self, get_available_replicas):
+        url = reverse("v1:entity-list")
+        models.Entity.objects.create(name="Test Entity", source_id=1)
+        replayed_until = "contratospr.utils.routers.get_replica_replayed_until"
+
+        # The replica may not have the entity yet
+        with mock.patch(replayed_until, return_value=time.time() - 60):
+            response = self.client.get(url)
+            self.assertFalse(response.has_header("ETag"))
+
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(url)
+
+        self.assertGreater(len(context), 0)
+
+        with mock.patch(replayed_until, return_value=time.time() + 1):
+            response = self.client.get(url)
+
+            with CaptureQueriesContext(connection) as context:
+                cached_response = self.client.get(url)
+
+        self.assertTrue(response.has_header("ETag"))
+        self.assertEqual(len(context), 0)
+        self.assertEqual(cached_response.content, response.content)
+
+    @mock.patch(
+        "contratospr.utils.routers.get_available_replicas", return_value=["default"]
+    )
+    def test_streamed_export_reads_from_replica(self, get_available_replicas):
+        models.Contract.objects.create(
+            source_id=1,
+            number="T1",
+            date_of_grant=timezone.now(),
+            effective_date_from=timezone.now(),
+            effective_date_to=timezone.now(),
+            amount_to_pay=1000,
+            has_amendments=False,
+        )
+        aliases = []
+
+        def get_contractors(contract_ids):
+            aliases.append(get_read_replica())
+            return {}
+
+        with mock.patch("contratospr.api.exports.get_contractors", get_contractors):
+            response = self.client.get(reverse("v1:contract-export"))
+            b"".join(response.streaming_content)
+
+        self.assertEqual(aliases, ["default"])
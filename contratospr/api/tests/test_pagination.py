@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from contratospr.api.pagination import PageNumberPagination, get_count_cache_key
+from contratospr.contracts import models
+
+
+def build_request(path, params):
+    return Request(APIRequestFactory().get(path, params))
+
+
+class TestPageNumberPagination(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_count_cache_key_ignores_page_and_ordering(self):
+        key = get_count_cache_key(
+            build_request("/v1/contracts/", {"entity_id": [2, 1], "page": 3})
+        )
+
+        self.assertEqual(
+            key,
+            get_count_cache_key(
+                build_request(
+                    "/v1/contracts/",
+                    {"ordering": "-amount_to_pay", "entity_id": [1, 2]},
+                )
+            ),
+        )
+        self.assertNotEqual(
+            key, get_count_cache_key(build_request("/v1/contracts/", {"entity_id": 1}))
+        )
+
+    def test_count_is_cached(self):
+        models.Entity.objects.create(name="Test Entity", source_id=1)
+        request = build_request("/v1/entities/", {})
+        queryset = models.Entity.objects.all()
+
+        paginator = PageNumberPagination()
+        paginator.paginate_queryset(queryset, request)
+        self.assertEqual(paginator.page.paginator.count, 1)
+        self.assertTrue(paginator.page.paginator.count_exact)
+
+        with self.assertNumQueries(1):
+            paginator = PageNumberPagination()
+            paginator.paginate_queryset(
+                queryset, build_request("/v1/entities/", {"page": 1})
+            )
+            self.assertEqual(paginator.page.paginator.count, 1)
+
+    def test_estimated_count_doesnt_reject_pages(self):
+        for source_id in range(1, 6):
+            models.Entity.objects.create(
+                name=f"Entity {source_id}", source_id=source_id
+            )
+
+        queryset = models.Entity.objects.order_by("pk")
+        params = {"page_size": 2}
+
+        with self.settings(API_COUNT_ESTIMATE_THRESHOLD=1), mock.patch(
+            "contratospr.api.pagination.estimate_count", return_value=2
+        ):
+            paginator = PageNumberPagination()
+            page = paginator.paginate_queryset(
+                queryset, build_request("/v1/entities/", params)
+            )
+            self.assertEqual(len(page), 2)
+            self.assertEqual(paginator.page.paginator.count, 3)
+            self.assertFalse(paginator.page.paginator.count_exact)
+            self.assertIsNotNone(paginator.get_next_link())
+
+            paginator = PageNumberPagination()
+            page = paginator.paginate_queryset(
+                queryset, build_request("/v1/entities/", {**params, "page": 3})
+            )
+            self.assertEqual(len(page), 1)
+            self.assertEqual(paginator.page.paginator.count, 5)
+            self.assertTrue(paginator.page.paginator.count_exact)
+            self.assertIsNone(paginator.get_next_link())
@@ -0,0 +1,34 @@
+import datetime
+import decimal
+from collections import OrderedDict
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from ..renderers import ORJSONRenderer
+
+
+def test_orjson_renderer_matches_json_renderer():
+    data = OrderedDict(
+        [
+            ("amount_to_pay", decimal.Decimal("1234.50")),
+            ("date_of_grant", datetime.date(2019, 8, 1)),
+            (
+                "month",
+                timezone.make_aware(datetime.datetime(2019, 8, 1, 4, 5, 6, 7890)),
+            ),
+            ("name", "Departamento de Educación\u2028"),
+            ("totals", [{1: None, "count": 2, "average": 1.5}]),
+        ]
+    )
+
+    assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+def test_orjson_renderer_indent():
+    data = {"count": 1}
+    renderer_context = {"indent": 4}
+
+    assert ORJSONRenderer().render(
+        data, renderer_context=renderer_context
+    ) == JSONRenderer().render(data, renderer_context=renderer_context)
@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+
+from ...contracts.models import Entity
+from ..tasks import get_warm_requests, warm_api_cache
+
+
+class TestWarmAPICache(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(API_CACHE_WARMING_URL="http://testserver")
+    def test_warmed_responses_are_cached(self):
+        self.assertEqual(warm_api_cache(), len(list(get_warm_requests())))
+
+        # A plain client, since APIClient always sends a Content-Type header
+        client = Client()
+
+        for path in ("/v1/pages/home/", "/v1/contracts/"):
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(path, HTTP_ACCEPT="application/json")
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(context), 0)
+
+    @override_settings(
+        API_CACHE_WARMING_URL="http://testserver", DATABASE_REPLICAS=["replica1"]
+    )
+    @mock.patch(
+        "contratospr.utils.routers.get_available_replicas", return_value=["default"]
+    )
+    @mock.patch("contratospr.utils.routers.get_replica_replayed_until", return_value=0)
+    def test_warmed_from_primary(self, get_replica_replayed_until, get_replicas):
+        Entity.objects.create(name="Test Entity", source_id=1)
+        warm_api_cache()
+
+        # Requests until the replica catches up are served from the cache
+        with CaptureQueriesContext(connection) as context:
+            response = Client().get("/v1/entities/", HTTP_ACCEPT="application/json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context), 0)
+
+    @override_settings(API_CACHE_WARMING_URL=None)
+    def test_skipped_without_url(self):
+        self.assertEqual(warm_api_cache(), 0)
@@ -1,7 +1,19 @@
+import datetime
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework.views import status
 
+from contratospr.contracts import models
+from contratospr.contracts.rollups import refresh_rollups
+from contratospr.utils import concurrency
+
 
 class TestViews(APITestCase):
     def test_root_view_url(self):
@@ -33,3 +45,182 @@ class TestViews(APITestCase):
     def test_test_trends_services_view_url(self):
         response = self.client.get("/v1/pages/trends/services/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_trends_views_read_rollups(self):
+        group = models.ServiceGroup.objects.create(name="Servicios Profesionales")
+        service = models.Service.objects.create(name="Consultoría", group=group)
+        contractor = models.Contractor.objects.create(name="Contractor", source_id=1)
+
+        for source_id, amount_to_pay in [(1, 1000), (2, 500)]:
+            date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, source_id))
+            contract = models.Contract.objects.create(
+                service=service,
+                source_id=source_id,
+                number=f"T{source_id}",
+                date_of_grant=date_of_grant,
+                effective_date_from=date_of_grant,
+                effective_date_to=date_of_grant,
+                amount_to_pay=amount_to_pay,
+                has_amendments=False,
+            )
+            contract.contractors.add(contractor)
+
+        refresh_rollups()
+
+        response = self.client.get("/v1/pages/trends/general/", {"fiscal_year": 2020})
+        self.assertEqual(
+            [total["value"] for total in response.data["a"]["totals"]],
+            ["2", "$1,500.00", "$750.00", "$750.00", "1"],
+        )
+        self.assertEqual(response.data["a"]["contract_min_amount"]["number"], "T2")
+        self.assertEqual(response.data["a"]["contract_max_amount"]["number"], "T1")
+        self.assertEqual(response.data["b"]["totals"][0]["value"], "0")
+
+        response = self.client.get("/v1/pages/trends/services/", {"fiscal_year": 2020})
+        trend = response.data["a"]
+        self.assertEqual(
+            [
+                (
+                    service["name"],
+                    service["contracts_count"],
+                    service["contracts_total"],
+                )
+                for service in trend["services"]["value"]
+            ],
+            [("Consultoría", 2, 1500)],
+        )
+        self.assertEqual(
+            trend["service_groups"]["value"][0]["name"], "Servicios Profesionales"
+        )
+
+    def test_trends_general_view_stale_rollups(self):
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        contract = models.Contract.objects.create(
+            source_id=1,
+            number="T1",
+            date_of_grant=date_of_grant,
+            effective_date_from=date_of_grant,
+            effective_date_to=date_of_grant,
+            amount_to_pay=1000,
+            has_amendments=False,
+        )
+        refresh_rollups()
+        contract.delete()
+
+        # Until the rollups are refreshed, every figure is the rollup's
+        response = self.client.get("/v1/pages/trends/general/", {"fiscal_year": 2020})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [total["value"] for total in response.data["a"]["totals"]],
+            ["1", "$1,000.00", "$1,000.00", "$1,000.00", "0"],
+        )
+        self.assertEqual(response.data["a"]["contract_max_amount"], 0)
+
+    def test_autocomplete_view_response(self):
+        models.Entity.objects.create(name="Test Entity", source_id=1)
+        response = self.client.get("/v1/autocomplete/", {"q": " test  "})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [entity["name"] for entity in response.data["entities"]], ["Test Entity"]
+        )
+
+        for key in ("contractors", "services"):
+            self.assertEqual(response.data[key], [])
+
+    def test_autocomplete_view_requires_query(self):
+        response = self.client.get("/v1/autocomplete/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestConcurrentViews(APITransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(QUERY_CONCURRENCY=2)
+    def test_worker_connections_reused(self):
+        # Both threads of the pool take a call each time
+        barrier = threading.Barrier(2)
+
+        def get_connection():
+            barrier.wait()
+            connection.ensure_connection()
+            return threading.get_ident(), connection.connection
+
+        first = dict(concurrency.run_concurrently(get_connection, get_connection))
+        second = dict(concurrency.run_concurrently(get_connection, get_connection))
+
+        self.assertEqual(set(first), set(second))
+
+        for thread_id in first:
+            self.assertIs(first[thread_id], second[thread_id])
+
+    @override_settings(QUERY_CONCURRENCY=2, QUERY_CONN_MAX_AGE=300)
+    def test_only_worker_connections_persist(self):
+        def get_conn_max_age():
+            return connection.settings_dict["CONN_MAX_AGE"]
+
+        self.assertEqual(
+            concurrency.run_concurrently(get_conn_max_age, get_conn_max_age),
+            [300, 300],
+        )
+        self.assertEqual(get_conn_max_age(), 0)
+
+    def test_executor_follows_query_concurrency(self):
+        closed_by = set()
+
+        def close_all():
+            closed_by.add(threading.get_ident())
+
+        with override_settings(QUERY_CONCURRENCY=2):
+            executor = concurrency.get_executor()
+            self.assertIs(concurrency.get_executor(), executor)
+            workers = concurrency.run_concurrently(
+                threading.get_ident, threading.get_ident
+            )
+
+        with override_settings(QUERY_CONCURRENCY=3), mock.patch.object(
+            concurrency.connections, "close_all", close_all
+        ):
+            self.assertEqual(concurrency.get_executor()._max_workers, 3)
+
+            # The replaced threads close their connections before exiting
+            for thread in executor._threads:
+                thread.join()
+
+        self.assertTrue(executor._shutdown)
+        self.assertTrue(set(workers) <= closed_by)
+
+    @override_settings(QUERY_CONCURRENCY=3)
+    def test_home_page_view_concurrent_queries(self):
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        entity = models.Entity.objects.create(name="Test Entity", source_id=1)
+        contract = models.Contract.objects.create(
+            entity=entity,
+            source_id=1,
+            number="T1",
+            date_of_grant=date_of_grant,
+            effective_date_from=date_of_grant,
+            effective_date_to=date_of_grant,
+            amount_to_pay=1000,
+            has_amendments=False,
+        )
+        contract.contractors.add(
+            models.Contractor.objects.create(name="Test Contractor", source_id=1)
+        )
+        refresh_rollups()
+
+        with mock.patch(
+            "contratospr.utils.concurrency.run_in_worker",
+            wraps=concurrency.run_in_worker,
+        ) as run_in_worker:
+            response = self.client.get("/v1/pages/home/", {"fiscal_year": 2020})
+
+        self.assertEqual(run_in_worker.call_count, 4)
+        self.assertEqual(response.data["contracts_count"], 1)
+        self.assertEqual(response.data["contracts_total"], 1000)
+        self.assertEqual(
+            [contract["id"] for contract in response.data["recent_contracts"]],
+            [contract.pk],
+        )
+        self.assertEqual(response.data["contractors"][0]["name"], "Test Contractor")
+        self.assertEqual(response.data["entities"][0]["name"], "Test Entity")
@@ -1,26 +1,324 @@
+import csv
+import datetime
+import gzip
+import io
+import json
 from unittest import mock
 
+from django.core.cache import cache
 from django.core.files import File
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework.views import status
 
 from contratospr.contracts import models
+from contratospr.contracts.aggregates import refresh_all_aggregates
+from contratospr.contracts.changes import prune_changes
+from contratospr.contracts.search import index_contract
 
 
-class TestContractViewSet(APITestCase):
+def create_contract(source_id, date_of_grant, entity=None, amount_to_pay=1000):
+    return models.Contract.objects.create(
+        entity=entity,
+        source_id=source_id,
+        number=f"T{source_id}",
+        date_of_grant=date_of_grant,
+        effective_date_from=date_of_grant,
+        effective_date_to=date_of_grant,
+        amount_to_pay=amount_to_pay,
+        has_amendments=False,
+    )
+
+
+def create_contract_with_contractors(source_id, parent=None):
+    date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+    entity = models.Entity.objects.create(
+        name=f"Entity {source_id}", source_id=source_id
+    )
+    contract = create_contract(source_id, date_of_grant, entity=entity)
+    contract.parent = parent
+    contract.save()
+
+    for offset in (0, 1000):
+        contractor = models.Contractor.objects.create(
+            name=f"Contractor {source_id + offset}", source_id=source_id + offset
+        )
+        contract.contractors.add(contractor)
+
+    return contract
+
+
+class ListQueryCountMixin:
+    def setUp(self):
+        cache.clear()
+
+    def count_list_queries(self, url):
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context)
+
+
+class TestContractViewSet(ListQueryCountMixin, APITestCase):
     def test_viewset_list_url(self):
         url = reverse("v1:contract-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_viewset_list_facets(self):
+        entity = models.Entity.objects.create(name="Test Entity", source_id=1)
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        create_contract(1, date_of_grant, entity=entity, amount_to_pay=50_000)
+        create_contract(2, date_of_grant, entity=entity, amount_to_pay=-500)
+
+        url = reverse("v1:contract-list")
+        response = self.client.get(url, {"facets": "true"})
+        facets = response.data["facets"]
+        self.assertEqual(
+            facets["entity"], [{"id": entity.pk, "name": "Test Entity", "count": 2}]
+        )
+        self.assertEqual(facets["fiscal_year"], [{"value": 2020, "count": 2}])
+
+        # Negative amounts aren't in any bucket
+        self.assertEqual(
+            facets["amount"], [{"min": 10_000, "max": 100_000, "count": 1}]
+        )
+
+    def test_viewset_list_cursor_pagination(self):
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        contracts = [
+            create_contract(1, date_of_grant),
+            create_contract(2, date_of_grant),
+            create_contract(3, date_of_grant - datetime.timedelta(days=1)),
+        ]
+
+        url = reverse("v1:contract-list")
+        response = self.client.get(url, {"cursor": "", "page_size": 2})
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["links"]["previous"])
+        self.assertEqual(
+            [contract["id"] for contract in response.data["results"]],
+            [contracts[1].pk, contracts[0].pk],
+        )
+
+        response = self.client.get(response.data["links"]["next"])
+        self.assertIsNone(response.data["links"]["next"])
+        self.assertEqual(
+            [contract["id"] for contract in response.data["results"]],
+            [contracts[2].pk],
+        )
+
+        response = self.client.get(response.data["links"]["previous"])
+        self.assertEqual(
+            [contract["id"] for contract in response.data["results"]],
+            [contracts[1].pk, contracts[0].pk],
+        )
+
+    def test_viewset_list_constant_queries(self):
+        url = reverse("v1:contract-list")
+        parent = create_contract_with_contractors(1)
+        create_contract_with_contractors(2, parent=parent)
+        expected_queries = self.count_list_queries(url)
+
+        for source_id in range(3, 8):
+            create_contract_with_contractors(source_id, parent=parent)
+
+        self.assertEqual(self.count_list_queries(url), expected_queries)
+
+    def test_viewset_list_search_pages_cached_results(self):
+        entity = models.Entity.objects.create(name="Departamento de Salud", source_id=1)
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        contracts = [
+            create_contract(
+                source_id, date_of_grant - datetime.timedelta(days=source_id), entity
+            )
+            for source_id in range(1, 4)
+        ]
+
+        for contract in contracts:
+            index_contract(contract)
+
+        url = reverse("v1:contract-list")
+        results = []
+
+        # Only the first two matches are cached, the last page searches again
+        with self.settings(API_SEARCH_CACHE_MAX_RESULTS=2):
+            for page in range(1, 4):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(
+                        url, {"search": "salud", "page": page, "page_size": 1}
+                    )
+
+                self.assertEqual(response.data["count"], 3)
+                self.assertTrue(response.data["count_exact"])
+                results.extend(contract["id"] for contract in response.data["results"])
+
+                # Later pages are fetched by their cached ids, instead of
+                # searching the matches again
+                if page > 1:
+                    queries = [query["sql"] for query in context.captured_queries]
+                    self.assertEqual(any("MATCH" in sql for sql in queries), page > 2)
+
+        self.assertEqual(results, [contract.pk for contract in contracts])
+
+    def test_viewset_list_invalid_cursor(self):
+        url = reverse("v1:contract-list")
+        response = self.client.get(url, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_viewset_list_sparse_fields(self):
+        parent = create_contract_with_contractors(1)
+        create_contract_with_contractors(2, parent=parent)
+
+        url = reverse("v1:contract-list")
+        response = self.client.get(url, {"fields": "number,amount_to_pay"})
+        self.assertEqual(
+            [set(contract) for contract in response.data["results"]],
+            [{"number", "amount_to_pay"}] * 2,
+        )
+
+        # Only the count and the page itself, without joins or prefetches
+        self.assertEqual(
+            self.count_list_queries(f"{url}?fields=number,amount_to_pay"), 2
+        )
+
+    def test_viewset_list_expand(self):
+        parent = create_contract_with_contractors(1)
+        contract = create_contract_with_contractors(2, parent=parent)
+
+        url = reverse("v1:contract-list")
+        response = self.client.get(
+            url, {"fields": "id,entity,parent,contractors", "expand": "entity"}
+        )
+        results = {result["id"]: result for result in response.data["results"]}
+        result = results[contract.pk]
+        self.assertEqual(result["entity"]["name"], "Entity 2")
+        self.assertEqual(result["parent"], parent.pk)
+        self.assertEqual(
+            sorted(result["contractors"]),
+            sorted(contract.contractors.values_list("pk", flat=True)),
+        )
+
+    def test_viewset_batch_slugs(self):
+        first = create_contract_with_contractors(1)
+        second = create_contract_with_contractors(2)
+
+        url = reverse("v1:contract-batch")
+        response = self.client.get(
+            url, {"slugs": f"{second.slug},missing,{first.slug}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["id"] for result in response.data["results"]],
+            [second.pk, first.pk],
+        )
+        self.assertEqual(len(response.data["results"][0]["contractors"]), 2)
+
+    def test_viewset_batch_constant_queries(self):
+        contracts = [create_contract_with_contractors(i) for i in range(1, 4)]
+        ids = ",".join(str(contract.pk) for contract in contracts)
+        url = reverse("v1:contract-batch")
+
+        # The same prefetches no matter how many contracts are requested
+        self.assertEqual(
+            self.count_list_queries(f"{url}?ids={contracts[0].pk}"),
+            self.count_list_queries(f"{url}?ids={ids}"),
+        )
+
+    def test_viewset_batch_invalid(self):
+        url = reverse("v1:contract-batch")
+        ids = ",".join(str(i) for i in range(101))
+
+        for params in [{}, {"ids": "1", "slugs": "a"}, {"ids": "a"}, {"ids": ids}]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_viewset_export_csv(self):
+        contract = create_contract_with_contractors(1)
+        create_contract_with_contractors(2)
 
-class TestContractorViewSet(APITestCase):
+        url = reverse("v1:contract-export")
+        response = self.client.get(url, {"entity_id": contract.entity_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["id"], str(contract.pk))
+        self.assertEqual(rows[0]["entity_name"], "Entity 1")
+        self.assertEqual(rows[0]["contractor_names"], "Contractor 1|Contractor 1001")
+
+    def test_viewset_export_jsonl(self):
+        contract = create_contract_with_contractors(1)
+
+        url = reverse("v1:contract-export")
+        response = self.client.get(url, {"export_format": "jsonl"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+
+        content = gzip.decompress(b"".join(response.streaming_content))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["id"], contract.pk)
+        self.assertEqual(rows[0]["date_of_grant"], "2019-08-01T00:00:00Z")
+        self.assertEqual(
+            [contractor["name"] for contractor in rows[0]["contractors"]],
+            ["Contractor 1", "Contractor 1001"],
+        )
+
+    def test_viewset_export_invalid_format(self):
+        url = reverse("v1:contract-export")
+        response = self.client.get(url, {"export_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestContractorViewSet(ListQueryCountMixin, APITestCase):
     def test_viewset_list_url(self):
         url = reverse("v1:contractor-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_viewset_list_constant_queries(self):
+        url = reverse("v1:contractor-list")
+        create_contract_with_contractors(1)
+        expected_queries = self.count_list_queries(url)
+
+        for source_id in range(2, 6):
+            create_contract_with_contractors(source_id)
+
+        self.assertEqual(self.count_list_queries(url), expected_queries)
+
+    def test_viewset_list_entities(self):
+        contract = create_contract_with_contractors(1)
+        response = self.client.get(reverse("v1:contractor-list"))
+
+        for contractor in response.data["results"]:
+            self.assertEqual(
+                [entity["id"] for entity in contractor["entities"]],
+                [contract.entity_id],
+            )
+
+    def test_viewset_batch_ids(self):
+        contract = create_contract_with_contractors(1)
+        contractors = list(contract.contractors.order_by("-pk"))
+
+        url = reverse("v1:contractor-batch")
+        response = self.client.get(
+            url, {"ids": ",".join(str(contractor.pk) for contractor in contractors)}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["id"] for result in response.data["results"]],
+            [contractor.pk for contractor in contractors],
+        )
+
 
 class TestDocumentViewSet(APITestCase):
     @classmethod
@@ -50,6 +348,26 @@ class TestEntityViewSet(APITestCase):
         for key in ("contracts_total", "contracts_count"):
             self.assertIn(key, response.data)
 
+    def test_viewset_list_ordering_contracts_total(self):
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        small = models.Entity.objects.create(name="Small", source_id=1)
+        large = models.Entity.objects.create(name="Large", source_id=2)
+        models.Entity.objects.create(name="Empty", source_id=3)
+        create_contract(1, date_of_grant, entity=small, amount_to_pay=100)
+        create_contract(2, date_of_grant, entity=large, amount_to_pay=1000)
+        create_contract(3, date_of_grant, entity=large, amount_to_pay=1000)
+        refresh_all_aggregates()
+
+        url = reverse("v1:entity-list")
+        response = self.client.get(url, {"ordering": "-contracts_total"})
+        self.assertEqual(
+            [
+                (entity["name"], entity["contracts_total"], entity["contracts_count"])
+                for entity in response.data["results"]
+            ],
+            [("Large", 2000, 2), ("Small", 100, 1), ("Empty", None, 0)],
+        )
+
 
 class TestServiceGroupViewSet(APITestCase):
     def test_viewset_list_url(self):
@@ -63,3 +381,132 @@ class TestServiceViewSet(APITestCase):
         url = reverse("v1:service-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TestCollectionJobViewSet(APITestCase):
+    def test_viewset_artifacts(self):
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        entity = models.Entity.objects.create(name="Test Entity", source_id=1)
+        contract = create_contract(1, date_of_grant, entity=entity)
+        collection_job = models.CollectionJob.objects.create(
+            date_of_grant_start=date_of_grant, date_of_grant_end=date_of_grant
+        )
+        collection_job.create_artifacts(
+            [{"obj": entity, "created": True}, {"obj": contract, "created": False}]
+        )
+        url = reverse("v1:collectionjob-artifacts", kwargs={"pk": collection_job.pk})
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {"type": "contract"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any("contenttype" in query["sql"] for query in context.captured_queries)
+        )
+        [artifact] = response.data["results"]
+        self.assertEqual(artifact["type"], "contract")
+        self.assertFalse(artifact["created"])
+        self.assertEqual(artifact["data"]["id"], contract.pk)
+        self.assertEqual(artifact["data"]["entity"], entity.pk)
+        self.assertEqual(artifact["data"]["amount_to_pay"], 1000)
+
+        response = self.client.get(url)
+        self.assertEqual(
+            [artifact["type"] for artifact in response.data["results"]],
+            ["contract", "entity"],
+        )
+
+        # Totals aren't part of what was scraped
+        self.assertEqual(
+            list(response.data["results"][1]["data"]),
+            ["id", "created_at", "modified_at", "name", "source_id", "slug"],
+        )
+
+    def test_viewset_artifacts_invalid_type(self):
+        today = timezone.now().date()
+        collection_job = models.CollectionJob.objects.create(
+            date_of_grant_start=today, date_of_grant_end=today
+        )
+        url = reverse("v1:collectionjob-artifacts", kwargs={"pk": collection_job.pk})
+        response = self.client.get(url, {"type": "user"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestChangeViewSet(APITransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_changes(self, **params):
+        response = self.client.get(reverse("v1:change-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_viewset_list_changes(self):
+        contract = create_contract_with_contractors(1)
+        contract.amount_to_pay = 2000
+        contract.save()
+        contractor_id = contract.contractors.values_list("pk", flat=True)[0]
+        models.Contractor.objects.get(pk=contractor_id).delete()
+
+        data = self.get_changes()
+        changes = [
+            (change["resource"], change["object_id"], change["action"])
+            for change in data["results"]
+        ]
+        self.assertEqual(changes[0], ("entity", contract.entity_id, "created"))
+        self.assertIn(("contract", contract.pk, "created"), changes)
+        self.assertEqual(changes[-2], ("contract", contract.pk, "updated"))
+        self.assertEqual(changes[-1], ("contractor", contractor_id, "deleted"))
+        self.assertEqual(data["cursor"], data["results"][-1]["id"])
+        self.assertFalse(data["has_more"])
+
+    def test_viewset_list_changes_since(self):
+        create_contract_with_contractors(1)
+        cursor = self.get_changes()["cursor"]
+
+        self.assertEqual(self.get_changes(since=cursor)["results"], [])
+
+        entity = models.Entity.objects.create(name="Entity 2", source_id=2)
+        data = self.get_changes(since=cursor)
+        self.assertEqual(len(data["results"]), 1)
+        self.assertEqual(data["results"][0]["object_id"], entity.pk)
+        self.assertGreater(data["cursor"], cursor)
+
+    def test_viewset_list_changes_page_size(self):
+        create_contract_with_contractors(1)
+
+        data = self.get_changes(page_size=2)
+        self.assertTrue(data["has_more"])
+        self.assertIn(f"since={data['cursor']}", data["links"]["next"])
+
+    def test_viewset_list_changes_invalid_since(self):
+        response = self.client.get(reverse("v1:change-list"), {"since": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_viewset_list_changes_contractor_cleared(self):
+        contract = create_contract_with_contractors(1)
+        contractor = contract.contractors.all()[0]
+        cursor = self.get_changes()["cursor"]
+
+        contractor.contract_set.clear()
+
+        changes = [
+            (change["resource"], change["object_id"], change["action"])
+            for change in self.get_changes(since=cursor)["results"]
+        ]
+        self.assertEqual(changes, [("contract", contract.pk, "updated")])
+
+    def test_prune_changes(self):
+        create_contract_with_contractors(1)
+        cursor = self.get_changes()["cursor"]
+        models.Change.objects.update(
+            created_at=timezone.now() - datetime.timedelta(days=100)
+        )
+        entity = models.Entity.objects.create(name="Entity 2", source_id=2)
+
+        self.assertGreater(prune_changes(days=90), 0)
+
+        data = self.get_changes()
+        self.assertEqual(len(data["results"]), 1)
+        self.assertEqual(data["results"][0]["object_id"], entity.pk)
+        self.assertGreater(data["cursor"], cursor)
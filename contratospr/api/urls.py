@@ -3,8 +3,9 @@ from django.views.generic import TemplateView
 from rest_framework.routers import DefaultRouter
 from rest_framework.schemas import get_schema_view
 
-from .views import HomePageView, TrendsGeneralView, TrendsServicesView
+from .views import AutocompleteView, HomePageView, TrendsGeneralView, TrendsServicesView
 from .viewsets import (
+    ChangeViewSet,
     CollectionJobViewSet,
     ContractorViewSet,
     ContractViewSet,
@@ -26,12 +27,14 @@ router.register(r"entities", EntityViewSet)
 router.register(r"service-groups", ServiceGroupViewSet)
 router.register(r"services", ServiceViewSet)
 router.register(r"collection-jobs", CollectionJobViewSet)
+router.register(r"changes", ChangeViewSet)
 
 urlpatterns = [
     path("v1/", include((router.urls, "api"), namespace="v1")),
     path("v1/pages/home/", HomePageView.as_view()),
     path("v1/pages/trends/general/", TrendsGeneralView.as_view()),
     path("v1/pages/trends/services/", TrendsServicesView.as_view()),
+    path("v1/autocomplete/", AutocompleteView.as_view()),
     path(
         "v1/docs/schema.json",
         get_schema_view(title="Contratos de Puerto Rico"),
@@ -1,12 +1,23 @@
-from django.db.models import Avg, Count, Q, Sum
+from django.db.models import Sum
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from ..contracts.models import Contract, Contractor, Entity, Service, ServiceGroup
+from ..contracts.autocomplete import autocomplete
+from ..contracts.models import (
+    Contract,
+    Contractor,
+    ContractRollup,
+    Entity,
+    FiscalYearRollup,
+    Service,
+    ServiceGroup,
+)
 from ..contracts.utils import get_current_fiscal_year, get_fiscal_year_range
-from ..utils.aggregates import Median
-from .mixins import CachedAPIViewMixin
+from ..contracts.versions import CONTRACTORS, CONTRACTS, ENTITIES, ROLLUPS, SERVICES
+from ..utils.concurrency import run_concurrently
+from .mixins import CachedAPIViewMixin, ConditionalGetMixin, ReplicaReadMixin
 from .serializers import (
+    AutocompleteSerializer,
     ContractorSerializer,
     ContractSerializer,
     EntitySerializer,
@@ -18,16 +29,15 @@ from .serializers import (
 
 
 def get_general_trend(fiscal_year):
-    start_date, end_date = get_fiscal_year_range(fiscal_year)
-
-    contracts = (
-        Contract.objects.select_related("service", "service__group")
-        .filter(effective_date_from__gte=start_date, effective_date_from__lte=end_date)
-        .only("amount_to_pay", "service", "slug", "number")
-        .order_by("amount_to_pay")
+    # Every figure comes from the same rollup, so they agree with each other
+    # even when contracts changed since it was built
+    rollup = (
+        FiscalYearRollup.objects.select_related("min_contract", "max_contract")
+        .filter(fiscal_year=fiscal_year)
+        .first()
     )
 
-    contracts_count = contracts.count()
+    contracts_count = 0
     contracts_total = 0
     contracts_average = 0
     contractors_count = 0
@@ -35,21 +45,23 @@ def get_general_trend(fiscal_year):
     min_amount_to_pay_contract = 0
     max_amount_to_pay_contract = 0
 
-    if contracts_count:
-        min_amount_to_pay_contract = SimpleContractSerializer(contracts.first()).data
-        max_amount_to_pay_contract = SimpleContractSerializer(contracts.last()).data
+    if rollup:
+        # Unless they were deleted since
+        if rollup.min_contract:
+            min_amount_to_pay_contract = SimpleContractSerializer(
+                rollup.min_contract
+            ).data
 
-        stats = contracts.aggregate(
-            total=Sum("amount_to_pay"),
-            avg=Avg("amount_to_pay"),
-            median=Median("amount_to_pay"),
-        )
+        if rollup.max_contract:
+            max_amount_to_pay_contract = SimpleContractSerializer(
+                rollup.max_contract
+            ).data
 
-        contracts_total = stats["total"]
-        contracts_median = stats["median"]
-        contracts_average = stats["avg"]
-
-        contractors_count = Contractor.objects.filter(contract__in=contracts).count()
+        contracts_count = rollup.contracts_count
+        contracts_total = rollup.contracts_total
+        contracts_median = rollup.contracts_median
+        contracts_average = contracts_total / contracts_count
+        contractors_count = rollup.contractors_count
 
     return {
         "fiscal_year": fiscal_year,
@@ -78,46 +90,26 @@ def get_general_trend(fiscal_year):
 
 
 def get_service_trend(fiscal_year):
-    start_date, end_date = get_fiscal_year_range(fiscal_year)
-
-    contracts = (
-        Contract.objects.select_related("service", "service__group")
-        .filter(effective_date_from__gte=start_date, effective_date_from__lte=end_date)
-        .only("amount_to_pay", "service", "slug", "number")
-        .order_by("amount_to_pay")
-    )
-
     services = (
-        Service.objects.filter(contract__in=contracts)
+        Service.objects.filter(
+            rollups__fiscal_year=fiscal_year, rollups__is_amendment=False
+        )
         .select_related("group")
         .annotate(
-            contracts_total=Sum(
-                "contract__amount_to_pay",
-                filter=Q(contract__parent=None, contract__in=contracts),
-            ),
-            contracts_count=Count(
-                "contract", filter=Q(contract__parent=None, contract__in=contracts)
-            ),
+            contracts_total=Sum("rollups__contracts_total"),
+            contracts_count=Sum("rollups__contracts_count"),
         )
         .filter(contracts_total__gt=0, contracts_count__gt=0)
         .order_by("-contracts_total")
     )
 
     service_groups = (
-        ServiceGroup.objects.filter(service__contract__in=contracts)
+        ServiceGroup.objects.filter(
+            rollups__fiscal_year=fiscal_year, rollups__is_amendment=False
+        )
         .annotate(
-            contracts_total=Sum(
-                "service__contract__amount_to_pay",
-                filter=Q(
-                    service__contract__parent=None, service__contract__in=contracts
-                ),
-            ),
-            contracts_count=Count(
-                "service__contract",
-                filter=Q(
-                    service__contract__parent=None, service__contract__in=contracts
-                ),
-            ),
+            contracts_total=Sum("rollups__contracts_total"),
+            contracts_count=Sum("rollups__contracts_count"),
         )
         .filter(contracts_total__gt=0, contracts_count__gt=0)
         .order_by("-contracts_total")
@@ -140,8 +132,9 @@ def get_service_trend(fiscal_year):
     }
 
 
-class HomePageView(CachedAPIViewMixin, APIView):
+class HomePageView(ReplicaReadMixin, ConditionalGetMixin, CachedAPIViewMixin, APIView):
     schema = None
+    data_resources = [CONTRACTS, CONTRACTORS, ENTITIES, SERVICES, ROLLUPS]
 
     def get(self, request, format=None):
         serializer = HomeSerializer(data=request.GET)
@@ -176,50 +169,55 @@ class HomePageView(CachedAPIViewMixin, APIView):
             .defer("document__pages")
         )
 
-        contracts_total = contracts.aggregate(total=Sum("amount_to_pay"))["total"]
-
         recent_contracts = contracts.order_by("-effective_date_from")[:5]
 
+        rollups = ContractRollup.objects.filter(
+            fiscal_year=fiscal_year, is_amendment=False
+        )
+
         contractors = (
-            Contractor.objects.prefetch_related("contract_set")
-            .filter(
-                contract__parent=None,
-                contract__effective_date_from__gte=start_date,
-                contract__effective_date_from__lte=end_date,
+            Contractor.objects.filter(
+                rollups__fiscal_year=fiscal_year, rollups__is_amendment=False
             )
             .annotate(
-                contracts_total=Sum("contract__amount_to_pay"),
-                contracts_count=Count("contract"),
+                contracts_total=Sum("rollups__contracts_total"),
+                contracts_count=Sum("rollups__contracts_count"),
             )
             .order_by("-contracts_total")
         )[:5]
 
         entities = (
-            Entity.objects.prefetch_related("contract_set")
-            .filter(
-                contract__parent=None,
-                contract__effective_date_from__gte=start_date,
-                contract__effective_date_from__lte=end_date,
+            Entity.objects.filter(
+                rollups__fiscal_year=fiscal_year, rollups__is_amendment=False
             )
             .annotate(
-                contracts_total=Sum("contract__amount_to_pay"),
-                contracts_count=Count("contract"),
+                contracts_total=Sum("rollups__contracts_total"),
+                contracts_count=Sum("rollups__contracts_count"),
             )
             .order_by("-contracts_total")
         )[:5]
 
-        serializer_context = {"request": request}
-        recent_contracts_data = ContractSerializer(
-            recent_contracts, context=serializer_context, many=True
-        ).data
-
-        contractors_data = ContractorSerializer(
-            contractors, context=serializer_context, many=True
-        ).data
-
-        entities_data = EntitySerializer(
-            entities, context=serializer_context, many=True
-        ).data
+        # The queries are independent, so they run at the same time. Each
+        # serializer gets its own context, since loaders are kept there.
+        (
+            stats,
+            recent_contracts_data,
+            contractors_data,
+            entities_data,
+        ) = run_concurrently(
+            lambda: rollups.aggregate(
+                total=Sum("contracts_total"), count=Sum("contracts_count")
+            ),
+            lambda: ContractSerializer(
+                recent_contracts, context={"request": request}, many=True
+            ).data,
+            lambda: ContractorSerializer(
+                contractors, context={"request": request}, many=True
+            ).data,
+            lambda: EntitySerializer(
+                entities, context={"request": request}, many=True
+            ).data,
+        )
 
         context = {
             "fiscal_year": {
@@ -231,40 +229,61 @@ class HomePageView(CachedAPIViewMixin, APIView):
             "recent_contracts": recent_contracts_data,
             "contractors": contractors_data,
             "entities": entities_data,
-            "contracts_count": contracts.count(),
-            "contracts_total": contracts_total,
+            "contracts_count": stats["count"] or 0,
+            "contracts_total": stats["total"],
         }
 
         return Response(context)
 
 
-class TrendsGeneralView(CachedAPIViewMixin, APIView):
+class TrendsGeneralView(
+    ReplicaReadMixin, ConditionalGetMixin, CachedAPIViewMixin, APIView
+):
     schema = None
+    data_resources = [CONTRACTS, CONTRACTORS, SERVICES, ROLLUPS]
 
     def get(self, request, format=None):
         current_fiscal_year = get_current_fiscal_year()
 
         fiscal_year = int(request.GET.get("fiscal_year", current_fiscal_year))
 
-        return Response(
-            {
-                "a": get_general_trend(fiscal_year),
-                "b": get_general_trend(fiscal_year - 1),
-            }
+        trend_a, trend_b = run_concurrently(
+            lambda: get_general_trend(fiscal_year),
+            lambda: get_general_trend(fiscal_year - 1),
         )
 
+        return Response({"a": trend_a, "b": trend_b})
+
 
-class TrendsServicesView(CachedAPIViewMixin, APIView):
+class TrendsServicesView(
+    ReplicaReadMixin, ConditionalGetMixin, CachedAPIViewMixin, APIView
+):
     schema = None
+    data_resources = [CONTRACTS, SERVICES, ROLLUPS]
 
     def get(self, request, format=None):
         current_fiscal_year = get_current_fiscal_year()
 
         fiscal_year = int(request.GET.get("fiscal_year", current_fiscal_year))
 
+        trend_a, trend_b = run_concurrently(
+            lambda: get_service_trend(fiscal_year),
+            lambda: get_service_trend(fiscal_year - 1),
+        )
+
+        return Response({"a": trend_a, "b": trend_b})
+
+
+class AutocompleteView(ReplicaReadMixin, ConditionalGetMixin, APIView):
+    schema = None
+    data_resources = [CONTRACTORS, ENTITIES, SERVICES]
+
+    def get(self, request, format=None):
+        serializer = AutocompleteSerializer(data=request.GET)
+        serializer.is_valid(raise_exception=True)
+
         return Response(
-            {
-                "a": get_service_trend(fiscal_year),
-                "b": get_service_trend(fiscal_year - 1),
-            }
+            autocomplete(
+                serializer.validated_data["q"], serializer.validated_data["limit"]
+            )
         )
@@ -1,12 +1,13 @@
-from django.contrib.contenttypes.models import ContentType
-from django.db.models import Count, Sum
+from django.db.models import Count, F, Prefetch, Sum
 from django.db.models.functions import TruncMonth
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from rest_framework import filters, mixins, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from ..contracts.models import (
+    Change,
     CollectionJob,
     Contract,
     Contractor,
@@ -16,6 +17,18 @@ from ..contracts.models import (
     ServiceGroup,
 )
 from ..contracts.utils import get_fiscal_year_range
+from ..contracts.versions import (
+    CHANGES,
+    COLLECTIONS,
+    CONTRACTORS,
+    CONTRACTS,
+    DOCUMENTS,
+    ENTITIES,
+    SEARCH,
+    SERVICES,
+)
+from .exports import EXPORT_FORMATS, export_contracts
+from .facets import get_contract_facets
 from .filters import (
     ContractFilter,
     ContractorFilter,
@@ -25,10 +38,25 @@ from .filters import (
     ServiceFilter,
     SimpleDjangoFilterBackend,
 )
-from .mixins import CachedAPIViewMixin
-from .pagination import PageNumberPagination
+from .mixins import (
+    BatchRetrieveMixin,
+    CachedAPIViewMixin,
+    CompiledListMixin,
+    ConditionalGetMixin,
+    KeysetPaginationMixin,
+    ReplicaReadMixin,
+    SearchResultsMixin,
+)
+from .pagination import (
+    KeysetPagination,
+    PageNumberPagination,
+    SequencePagination,
+    use_keyset_pagination,
+)
 from .schemas import CustomAutoSchema
 from .serializers import (
+    ARTIFACT_TYPES,
+    ChangeSerializer,
     CollectionArtifactSerializer,
     CollectionJobSerializer,
     ContractorSerializer,
@@ -37,22 +65,40 @@ from .serializers import (
     EntitySerializer,
     ServiceGroupSerializer,
     ServiceSerializer,
+    get_expanded_fields,
+    get_requested_fields,
 )
 
+# The stored totals, under the names the API uses
+CONTRACT_TOTALS = {
+    "contracts_total": F("total_contracts_amount"),
+    "contracts_count": F("total_contracts_count"),
+}
 
-class CachedReadOnlyModelViewSet(CachedAPIViewMixin, viewsets.ReadOnlyModelViewSet):
+
+class CachedReadOnlyModelViewSet(
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    CachedAPIViewMixin,
+    BatchRetrieveMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     pass
 
 
-class ContractViewSet(CachedReadOnlyModelViewSet):
+class ContractViewSet(
+    SearchResultsMixin,
+    CompiledListMixin,
+    KeysetPaginationMixin,
+    CachedReadOnlyModelViewSet,
+):
     schema = CustomAutoSchema(tags=["contracts"])
+    data_resources = [CONTRACTS, CONTRACTORS, ENTITIES, SERVICES, DOCUMENTS, SEARCH]
     queryset = (
         Contract.objects.select_related(
-            "document",
             "entity",
             "service",
             "service__group",
-            "parent__document",
             "parent__entity",
             "parent__service",
             "parent__service__group",
@@ -79,6 +125,89 @@ class ContractViewSet(CachedReadOnlyModelViewSet):
     ]
     ordering = ["-date_of_grant"]
     lookup_field = "slug"
+    facets_param = "facets"
+    export_format_param = "export_format"
+    cache_exempt_actions = ["export"]
+
+    # Joins needed to render each nested relation in full
+    relation_select_related = {
+        "entity": ["entity"],
+        "service": ["service", "service__group"],
+        "parent": ["parent__entity", "parent__service", "parent__service__group"],
+    }
+    relation_prefetch_related = {
+        "contractors": ["contractors"],
+        "parent": ["parent__contractors", "parent__amendments"],
+        "amendments": ["amendments"],
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = get_requested_fields(self.request)
+        expanded = get_expanded_fields(self.request)
+
+        if requested is None and expanded is None:
+            return queryset
+
+        def is_rendered(field_name):
+            return requested is None or field_name in requested
+
+        def is_expanded(field_name):
+            return is_rendered(field_name) and (
+                expanded is None or field_name in expanded
+            )
+
+        # Relations that are rendered as primary keys only need their ids
+        pk_prefetches = {
+            "contractors": Prefetch(
+                "contractors", queryset=Contractor.objects.only("id")
+            ),
+            "amendments": Prefetch(
+                "amendments", queryset=Contract.objects.only("id", "parent")
+            ),
+        }
+
+        select_related = []
+        prefetch_related = []
+
+        for field_name, lookups in self.relation_select_related.items():
+            if is_expanded(field_name):
+                select_related.extend(lookups)
+
+        for field_name, lookups in self.relation_prefetch_related.items():
+            if is_expanded(field_name):
+                prefetch_related.extend(lookups)
+            elif is_rendered(field_name) and field_name in pk_prefetches:
+                prefetch_related.append(pk_prefetches[field_name])
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+
+        # The parent is a contract too and deferred columns apply per model,
+        # so columns can only be deferred when the parent isn't expanded.
+        if requested is not None and not is_expanded("parent"):
+            queryset = queryset.only(*self.get_only_fields(requested))
+
+        return queryset
+
+    def get_only_fields(self, requested):
+        model_fields = {field.name for field in Contract._meta.concrete_fields}
+        fields = {"id", self.lookup_field, *self.ordering_fields}
+        return fields | (requested & model_fields)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+
+        if request.query_params.get(self.facets_param) in ("1", "true", "True"):
+            queryset = self.filter_queryset(self.get_queryset())
+            response.data["facets"] = get_contract_facets(queryset)
+
+        return response
 
     @action(detail=False)
     def spending_over_time(self, request):
@@ -103,13 +232,26 @@ class ContractViewSet(CachedReadOnlyModelViewSet):
 
         return Response(queryset)
 
+    @action(detail=False)
+    def export(self, request):
+        export_format = request.query_params.get(self.export_format_param, "csv")
+
+        if export_format not in EXPORT_FORMATS:
+            choices = ", ".join(EXPORT_FORMATS)
+            raise ValidationError(
+                {self.export_format_param: f"Must be one of: {choices}"}
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_contracts(queryset, export_format)
 
-class ContractorViewSet(CachedReadOnlyModelViewSet):
+
+class ContractorViewSet(
+    CompiledListMixin, KeysetPaginationMixin, CachedReadOnlyModelViewSet
+):
     schema = CustomAutoSchema(tags=["contractors"])
-    queryset = Contractor.objects.all().annotate(
-        contracts_total=Sum("contract__amount_to_pay"),
-        contracts_count=Count("contract"),
-    )
+    data_resources = [CONTRACTORS, CONTRACTS, ENTITIES]
+    queryset = Contractor.objects.annotate(**CONTRACT_TOTALS)
     serializer_class = ContractorSerializer
     filterset_class = ContractorFilter
     filter_backends = [
@@ -123,18 +265,31 @@ class ContractorViewSet(CachedReadOnlyModelViewSet):
     lookup_field = "slug"
 
 
-class DocumentViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class DocumentViewSet(
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
     schema = CustomAutoSchema(tags=["documents"])
+    data_resources = [DOCUMENTS]
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = get_requested_fields(self.request)
+
+        if requested is not None and "pages" not in requested:
+            queryset = queryset.defer("pages")
+
+        return queryset
+
 
 class EntityViewSet(CachedReadOnlyModelViewSet):
     schema = CustomAutoSchema(tags=["entities"])
-    queryset = Entity.objects.all().annotate(
-        contracts_total=Sum("contract__amount_to_pay"),
-        contracts_count=Count("contract"),
-    )
+    data_resources = [ENTITIES, CONTRACTS]
+    queryset = Entity.objects.annotate(**CONTRACT_TOTALS)
     serializer_class = EntitySerializer
     filterset_class = EntityFilter
     filter_backends = [
@@ -143,25 +298,27 @@ class EntityViewSet(CachedReadOnlyModelViewSet):
         SimpleDjangoFilterBackend,
     ]
     search_fields = ["name"]
-    ordering_fields = ["name"]
+    ordering_fields = ["name", "contracts_count", "contracts_total"]
     ordering = ["name"]
     lookup_field = "slug"
 
 
 class ServiceGroupViewSet(CachedReadOnlyModelViewSet):
     schema = CustomAutoSchema(tags=["service groups"])
-    queryset = ServiceGroup.objects.all()
+    data_resources = [SERVICES, CONTRACTS]
+    queryset = ServiceGroup.objects.annotate(**CONTRACT_TOTALS)
     serializer_class = ServiceGroupSerializer
     filter_backends = [NullsLastOrderingFilter, filters.SearchFilter]
     search_fields = ["name"]
-    ordering_fields = ["name"]
+    ordering_fields = ["name", "contracts_count", "contracts_total"]
     ordering = ["name"]
     lookup_field = "slug"
 
 
 class ServiceViewSet(CachedReadOnlyModelViewSet):
     schema = CustomAutoSchema(tags=["services"])
-    queryset = Service.objects.select_related("group")
+    data_resources = [SERVICES, CONTRACTS]
+    queryset = Service.objects.select_related("group").annotate(**CONTRACT_TOTALS)
     serializer_class = ServiceSerializer
     filterset_class = ServiceFilter
     filter_backends = [
@@ -177,21 +334,51 @@ class ServiceViewSet(CachedReadOnlyModelViewSet):
 
 class CollectionJobViewSet(CachedReadOnlyModelViewSet):
     queryset = CollectionJob.objects.all()
+    data_resources = [COLLECTIONS]
     serializer_class = CollectionJobSerializer
 
     @action(detail=True, methods=["get"])
     def artifacts(self, request, pk=None):
         collection_job = self.get_object()
-        queryset = collection_job.artifacts.all()
+        queryset = collection_job.artifacts.order_by("-id")
         model_type = request.query_params.get("type")
 
         if model_type:
-            artifact_type = get_object_or_404(
-                ContentType, app_label="contracts", model=model_type
-            )
-            queryset = collection_job.artifacts.filter(content_type=artifact_type)
+            if model_type not in ARTIFACT_TYPES:
+                raise Http404
+
+            queryset = queryset.filter(type=model_type)
+
+        # Artifacts are stored as they're returned, so there are no instances
+        # to build
+        queryset = queryset.values("id", "type", "created", "data")
+
+        if use_keyset_pagination(request):
+            paginator = KeysetPagination()
+        else:
+            paginator = PageNumberPagination()
 
-        paginator = PageNumberPagination()
         page = paginator.paginate_queryset(queryset, self.request, view=self)
         serializer = CollectionArtifactSerializer(page, many=True)
         return paginator.get_paginated_response(serializer.data)
+
+
+class ChangeViewSet(
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    CachedAPIViewMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Contracts, contractors and entities that were created, updated or
+    deleted, in commit order. Poll with the `cursor` of the previous
+    response as `since` to get the changes made after it. Changes are kept
+    for `CHANGES_RETENTION_DAYS`.
+    """
+
+    schema = CustomAutoSchema(tags=["changes"])
+    data_resources = [CHANGES]
+    queryset = Change.objects.all()
+    serializer_class = ChangeSerializer
+    pagination_class = SequencePagination
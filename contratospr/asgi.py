@@ -0,0 +1,19 @@
+"""
+ASGI config for contratospr project.
+It exposes the ASGI callable as a module-level variable named ``application``.
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+import os
+
+import configurations
+
+configuration = os.getenv("ENVIRONMENT", "development").title()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "contratospr.settings")
+os.environ.setdefault("DJANGO_CONFIGURATION", configuration)
+
+configurations.setup()
+
+from django.core.asgi import get_asgi_application  # noqa isort:skip
+
+application = get_asgi_application()
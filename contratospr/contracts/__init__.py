@@ -0,0 +1 @@
+default_app_config = "contratospr.contracts.apps.ContractsConfig"
@@ -0,0 +1,131 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from .changes import CHANGE_RESOURCES, record_change
+from .models import Change
+from .versions import CONTRACTORS, ENTITIES, SERVICES, bump_data_version
+
+# Path from each model to its contracts
+AGGREGATE_CONTRACTS = {
+    "Contractor": "contract",
+    "Entity": "contract",
+    "Service": "contract",
+    "ServiceGroup": "service__contract",
+}
+
+AGGREGATE_RESOURCES = {
+    "Contractor": CONTRACTORS,
+    "Entity": ENTITIES,
+    "Service": SERVICES,
+    "ServiceGroup": SERVICES,
+}
+
+AGGREGATE_FIELDS = [
+    "total_contracts_amount",
+    "total_contracts_count",
+    "first_contract_date",
+    "last_contract_date",
+]
+
+
+def refresh_aggregates(model, pks=None, batch_size=500):
+    """
+    Recompute the contract totals stored on `model` rows with the given
+    primary keys, or on all of them. Returns the number of rows refreshed.
+
+    Rows whose totals changed are recorded in the changes feed, which the
+    bulk updates don't reach through the save signals.
+    """
+    contracts = AGGREGATE_CONTRACTS[model._meta.object_name]
+    resource = CHANGE_RESOURCES.get(model._meta.object_name)
+    queryset = model.objects.order_by("pk")
+
+    if pks is not None:
+        queryset = queryset.filter(pk__in=list(pks))
+
+    queryset = queryset.annotate(
+        contracts_total=Sum(f"{contracts}__amount_to_pay"),
+        contracts_count=Count(contracts),
+        contracts_first=Min(f"{contracts}__date_of_grant"),
+        contracts_last=Max(f"{contracts}__date_of_grant"),
+    ).values(
+        "pk",
+        "contracts_total",
+        "contracts_count",
+        "contracts_first",
+        "contracts_last",
+        *AGGREGATE_FIELDS,
+    )
+
+    refreshed = 0
+    last_pk = None
+
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(batch[:batch_size])
+
+        if not rows:
+            break
+
+        objs = [
+            model(
+                pk=row["pk"],
+                total_contracts_amount=row["contracts_total"],
+                total_contracts_count=row["contracts_count"],
+                first_contract_date=row["contracts_first"],
+                last_contract_date=row["contracts_last"],
+            )
+            for row in rows
+        ]
+        changed = [
+            obj
+            for obj, row in zip(objs, rows)
+            if any(getattr(obj, field) != row[field] for field in AGGREGATE_FIELDS)
+        ]
+
+        # The changes are recorded once the totals they list are committed
+        with transaction.atomic():
+            model.objects.bulk_update(changed, AGGREGATE_FIELDS)
+
+            if resource:
+                record_change(resource, [obj.pk for obj in changed], Change.UPDATED)
+
+        refreshed += len(rows)
+        last_pk = rows[-1]["pk"]
+
+    return refreshed
+
+
+def refresh_related_aggregates(objs):
+    """
+    Refresh the totals of the contractors, entities, services and service
+    groups among `objs`, like the objects a contract update touched.
+    """
+    models = {}
+
+    for obj in objs:
+        if obj._meta.object_name in AGGREGATE_CONTRACTS:
+            models.setdefault(type(obj), set()).add(obj.pk)
+
+    for model, pks in models.items():
+        refresh_aggregates(model, pks)
+
+    # Updating in bulk doesn't send signals
+    bump_data_version(
+        {AGGREGATE_RESOURCES[model._meta.object_name] for model in models}
+    )
+
+
+def refresh_all_aggregates():
+    """
+    Recompute the totals of every row, which also corrects totals left stale
+    by changes made outside of scraping, like contracts moved to another
+    entity. Returns the number of rows refreshed by model name.
+    """
+    refreshed = {
+        model_name: refresh_aggregates(apps.get_model("contracts", model_name))
+        for model_name in AGGREGATE_CONTRACTS
+    }
+    bump_data_version(set(AGGREGATE_RESOURCES.values()))
+    return refreshed
@@ -1,5 +1,32 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class ContractsConfig(AppConfig):
-    name = "contracts"
+    name = "contratospr.contracts"
+
+    def ready(self):
+        from .changes import (
+            CHANGE_RESOURCES,
+            record_contractors_change,
+            record_delete,
+            record_save,
+        )
+        from .versions import (
+            MODEL_RESOURCES,
+            bump_contractors_data_version,
+            bump_model_data_version,
+        )
+
+        for model in self.get_models():
+            if model._meta.object_name in MODEL_RESOURCES:
+                post_save.connect(bump_model_data_version, sender=model)
+                post_delete.connect(bump_model_data_version, sender=model)
+
+            if model._meta.object_name in CHANGE_RESOURCES:
+                post_save.connect(record_save, sender=model)
+                post_delete.connect(record_delete, sender=model)
+
+        contractors_through = self.get_model("Contract").contractors.through
+        m2m_changed.connect(bump_contractors_data_version, sender=contractors_through)
+        m2m_changed.connect(record_contractors_change, sender=contractors_through)
@@ -0,0 +1,52 @@
+from django.core.cache.backends.locmem import LocMemCache
+
+from ..utils.routers import may_read_stale_data
+from .models import Contractor, Entity, Service
+from .versions import CONTRACTORS, ENTITIES, SERVICES, get_data_version
+
+AUTOCOMPLETE_SOURCES = {
+    "contractors": Contractor,
+    "entities": Entity,
+    "services": Service,
+}
+
+# Keep hot prefixes in process memory to avoid a database round trip on
+# every keystroke. Entries are keyed by data version, so they never outlive
+# the data they were computed from.
+prefix_cache = LocMemCache(
+    "contratospr.autocomplete", {"TIMEOUT": 60 * 60, "OPTIONS": {"MAX_ENTRIES": 5000}}
+)
+
+
+def normalize_prefix(value):
+    return " ".join(value.split()).lower()
+
+
+def get_matches(model, prefix, limit):
+    return list(
+        model.objects.filter(name__istartswith=prefix)
+        .order_by("name")
+        .values("id", "slug", "name")[:limit]
+    )
+
+
+def autocomplete(prefix, limit=5):
+    prefix = normalize_prefix(prefix)
+
+    if not prefix:
+        return {source: [] for source in AUTOCOMPLETE_SOURCES}
+
+    version = get_data_version([CONTRACTORS, ENTITIES, SERVICES])
+    cache_key = f"{version!r}:{limit}:{prefix}"
+    results = prefix_cache.get(cache_key)
+
+    if results is None:
+        results = {
+            source: get_matches(model, prefix, limit)
+            for source, model in AUTOCOMPLETE_SOURCES.items()
+        }
+
+        if not may_read_stale_data(version):
+            prefix_cache.set(cache_key, results)
+
+    return results
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Change
+from .versions import CHANGES, bump_data_version
+
+CHANGE_RESOURCES = {
+    "Contract": "contract",
+    "Contractor": "contractor",
+    "Entity": "entity",
+}
+
+# Arbitrary key of the PostgreSQL advisory lock taken to insert changes
+CHANGE_LOCK_ID = 4_300_201
+
+
+def lock_changes():
+    """
+    Serialize the transactions that insert changes, so that each one commits
+    before the next is assigned ids. Otherwise a later id could be visible
+    before an earlier one, and readers polling in between would skip it.
+    SQLite already allows a single writer at a time.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CHANGE_LOCK_ID])
+
+
+def record_change(resource, object_ids, action):
+    """
+    Record changes once the current transaction commits, so that the feed
+    follows commit order and never lists changes that were rolled back.
+    """
+    object_ids = list(object_ids)
+
+    def create_changes():
+        with transaction.atomic():
+            lock_changes()
+            Change.objects.bulk_create(
+                [
+                    Change(resource=resource, object_id=object_id, action=action)
+                    for object_id in object_ids
+                ]
+            )
+        bump_data_version([CHANGES])
+
+    if object_ids:
+        transaction.on_commit(create_changes)
+
+
+def record_save(sender, instance, created, **kwargs):
+    action = Change.CREATED if created else Change.UPDATED
+    record_change(CHANGE_RESOURCES[sender._meta.object_name], [instance.pk], action)
+
+
+def record_delete(sender, instance, **kwargs):
+    resource = CHANGE_RESOURCES[sender._meta.object_name]
+    record_change(resource, [instance.pk], Change.DELETED)
+
+
+def record_contractors_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # The contracts a contractor is cleared from are only known before
+        instance._cleared_contract_ids = list(
+            sender.objects.filter(contractor=instance).values_list(
+                "contract_id", flat=True
+            )
+        )
+        return
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    # Contractors are part of the contract, so changing them updates it
+    if not reverse:
+        record_change("contract", [instance.pk], Change.UPDATED)
+    elif action == "post_clear":
+        contract_ids = instance.__dict__.pop("_cleared_contract_ids", [])
+        record_change("contract", contract_ids, Change.UPDATED)
+    else:
+        record_change("contract", pk_set, Change.UPDATED)
+
+
+def prune_changes(days=None):
+    """
+    Delete the changes older than `days`, by default CHANGES_RETENTION_DAYS.
+    Returns the number of changes deleted.
+    """
+    if days is None:
+        days = settings.CHANGES_RETENTION_DAYS
+
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Change.objects.filter(created_at__lt=cutoff).delete()
+
+    if deleted:
+        bump_data_version([CHANGES])
+
+    return deleted
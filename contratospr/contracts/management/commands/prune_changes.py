@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from ...changes import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete the changes feed entries older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Keep this many days instead of CHANGES_RETENTION_DAYS",
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options["days"])
+        self.stdout.write(f"Deleted {deleted} changes")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ...snapshots import publish_snapshots
+
+
+class Command(BaseCommand):
+    help = "Publish Parquet snapshots of the dataset to document storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rewrite every table, not only the ones that changed",
+        )
+
+    def handle(self, *args, **options):
+        updated = publish_snapshots(full=options["full"])
+
+        if not updated:
+            self.stdout.write("Snapshots are up to date")
+
+        for table, fiscal_years in updated.items():
+            if fiscal_years:
+                self.stdout.write(f"Updated {table}: {', '.join(fiscal_years)}")
+            else:
+                self.stdout.write(f"Updated {table}")
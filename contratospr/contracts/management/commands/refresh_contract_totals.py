@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from ...aggregates import refresh_all_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute the contract totals of contractors, entities and services"
+
+    def handle(self, *args, **options):
+        refreshed = refresh_all_aggregates()
+
+        for model_name, count in refreshed.items():
+            self.stdout.write(f"Refreshed {count} {model_name} rows")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from ...rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the fiscal year rollups that the trends and home pages read"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fiscal-year",
+            type=int,
+            action="append",
+            dest="fiscal_years",
+            help="Only rebuild this fiscal year. Can be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        fiscal_years = refresh_rollups(options["fiscal_years"])
+
+        if not fiscal_years:
+            self.stdout.write("There are no contracts to roll up")
+        else:
+            years = ", ".join(str(year) for year in fiscal_years)
+            self.stdout.write(f"Refreshed fiscal years: {years}")
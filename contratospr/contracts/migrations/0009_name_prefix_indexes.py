@@ -0,0 +1,35 @@
+from django.db import migrations
+
+PREFIX_INDEXES = [
+    ("contracts_contractor_name_prefix", "contracts_contractor"),
+    ("contracts_entity_name_prefix", "contracts_entity"),
+    ("contracts_service_name_prefix", "contracts_service"),
+]
+
+
+def create_prefix_indexes(apps, schema_editor):
+    # `istartswith` lookups compile to `UPPER("name"::text) LIKE UPPER(...)` on
+    # PostgreSQL, which can only use an index on the same expression.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for index_name, table_name in PREFIX_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON {table_name} (UPPER(name::text) text_pattern_ops)"
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for index_name, _ in PREFIX_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("contracts", "0008_auto_20211218_1611")]
+
+    operations = [migrations.RunPython(create_prefix_indexes, drop_prefix_indexes)]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+FTS_TABLE = "contracts_contract_fts"
+
+
+def create_fts_table(apps, schema_editor):
+    # PostgreSQL uses Contract.search_vector. SQLite gets an FTS5 table so
+    # search also works in local and test environments.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "body, tokenize = 'porter unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("contracts", "0009_name_prefix_indexes")]
+
+    operations = [migrations.RunPython(create_fts_table, drop_fts_table)]
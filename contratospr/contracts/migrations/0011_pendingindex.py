@@ -0,0 +1,46 @@
+# Generated by Django 3.1.14 on 2026-10-19 12:17
+
+import contratospr.utils.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("contracts", "0010_contract_fts")]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingIndex",
+            fields=[
+                (
+                    "created_at",
+                    contratospr.utils.fields.DateTimeCreatedField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+                (
+                    "modified_at",
+                    contratospr.utils.fields.DateTimeModifiedField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+                (
+                    "contract",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="contracts.contract",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-modified_at", "-created_at"),
+                "get_latest_by": "modified_at",
+                "abstract": False,
+            },
+        ),
+    ]
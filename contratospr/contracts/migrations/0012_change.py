@@ -0,0 +1,39 @@
+# Generated by Django 3.1.14 on 2026-10-19 12:42
+
+import contratospr.utils.fields
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("contracts", "0011_pendingindex")]
+
+    operations = [
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("resource", models.CharField(max_length=32)),
+                ("object_id", models.PositiveIntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("updated", "Updated"),
+                            ("deleted", "Deleted"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "created_at",
+                    contratospr.utils.fields.DateTimeCreatedField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+            ],
+            options={"ordering": ["id"]},
+        ),
+    ]
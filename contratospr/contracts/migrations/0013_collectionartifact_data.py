@@ -0,0 +1,131 @@
+# Generated by Django 3.1.14 on 2026-10-19 12:53
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+# The fields the artifacts endpoint rendered for each model, which it got
+# from the API serializers at the time
+ARTIFACT_FIELDS = {
+    "contract": [
+        "id",
+        "created_at",
+        "modified_at",
+        "source_id",
+        "number",
+        "amendment",
+        "slug",
+        "date_of_grant",
+        "effective_date_from",
+        "effective_date_to",
+        "cancellation_date",
+        "amount_to_pay",
+        "has_amendments",
+        "exempt_id",
+        "entity",
+        "service",
+        "document",
+        "parent",
+    ],
+    "entity": ["id", "created_at", "modified_at", "name", "source_id", "slug"],
+    "service": ["id", "created_at", "modified_at", "name", "slug", "group"],
+    "servicegroup": ["id", "created_at", "modified_at", "name", "slug"],
+    "contractor": [
+        "id",
+        "created_at",
+        "modified_at",
+        "name",
+        "source_id",
+        "entity_id",
+        "slug",
+    ],
+    "document": ["id", "created_at", "modified_at", "source_id", "source_url", "file"],
+}
+
+
+def build_instance(model, entry, field_names):
+    instance = model(pk=model._meta.pk.to_python(entry["pk"]))
+
+    for name in field_names:
+        field = model._meta.get_field(name)
+
+        if field.primary_key or name not in entry["fields"]:
+            continue
+
+        setattr(instance, field.attname, field.to_python(entry["fields"][name]))
+
+    return instance
+
+
+def serialize_instance(instance, field_names):
+    class ArtifactSerializer(serializers.ModelSerializer):
+        class Meta:
+            model = type(instance)
+            fields = field_names
+
+    data = ArtifactSerializer(instance).data
+
+    # Files were rendered as URLs of the document storage, which historical
+    # models don't have
+    if "file" in data:
+        name = instance.file.name
+        storage = import_string(settings.CONTRACTS_DOCUMENT_STORAGE)()
+        data["file"] = storage.url(name) if name else None
+
+    return json.loads(JSONRenderer().render(data))
+
+
+def backfill_artifact_data(apps, schema_editor):
+    CollectionArtifact = apps.get_model("contracts", "CollectionArtifact")
+    queryset = CollectionArtifact.objects.filter(type="").select_related("content_type")
+
+    for artifact in queryset.iterator(chunk_size=500):
+        artifact_type = artifact.content_type.model
+        field_names = ARTIFACT_FIELDS.get(artifact_type)
+        data = None
+
+        if field_names:
+            for entry in json.loads(artifact.serialized_data):
+                model = apps.get_model(entry["model"])
+                data = serialize_instance(
+                    build_instance(model, entry, field_names), field_names
+                )
+
+        CollectionArtifact.objects.filter(pk=artifact.pk).update(
+            type=artifact_type, data=data
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("contracts", "0012_change")]
+
+    operations = [
+        migrations.AddField(
+            model_name="collectionartifact",
+            name="data",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="collectionartifact",
+            name="type",
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.RunPython(backfill_artifact_data, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="collectionartifact",
+            index=models.Index(
+                fields=["collection_job", "id"], name="artifact_job_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="collectionartifact",
+            index=models.Index(
+                fields=["collection_job", "type", "id"], name="artifact_job_type_idx"
+            ),
+        ),
+    ]
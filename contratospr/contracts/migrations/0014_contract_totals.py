@@ -0,0 +1,240 @@
+# Generated by Django 3.1.14 on 2026-10-19 12:55
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+# Path from each model to its contracts
+TOTALS_CONTRACTS = {
+    "Contractor": "contract",
+    "Entity": "contract",
+    "Service": "contract",
+    "ServiceGroup": "service__contract",
+}
+
+TOTALS_BATCH_SIZE = 500
+
+# Lists sort descending with nulls last, which the plain indexes can't serve
+DESCENDING_INDEXES = [
+    (f"{table}_{name}_desc_idx", f"contracts_{table}", column)
+    for table in ["contractor", "entity", "service", "servicegroup"]
+    for name, column in [
+        ("total", "total_contracts_amount"),
+        ("count", "total_contracts_count"),
+    ]
+]
+
+
+def backfill_contract_totals(apps, schema_editor):
+    # Computed here instead of with refresh_aggregates(), which follows the
+    # current models and may do more than this migration should
+    for model_name, contracts in TOTALS_CONTRACTS.items():
+        model = apps.get_model("contracts", model_name)
+        queryset = (
+            model.objects.order_by("pk")
+            .annotate(
+                contracts_total=Sum(f"{contracts}__amount_to_pay"),
+                contracts_count=Count(contracts),
+                contracts_first=Min(f"{contracts}__date_of_grant"),
+                contracts_last=Max(f"{contracts}__date_of_grant"),
+            )
+            .values(
+                "pk",
+                "contracts_total",
+                "contracts_count",
+                "contracts_first",
+                "contracts_last",
+            )
+        )
+        last_pk = None
+
+        while True:
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(batch[:TOTALS_BATCH_SIZE])
+
+            if not rows:
+                break
+
+            model.objects.bulk_update(
+                [
+                    model(
+                        pk=row["pk"],
+                        total_contracts_amount=row["contracts_total"],
+                        total_contracts_count=row["contracts_count"],
+                        first_contract_date=row["contracts_first"],
+                        last_contract_date=row["contracts_last"],
+                    )
+                    for row in rows
+                ],
+                [
+                    "total_contracts_amount",
+                    "total_contracts_count",
+                    "first_contract_date",
+                    "last_contract_date",
+                ],
+            )
+            last_pk = rows[-1]["pk"]
+
+
+def create_descending_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for index_name, table_name, column in DESCENDING_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON {table_name} ({column} DESC NULLS LAST, id DESC)"
+        )
+
+
+def drop_descending_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for index_name, _, _ in DESCENDING_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("contracts", "0013_collectionartifact_data")]
+
+    operations = [
+        migrations.AddField(
+            model_name="contractor",
+            name="first_contract_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="contractor",
+            name="last_contract_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="contractor",
+            name="total_contracts_amount",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=20, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="contractor",
+            name="total_contracts_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="entity",
+            name="first_contract_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="entity",
+            name="last_contract_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="entity",
+            name="total_contracts_amount",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=20, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="entity",
+            name="total_contracts_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="first_contract_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="last_contract_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="total_contracts_amount",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=20, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="total_contracts_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="servicegroup",
+            name="first_contract_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="servicegroup",
+            name="last_contract_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="servicegroup",
+            name="total_contracts_amount",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=20, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="servicegroup",
+            name="total_contracts_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_contract_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="contractor",
+            index=models.Index(
+                fields=["total_contracts_amount", "id"], name="contractor_total_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contractor",
+            index=models.Index(
+                fields=["total_contracts_count", "id"], name="contractor_count_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entity",
+            index=models.Index(
+                fields=["total_contracts_amount", "id"], name="entity_total_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entity",
+            index=models.Index(
+                fields=["total_contracts_count", "id"], name="entity_count_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="service",
+            index=models.Index(
+                fields=["total_contracts_amount", "id"], name="service_total_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="service",
+            index=models.Index(
+                fields=["total_contracts_count", "id"], name="service_count_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicegroup",
+            index=models.Index(
+                fields=["total_contracts_amount", "id"], name="servicegroup_total_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicegroup",
+            index=models.Index(
+                fields=["total_contracts_count", "id"], name="servicegroup_count_idx"
+            ),
+        ),
+        migrations.RunPython(create_descending_indexes, drop_descending_indexes),
+    ]
@@ -0,0 +1,210 @@
+# Generated by Django 3.1.14 on 2026-10-19 12:58
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, Max, Min, Sum, Value, When
+from django.utils import timezone
+
+ROLLUP_BATCH_SIZE = 1000
+
+
+def is_amendment(parent_field):
+    return Case(
+        When(**{f"{parent_field}__isnull": True}, then=Value(False)),
+        default=Value(True),
+        output_field=models.BooleanField(),
+    )
+
+
+def get_fiscal_year(value):
+    value = timezone.localtime(value)
+    return value.year + 1 if value.month >= 7 else value.year
+
+
+def backfill_rollups(apps, schema_editor):
+    # Built here instead of with rebuild_rollups(), which follows the current
+    # models and may do more than this migration should
+    Contract = apps.get_model("contracts", "Contract")
+    ContractRollup = apps.get_model("contracts", "ContractRollup")
+    ContractorRollup = apps.get_model("contracts", "ContractorRollup")
+
+    dates = Contract.objects.aggregate(
+        first=Min("effective_date_from"), last=Max("effective_date_from")
+    )
+
+    if dates["first"] is None:
+        return
+
+    first_year = get_fiscal_year(dates["first"])
+    last_year = get_fiscal_year(dates["last"])
+
+    for fiscal_year in range(first_year, last_year + 1):
+        contracts = Contract.objects.filter(
+            effective_date_from__gte=timezone.make_aware(
+                datetime.datetime(fiscal_year - 1, 7, 1)
+            ),
+            effective_date_from__lte=timezone.make_aware(
+                datetime.datetime(fiscal_year, 6, 30)
+            ),
+        ).order_by()
+
+        contract_rows = (
+            contracts.annotate(is_amendment=is_amendment("parent"))
+            .values("is_amendment", "entity", "service", "service__group")
+            .annotate(
+                contracts_count=Count("id"),
+                contracts_total=Sum("amount_to_pay"),
+                min_amount=Min("amount_to_pay"),
+                max_amount=Max("amount_to_pay"),
+            )
+        )
+        ContractRollup.objects.bulk_create(
+            [
+                ContractRollup(
+                    fiscal_year=fiscal_year,
+                    is_amendment=row["is_amendment"],
+                    entity_id=row["entity"],
+                    service_id=row["service"],
+                    service_group_id=row["service__group"],
+                    contracts_count=row["contracts_count"],
+                    contracts_total=row["contracts_total"],
+                    min_amount=row["min_amount"],
+                    max_amount=row["max_amount"],
+                )
+                for row in contract_rows
+            ],
+            ROLLUP_BATCH_SIZE,
+        )
+
+        contractor_rows = (
+            Contract.contractors.through.objects.filter(contract__in=contracts)
+            .annotate(is_amendment=is_amendment("contract__parent"))
+            .values("is_amendment", "contractor")
+            .annotate(
+                contracts_count=Count("contract"),
+                contracts_total=Sum("contract__amount_to_pay"),
+                min_amount=Min("contract__amount_to_pay"),
+                max_amount=Max("contract__amount_to_pay"),
+            )
+            .order_by()
+        )
+        ContractorRollup.objects.bulk_create(
+            [
+                ContractorRollup(
+                    fiscal_year=fiscal_year,
+                    is_amendment=row["is_amendment"],
+                    contractor_id=row["contractor"],
+                    contracts_count=row["contracts_count"],
+                    contracts_total=row["contracts_total"],
+                    min_amount=row["min_amount"],
+                    max_amount=row["max_amount"],
+                )
+                for row in contractor_rows
+            ],
+            ROLLUP_BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("contracts", "0014_contract_totals")]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContractRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fiscal_year", models.PositiveSmallIntegerField()),
+                ("is_amendment", models.BooleanField()),
+                ("contracts_count", models.PositiveIntegerField()),
+                (
+                    "contracts_total",
+                    models.DecimalField(decimal_places=2, max_digits=20),
+                ),
+                ("min_amount", models.DecimalField(decimal_places=2, max_digits=20)),
+                ("max_amount", models.DecimalField(decimal_places=2, max_digits=20)),
+                (
+                    "entity",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="rollups",
+                        to="contracts.entity",
+                    ),
+                ),
+                (
+                    "service",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="rollups",
+                        to="contracts.service",
+                    ),
+                ),
+                (
+                    "service_group",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="rollups",
+                        to="contracts.servicegroup",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ContractorRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fiscal_year", models.PositiveSmallIntegerField()),
+                ("is_amendment", models.BooleanField()),
+                ("contracts_count", models.PositiveIntegerField()),
+                (
+                    "contracts_total",
+                    models.DecimalField(decimal_places=2, max_digits=20),
+                ),
+                ("min_amount", models.DecimalField(decimal_places=2, max_digits=20)),
+                ("max_amount", models.DecimalField(decimal_places=2, max_digits=20)),
+                (
+                    "contractor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="contracts.contractor",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="contractrollup",
+            index=models.Index(
+                fields=["fiscal_year", "is_amendment"], name="contract_rollup_year_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contractorrollup",
+            index=models.Index(
+                fields=["fiscal_year", "is_amendment"],
+                name="contractor_rollup_year_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 3.1.14 on 2026-10-19 13:45
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Min
+from django.utils import timezone
+
+
+def get_fiscal_year(value):
+    value = timezone.localtime(value)
+    return value.year + 1 if value.month >= 7 else value.year
+
+
+def backfill_fiscal_year_rollups(apps, schema_editor):
+    Contract = apps.get_model("contracts", "Contract")
+    FiscalYearRollup = apps.get_model("contracts", "FiscalYearRollup")
+
+    dates = Contract.objects.aggregate(
+        first=Min("effective_date_from"), last=Max("effective_date_from")
+    )
+
+    if dates["first"] is None:
+        return
+
+    first_year = get_fiscal_year(dates["first"])
+    last_year = get_fiscal_year(dates["last"])
+
+    for fiscal_year in range(first_year, last_year + 1):
+        contracts = Contract.objects.filter(
+            effective_date_from__gte=timezone.make_aware(
+                datetime.datetime(fiscal_year - 1, 7, 1)
+            ),
+            effective_date_from__lte=timezone.make_aware(
+                datetime.datetime(fiscal_year, 6, 30)
+            ),
+        ).order_by("amount_to_pay", "pk")
+        rows = list(contracts.values_list("pk", "amount_to_pay"))
+
+        if not rows:
+            continue
+
+        # The median of the amounts, without the database's aggregate
+        middle = len(rows) // 2
+        median = (rows[(len(rows) - 1) // 2][1] + rows[middle][1]) / 2
+        contractors = Contract.contractors.through.objects.filter(
+            contract__in=contracts.order_by()
+        )
+
+        FiscalYearRollup.objects.create(
+            fiscal_year=fiscal_year,
+            contracts_count=len(rows),
+            contracts_total=sum(amount for _, amount in rows),
+            contracts_median=median,
+            contractors_count=contractors.values("contractor").distinct().count(),
+            min_contract_id=rows[0][0],
+            max_contract_id=rows[-1][0],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0015_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FiscalYearRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fiscal_year", models.PositiveSmallIntegerField(unique=True)),
+                ("contracts_count", models.PositiveIntegerField()),
+                (
+                    "contracts_total",
+                    models.DecimalField(decimal_places=2, max_digits=20),
+                ),
+                (
+                    "contracts_median",
+                    models.DecimalField(decimal_places=2, max_digits=20),
+                ),
+                ("contractors_count", models.PositiveIntegerField()),
+                (
+                    "max_contract",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="contracts.contract",
+                    ),
+                ),
+                (
+                    "min_contract",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="contracts.contract",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_fiscal_year_rollups, migrations.RunPython.noop),
+    ]
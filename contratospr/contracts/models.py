@@ -14,6 +14,7 @@ from django.db.models import JSONField
 from django.utils.module_loading import import_string
 from django_extensions.db.fields import AutoSlugField
 
+from ..utils.fields import DateTimeCreatedField
 from ..utils.models import BaseModel
 from ..utils.pdf import extract_pdf_text_by_pages
 from .manager import ContractManager
@@ -30,12 +31,37 @@ def document_file_path(instance, filename):
     return f"documents/{instance.source_id}/{filename}"
 
 
-class Entity(BaseModel):
+class ContractTotalsModel(BaseModel):
+    """
+    Totals of the contracts of each row, stored so that lists can be sorted
+    by them with an index. Kept up to date with `refresh_aggregates`.
+    """
+
+    total_contracts_amount = models.DecimalField(
+        max_digits=20, decimal_places=2, blank=True, null=True
+    )
+    total_contracts_count = models.PositiveIntegerField(default=0)
+    first_contract_date = models.DateTimeField(blank=True, null=True)
+    last_contract_date = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(
+                fields=["total_contracts_amount", "id"], name="%(class)s_total_idx"
+            ),
+            models.Index(
+                fields=["total_contracts_count", "id"], name="%(class)s_count_idx"
+            ),
+        ]
+
+
+class Entity(ContractTotalsModel):
     name = models.CharField(max_length=255)
     source_id = models.PositiveIntegerField(unique=True)
     slug = AutoSlugField(populate_from="name")
 
-    class Meta:
+    class Meta(ContractTotalsModel.Meta):
         ordering = ["name"]
         verbose_name_plural = "Entities"
 
@@ -43,23 +69,23 @@ class Entity(BaseModel):
         return self.name
 
 
-class ServiceGroup(BaseModel):
+class ServiceGroup(ContractTotalsModel):
     name = models.CharField(max_length=255, unique=True)
     slug = AutoSlugField(populate_from="name")
 
-    class Meta:
+    class Meta(ContractTotalsModel.Meta):
         ordering = ["name"]
 
     def __str__(self):
         return self.name
 
 
-class Service(BaseModel):
+class Service(ContractTotalsModel):
     name = models.CharField(max_length=255)
     group = models.ForeignKey("ServiceGroup", null=True, on_delete=models.SET_NULL)
     slug = AutoSlugField(populate_from="name")
 
-    class Meta:
+    class Meta(ContractTotalsModel.Meta):
         ordering = ["name"]
         unique_together = ("name", "group")
 
@@ -99,13 +125,13 @@ class Document(BaseModel):
             return self.save(update_fields=["pages"])
 
 
-class Contractor(BaseModel):
+class Contractor(ContractTotalsModel):
     name = models.CharField(max_length=255)
     source_id = models.PositiveIntegerField(unique=True)
     entity_id = models.PositiveIntegerField(blank=True, null=True)
     slug = AutoSlugField(populate_from=["name", "source_id"])
 
-    class Meta:
+    class Meta(ContractTotalsModel.Meta):
         ordering = ["name"]
 
     def __str__(self):
@@ -146,6 +172,129 @@ class Contract(BaseModel):
         return f"{self.number}"
 
 
+class ContractRollup(models.Model):
+    """
+    Contracts of a fiscal year by entity and service, so that trends don't
+    aggregate raw contracts. Kept up to date with `refresh_rollups`.
+    """
+
+    fiscal_year = models.PositiveSmallIntegerField()
+    is_amendment = models.BooleanField()
+    entity = models.ForeignKey(
+        "Entity", null=True, on_delete=models.SET_NULL, related_name="rollups"
+    )
+    service = models.ForeignKey(
+        "Service", null=True, on_delete=models.SET_NULL, related_name="rollups"
+    )
+    service_group = models.ForeignKey(
+        "ServiceGroup", null=True, on_delete=models.SET_NULL, related_name="rollups"
+    )
+    contracts_count = models.PositiveIntegerField()
+    contracts_total = models.DecimalField(max_digits=20, decimal_places=2)
+    min_amount = models.DecimalField(max_digits=20, decimal_places=2)
+    max_amount = models.DecimalField(max_digits=20, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["fiscal_year", "is_amendment"], name="contract_rollup_year_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.fiscal_year} {self.entity_id} {self.service_id}"
+
+
+class ContractorRollup(models.Model):
+    """
+    Contracts of a fiscal year by contractor. Contracts can have many
+    contractors, so summing these counts a contract once per contractor.
+    """
+
+    fiscal_year = models.PositiveSmallIntegerField()
+    is_amendment = models.BooleanField()
+    contractor = models.ForeignKey(
+        "Contractor", on_delete=models.CASCADE, related_name="rollups"
+    )
+    contracts_count = models.PositiveIntegerField()
+    contracts_total = models.DecimalField(max_digits=20, decimal_places=2)
+    min_amount = models.DecimalField(max_digits=20, decimal_places=2)
+    max_amount = models.DecimalField(max_digits=20, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["fiscal_year", "is_amendment"],
+                name="contractor_rollup_year_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.fiscal_year} {self.contractor_id}"
+
+
+class FiscalYearRollup(models.Model):
+    """
+    All the contracts of a fiscal year, with the figures that can't be
+    combined from the other rollups, like the median or the number of
+    distinct contractors. Kept up to date with `refresh_rollups`.
+    """
+
+    fiscal_year = models.PositiveSmallIntegerField(unique=True)
+    contracts_count = models.PositiveIntegerField()
+    contracts_total = models.DecimalField(max_digits=20, decimal_places=2)
+    contracts_median = models.DecimalField(max_digits=20, decimal_places=2)
+    contractors_count = models.PositiveIntegerField()
+    min_contract = models.ForeignKey(
+        "Contract", null=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    max_contract = models.ForeignKey(
+        "Contract", null=True, on_delete=models.SET_NULL, related_name="+"
+    )
+
+    def __str__(self):
+        return f"{self.fiscal_year}"
+
+
+class PendingIndex(BaseModel):
+    """
+    A contract waiting to be reindexed. Rows are deduplicated by contract so a
+    contract touched many times between drains is only indexed once.
+    """
+
+    contract = models.OneToOneField(
+        "Contract", primary_key=True, on_delete=models.CASCADE, related_name="+"
+    )
+
+    def __str__(self):
+        return f"{self.contract_id}"
+
+
+class Change(models.Model):
+    """
+    A contract, contractor or entity that was created, updated or deleted.
+    Ids are assigned in commit order, so they're the positions in the feed.
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+    ACTION_CHOICES = [(CREATED, "Created"), (UPDATED, "Updated"), (DELETED, "Deleted")]
+
+    id = models.BigAutoField(primary_key=True)
+    resource = models.CharField(max_length=32)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    created_at = DateTimeCreatedField()
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.resource} {self.object_id} {self.action}"
+
+
 class CollectionArtifact(BaseModel):
     collection_job = models.ForeignKey(
         "CollectionJob", on_delete=models.CASCADE, related_name="artifacts"
@@ -156,6 +305,18 @@ class CollectionArtifact(BaseModel):
     serialized_data = models.TextField()
     object_repr = models.TextField()
     created = models.BooleanField()
+    # Model name of the object, e.g. "contract", and the object as the
+    # artifacts endpoint returns it, so listing doesn't rebuild instances
+    type = models.CharField(max_length=32, blank=True)
+    data = JSONField(blank=True, null=True)
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=["collection_job", "id"], name="artifact_job_idx"),
+            models.Index(
+                fields=["collection_job", "type", "id"], name="artifact_job_type_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.object_repr
@@ -182,6 +343,8 @@ class CollectionJob(BaseModel):
         )
 
     def create_artifacts(self, results):
+        from ..api.serializers import serialize_artifact
+
         options = {
             "Document": {"exclude": ["pages"]},
             "Contract": {"exclude": ["search_vector"]},
@@ -210,5 +373,7 @@ class CollectionJob(BaseModel):
                     "serialized_data": serialized_data,
                     "object_repr": str(model),
                     "created": result["created"],
+                    "type": model._meta.model_name,
+                    "data": serialize_artifact(model),
                 },
             )
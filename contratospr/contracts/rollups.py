@@ -0,0 +1,159 @@
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, Max, Min, Sum, Value, When
+
+from ..utils.aggregates import Median
+from .models import Contract, ContractorRollup, ContractRollup, FiscalYearRollup
+from .utils import get_fiscal_year, get_fiscal_year_range
+from .versions import ROLLUPS, bump_data_version
+
+ROLLUP_AGGREGATES = {
+    "contracts_count": Count("id"),
+    "contracts_total": Sum("amount_to_pay"),
+    "min_amount": Min("amount_to_pay"),
+    "max_amount": Max("amount_to_pay"),
+}
+
+
+def is_amendment(parent_field):
+    return Case(
+        When(**{f"{parent_field}__isnull": True}, then=Value(False)),
+        default=Value(True),
+        output_field=BooleanField(),
+    )
+
+
+def get_fiscal_year_contracts(fiscal_year):
+    # The same range the pages used when they queried contracts directly
+    start_date, end_date = get_fiscal_year_range(fiscal_year)
+    return Contract.objects.filter(
+        effective_date_from__gte=start_date, effective_date_from__lte=end_date
+    ).order_by()
+
+
+def build_contract_rollups(fiscal_year):
+    rows = (
+        get_fiscal_year_contracts(fiscal_year)
+        .annotate(is_amendment=is_amendment("parent"))
+        .values("is_amendment", "entity", "service", "service__group")
+        .annotate(**ROLLUP_AGGREGATES)
+    )
+
+    return [
+        ContractRollup(
+            fiscal_year=fiscal_year,
+            is_amendment=row["is_amendment"],
+            entity_id=row["entity"],
+            service_id=row["service"],
+            service_group_id=row["service__group"],
+            contracts_count=row["contracts_count"],
+            contracts_total=row["contracts_total"],
+            min_amount=row["min_amount"],
+            max_amount=row["max_amount"],
+        )
+        for row in rows
+    ]
+
+
+def build_contractor_rollups(fiscal_year):
+    contracts = get_fiscal_year_contracts(fiscal_year)
+    rows = (
+        Contract.contractors.through.objects.filter(contract__in=contracts)
+        .annotate(is_amendment=is_amendment("contract__parent"))
+        .values("is_amendment", "contractor")
+        .annotate(
+            contracts_count=Count("contract"),
+            contracts_total=Sum("contract__amount_to_pay"),
+            min_amount=Min("contract__amount_to_pay"),
+            max_amount=Max("contract__amount_to_pay"),
+        )
+        .order_by()
+    )
+
+    return [
+        ContractorRollup(
+            fiscal_year=fiscal_year,
+            is_amendment=row["is_amendment"],
+            contractor_id=row["contractor"],
+            contracts_count=row["contracts_count"],
+            contracts_total=row["contracts_total"],
+            min_amount=row["min_amount"],
+            max_amount=row["max_amount"],
+        )
+        for row in rows
+    ]
+
+
+def build_fiscal_year_rollup(fiscal_year):
+    contracts = get_fiscal_year_contracts(fiscal_year)
+    stats = contracts.aggregate(
+        count=Count("id"), total=Sum("amount_to_pay"), median=Median("amount_to_pay")
+    )
+
+    if not stats["count"]:
+        return None
+
+    by_amount = contracts.order_by("amount_to_pay", "pk").values_list("pk", flat=True)
+    contractors = Contract.contractors.through.objects.filter(contract__in=contracts)
+
+    return FiscalYearRollup(
+        fiscal_year=fiscal_year,
+        contracts_count=stats["count"],
+        contracts_total=stats["total"],
+        contracts_median=stats["median"],
+        contractors_count=contractors.values("contractor").distinct().count(),
+        min_contract_id=by_amount.first(),
+        max_contract_id=by_amount.last(),
+    )
+
+
+def get_contract_fiscal_years():
+    dates = Contract.objects.aggregate(
+        first=Min("effective_date_from"), last=Max("effective_date_from")
+    )
+
+    if dates["first"] is None:
+        return []
+
+    return list(
+        range(get_fiscal_year(dates["first"]), get_fiscal_year(dates["last"]) + 1)
+    )
+
+
+def refresh_rollups(fiscal_years=None, batch_size=1000):
+    """
+    Rebuild the rollups of the given fiscal years, or of every fiscal year.
+    Each year is replaced in one transaction, so readers never see it half
+    built. Returns the fiscal years refreshed.
+    """
+    full = fiscal_years is None
+
+    if full:
+        fiscal_years = get_contract_fiscal_years()
+
+    fiscal_years = sorted(set(fiscal_years))
+
+    if full:
+        # Years without contracts anymore
+        ContractRollup.objects.exclude(fiscal_year__in=fiscal_years).delete()
+        ContractorRollup.objects.exclude(fiscal_year__in=fiscal_years).delete()
+        FiscalYearRollup.objects.exclude(fiscal_year__in=fiscal_years).delete()
+
+    for fiscal_year in fiscal_years:
+        contract_rollups = build_contract_rollups(fiscal_year)
+        contractor_rollups = build_contractor_rollups(fiscal_year)
+        fiscal_year_rollup = build_fiscal_year_rollup(fiscal_year)
+
+        with transaction.atomic():
+            ContractRollup.objects.filter(fiscal_year=fiscal_year).delete()
+            ContractorRollup.objects.filter(fiscal_year=fiscal_year).delete()
+            FiscalYearRollup.objects.filter(fiscal_year=fiscal_year).delete()
+            ContractRollup.objects.bulk_create(contract_rollups, batch_size)
+            ContractorRollup.objects.bulk_create(contractor_rollups, batch_size)
+
+            if fiscal_year_rollup:
+                fiscal_year_rollup.save()
+
+    if fiscal_years:
+        bump_data_version([ROLLUPS])
+
+    return fiscal_years
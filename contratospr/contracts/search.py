@@ -1,50 +1,227 @@
-from django.contrib.postgres.fields import JSONField
-from django.contrib.postgres.search import SearchQuery
-from django.db.models.functions import Cast
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
 
-from ..utils.search import SearchVector
-from .models import Contract
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
 
-search_vector = (
-    SearchVector(Cast("document__pages", JSONField()))
-    + SearchVector("contractors__name")
-    + SearchVector("entity__name")
-    + SearchVector("number")
-)
+from ..utils.routers import may_read_stale_data
+from .models import Contract, PendingIndex
+from .versions import CONTRACTS, SEARCH, bump_data_version, get_data_version
+
+SEARCH_BACKENDS = {
+    "postgresql": "contratospr.contracts.search_backends.PostgresSearchBackend",
+    "sqlite": "contratospr.contracts.search_backends.SQLiteSearchBackend",
+}
+
+
+SEARCH_CACHE_PREFIX = "search.ids"
+
+# The order of the contracts list, in which search results are cached unless
+# another one is requested
+SEARCH_ORDERING = "-date_of_grant"
+
+
+@lru_cache(maxsize=None)
+def load_search_backend(backend_path):
+    return import_string(backend_path)()
+
+
+def get_search_backend():
+    backend_path = settings.CONTRACTS_SEARCH_BACKEND or SEARCH_BACKENDS.get(
+        connection.vendor
+    )
+
+    if not backend_path:
+        raise NotImplementedError(
+            f"No search backend available for database vendor {connection.vendor!r}"
+        )
+
+    return load_search_backend(backend_path)
+
+
+def invalidate_search_cache():
+    # Only search results depend on the index, so reindexing leaves other
+    # contract data cached
+    bump_data_version([SEARCH])
 
 
 def index_contract(obj):
-    instance = (
-        Contract.objects.select_related("document", "entity")
-        .prefetch_related("contractors")
-        .annotate(search=search_vector)
-        .filter(pk=obj.pk)
-    )[:1]
+    result = get_search_backend().index(obj)
+    invalidate_search_cache()
+    return result
+
+
+def queue_contract_index(contracts):
+    PendingIndex.objects.bulk_create(
+        [PendingIndex(contract_id=contract.pk) for contract in contracts],
+        ignore_conflicts=True,
+    )
+
+
+def claim_index_batch(batch_size):
+    """
+    Take up to `batch_size` of the oldest contracts off the queue. Rows being
+    claimed by a concurrent drain are skipped, so no contract is indexed twice.
+    """
+    with transaction.atomic():
+        contract_ids = list(
+            PendingIndex.objects.select_for_update(skip_locked=True)
+            .order_by("created_at")
+            .values_list("contract_id", flat=True)[:batch_size]
+        )
+        PendingIndex.objects.filter(contract_id__in=contract_ids).delete()
+
+    return contract_ids
+
+
+def drain_index_queue(batch_size=500):
+    backend = get_search_backend()
+    indexed = 0
+
+    while True:
+        # Claimed before indexing so writes that happen while indexing queue
+        # the contract again instead of being lost
+        contract_ids = claim_index_batch(batch_size)
+
+        if not contract_ids:
+            return indexed
+
+        try:
+            backend.index_many(Contract.objects.filter(pk__in=contract_ids))
+        except Exception:
+            queue_contract_index(Contract.objects.filter(pk__in=contract_ids))
+            raise
+        finally:
+            invalidate_search_cache()
+
+        indexed += len(contract_ids)
+
+
+class SearchResults(namedtuple("SearchResults", ["ids", "count"])):
+    """
+    The ids of the first contracts matching a query, in order, up to
+    `API_SEARCH_CACHE_MAX_RESULTS`, and how many contracts match in total.
+    """
+
+    @property
+    def complete(self):
+        return len(self.ids) == self.count
+
 
-    contract = instance[0]
-    contract.search_vector = contract.search
-    return contract.save(update_fields=["search_vector"])
+def get_search_order_by(ordering):
+    # Like the ordering filter of the contracts list, with the id to break ties
+    field = ordering.lstrip("-")
+
+    if ordering.startswith("-"):
+        return [F(field).desc(nulls_last=True), "-pk"]
+
+    return [F(field).asc(nulls_last=True), "pk"]
+
+
+def get_search_cache_key(version, ordering, query):
+    query_hash = hashlib.md5(query.encode())
+    return f"{SEARCH_CACHE_PREFIX}.{version!r}.{ordering}.{query_hash.hexdigest()}"
+
+
+def find_search_results(query, ordering):
+    max_results = settings.API_SEARCH_CACHE_MAX_RESULTS
+    matches = get_search_backend().filter(
+        Contract.objects.order_by(*get_search_order_by(ordering)), query
+    )
+    contract_ids = list(matches.values_list("pk", flat=True)[: max_results + 1])
+
+    if len(contract_ids) <= max_results:
+        return SearchResults(contract_ids, len(contract_ids))
+
+    # Only the first results are kept, with the count to paginate them
+    return SearchResults(contract_ids[:max_results], matches.order_by().count())
+
+
+def search_contract_results(query, ordering=SEARCH_ORDERING):
+    """
+    Return the `SearchResults` of `query` in `ordering`, cached under its
+    normalized form so that spelling variants of a query share one entry.
+
+    Queries found in the cache don't touch the database. Otherwise, the
+    results are also cached under the query's lexemes, which queries that
+    only differ in, for example, the inflection of their words share.
+    """
+    backend = get_search_backend()
+    normalized_query = backend.normalize_query(query)
+
+    if not normalized_query:
+        return SearchResults([], 0)
+
+    version = get_data_version([CONTRACTS, SEARCH])
+    cache_key = get_search_cache_key(version, ordering, normalized_query)
+    results = cache.get(cache_key)
+
+    if results is not None:
+        return SearchResults(*results)
+
+    lexemes = backend.get_query_lexemes(query)
+
+    if not lexemes:
+        return SearchResults([], 0)
+
+    lexemes_key = get_search_cache_key(version, ordering, f"lexemes:{lexemes}")
+    results = cache.get(lexemes_key)
+
+    if results is None:
+        results = find_search_results(query, ordering)
+    else:
+        results = SearchResults(*results)
+
+    if not may_read_stale_data(version):
+        cache.set_many(
+            {cache_key: tuple(results), lexemes_key: tuple(results)},
+            settings.API_CACHE_TIMEOUT,
+        )
+
+    return results
+
+
+def search_contract_ids(query):
+    """
+    Return the ordered ids of the contracts matching `query`.
+
+    Returns `None` when the query matches too many contracts to cache, in
+    which case callers should filter with the search backend directly.
+    """
+    results = search_contract_results(query)
+    return list(results.ids) if results.complete else None
 
 
 def search_contracts(query, service_id, service_group_id):
     filter_kwargs = {}
 
-    if query:
-        filter_kwargs["search_vector"] = SearchQuery(query)
-
     if service_id:
         filter_kwargs["service_id"] = service_id
 
     if service_group_id:
         filter_kwargs["service__group_id"] = service_group_id
 
-    if not filter_kwargs:
+    if not query and not filter_kwargs:
         return []
 
-    return (
+    queryset = (
         Contract.objects.select_related("document", "entity", "service")
         .prefetch_related("contractors")
         .defer("document__pages")
         .filter(**filter_kwargs)
         .order_by("-date_of_grant")
     )
+
+    if query:
+        contract_ids = search_contract_ids(query)
+
+        if contract_ids is None:
+            queryset = get_search_backend().filter(queryset, query)
+        else:
+            queryset = queryset.filter(pk__in=contract_ids)
+
+    return queryset
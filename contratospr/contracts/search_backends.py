@@ -0,0 +1,145 @@
+import re
+import unicodedata
+
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from ..utils.search import SearchVector
+from .models import Contract
+
+
+class BaseSearchBackend:
+    def index(self, contract):
+        raise NotImplementedError("subclasses must implement index()")
+
+    def index_many(self, contracts):
+        for contract in contracts:
+            self.index(contract)
+
+    def filter(self, queryset, query):
+        raise NotImplementedError("subclasses must implement filter()")
+
+    def normalize_query(self, query):
+        """
+        Return a canonical form of `query` that matches the same contracts, for
+        use in cache keys. Terms are AND-ed so their order does not matter.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        return " ".join(sorted(set(terms)))
+
+    def get_query_lexemes(self, query):
+        """
+        Return the terms `query` is matched by, after the transformations the
+        backend makes, like stemming. Queries with the same lexemes match the
+        same contracts even when their normalized forms differ.
+        """
+        return self.normalize_query(query)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    search_vector = (
+        SearchVector(Cast("document__pages", JSONField()))
+        + SearchVector("contractors__name")
+        + SearchVector("entity__name")
+        + SearchVector("number")
+    )
+
+    def get_search_vector(self):
+        # UPDATE can't join, so the vector is computed by a subquery
+        return Subquery(
+            Contract.objects.filter(pk=OuterRef("pk"))
+            .annotate(search=self.search_vector)
+            .values("search")[:1]
+        )
+
+    def index(self, contract):
+        self.index_many(Contract.objects.filter(pk=contract.pk))
+
+    def index_many(self, contracts):
+        # A single UPDATE for the whole batch
+        contracts.update(search_vector=self.get_search_vector())
+
+    def filter(self, queryset, query):
+        return queryset.filter(search_vector=SearchQuery(query))
+
+    def normalize_query(self, query):
+        # Without asking the database, only case, spacing and the order of
+        # words are known not to change what the query matches
+        return " ".join(sorted(set(query.lower().split())))
+
+    def get_query_lexemes(self, query):
+        # Let PostgreSQL lowercase, stem and drop stop words with the same
+        # configuration used for matching.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT plainto_tsquery(%s)::text", [query])
+            tsquery = cursor.fetchone()[0]
+
+        lexemes = re.findall(r"'((?:[^']|'')*)'", tsquery)
+        return " ".join(sorted(set(lexemes)))
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    Full text search backed by an SQLite FTS5 table, for local development,
+    benchmarking and tests. The table is created by the contracts migrations.
+    """
+
+    table_name = "contracts_contract_fts"
+
+    def get_document_text(self, contract):
+        parts = [contract.number]
+
+        if contract.entity:
+            parts.append(contract.entity.name)
+
+        parts.extend(contractor.name for contractor in contract.contractors.all())
+
+        if contract.document and contract.document.pages:
+            parts.extend(page["text"] for page in contract.document.pages)
+
+        return "\n".join(parts)
+
+    def index(self, contract):
+        contract = (
+            Contract.objects.select_related("document", "entity")
+            .prefetch_related("contractors")
+            .get(pk=contract.pk)
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table_name} WHERE rowid = %s", [contract.pk]
+            )
+            cursor.execute(
+                f"INSERT INTO {self.table_name} (rowid, body) VALUES (%s, %s)",
+                [contract.pk, self.get_document_text(contract)],
+            )
+
+    def normalize_query(self, query):
+        # The FTS5 tokenizer removes diacritics, so accents do not change results
+        decomposed = unicodedata.normalize("NFKD", query)
+        unaccented = "".join(c for c in decomposed if not unicodedata.combining(c))
+        return super().normalize_query(unaccented)
+
+    def get_match_expression(self, query):
+        # Quote every term so user input is never parsed as FTS5 syntax. Terms
+        # are implicitly AND-ed, matching PostgreSQL's plainto_tsquery().
+        terms = re.findall(r"\w+", query)
+        return " ".join(f'"{term}"' for term in terms)
+
+    def filter(self, queryset, query):
+        match_expression = self.get_match_expression(query)
+
+        if not match_expression:
+            return queryset.none()
+
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {self.table_name} WHERE {self.table_name} MATCH %s",
+                [match_expression],
+            )
+        )
@@ -0,0 +1,288 @@
+import json
+from datetime import datetime
+from itertools import islice
+from tempfile import TemporaryFile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Contract, Contractor, Entity, Service, document_storage
+from .utils import get_fiscal_year_expression, get_fiscal_year_range
+
+SNAPSHOT_PREFIX = "snapshots"
+SNAPSHOT_MANIFEST = f"{SNAPSHOT_PREFIX}/manifest.json"
+SNAPSHOT_CHUNK_SIZE = 10000
+
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+# Column name, values_list() lookup and Arrow type of each table
+CONTRACT_COLUMNS = [
+    ("id", "id", pa.int64()),
+    ("slug", "slug", pa.string()),
+    ("source_id", "source_id", pa.int64()),
+    ("number", "number", pa.string()),
+    ("amendment", "amendment", pa.string()),
+    ("parent_id", "parent_id", pa.int64()),
+    ("entity_id", "entity_id", pa.int64()),
+    ("service_id", "service_id", pa.int64()),
+    ("document_id", "document_id", pa.int64()),
+    ("document_url", "document__source_url", pa.string()),
+    ("date_of_grant", "date_of_grant", TIMESTAMP),
+    ("effective_date_from", "effective_date_from", TIMESTAMP),
+    ("effective_date_to", "effective_date_to", TIMESTAMP),
+    ("cancellation_date", "cancellation_date", TIMESTAMP),
+    ("amount_to_pay", "amount_to_pay", pa.decimal128(20, 2)),
+    ("has_amendments", "has_amendments", pa.bool_()),
+    ("exempt_id", "exempt_id", pa.string()),
+    ("created_at", "created_at", TIMESTAMP),
+    ("modified_at", "modified_at", TIMESTAMP),
+]
+
+CONTRACT_CONTRACTOR_COLUMNS = [
+    ("contract_id", "contract_id", pa.int64()),
+    ("contractor_id", "contractor_id", pa.int64()),
+]
+
+CONTRACTOR_COLUMNS = [
+    ("id", "id", pa.int64()),
+    ("slug", "slug", pa.string()),
+    ("source_id", "source_id", pa.int64()),
+    ("name", "name", pa.string()),
+    ("entity_id", "entity_id", pa.int64()),
+    ("created_at", "created_at", TIMESTAMP),
+    ("modified_at", "modified_at", TIMESTAMP),
+]
+
+ENTITY_COLUMNS = [
+    ("id", "id", pa.int64()),
+    ("slug", "slug", pa.string()),
+    ("source_id", "source_id", pa.int64()),
+    ("name", "name", pa.string()),
+    ("created_at", "created_at", TIMESTAMP),
+    ("modified_at", "modified_at", TIMESTAMP),
+]
+
+SERVICE_COLUMNS = [
+    ("id", "id", pa.int64()),
+    ("slug", "slug", pa.string()),
+    ("name", "name", pa.string()),
+    ("group_id", "group_id", pa.int64()),
+    ("group_name", "group__name", pa.string()),
+    ("created_at", "created_at", TIMESTAMP),
+    ("modified_at", "modified_at", TIMESTAMP),
+]
+
+ContractContractor = Contract.contractors.through
+
+# Aggregates that change whenever the rows of a table change, including the
+# columns copied from related rows. Related rows deleted set their foreign
+# keys to null without updating the row, hence the counts.
+CONTRACT_SIGNATURE = {
+    "count": Count("pk"),
+    "modified_at": Max("modified_at"),
+    "document_count": Count("document"),
+    "document_modified_at": Max("document__modified_at"),
+}
+
+# Contractors added to or removed from a contract don't update it, but each
+# one added gets an id higher than any before it
+CONTRACT_CONTRACTOR_SIGNATURE = {
+    "count": Count("pk"),
+    "modified_at": Max("contract__modified_at"),
+    "last_id": Max("pk"),
+}
+
+SERVICE_SIGNATURE = {
+    "count": Count("pk"),
+    "modified_at": Max("modified_at"),
+    "group_count": Count("group"),
+    "group_modified_at": Max("group__modified_at"),
+}
+
+DEFAULT_SIGNATURE = {"count": Count("pk"), "modified_at": Max("modified_at")}
+
+# Partitioned by the fiscal year of the contract's effective date. Each table
+# has its queryset, date lookup, signature and columns.
+PARTITIONED_TABLES = {
+    "contracts": (
+        Contract.objects.all(),
+        "effective_date_from",
+        CONTRACT_SIGNATURE,
+        CONTRACT_COLUMNS,
+    ),
+    "contract_contractors": (
+        ContractContractor.objects.all(),
+        "contract__effective_date_from",
+        CONTRACT_CONTRACTOR_SIGNATURE,
+        CONTRACT_CONTRACTOR_COLUMNS,
+    ),
+}
+
+TABLES = {
+    "contractors": (Contractor.objects.all(), DEFAULT_SIGNATURE, CONTRACTOR_COLUMNS),
+    "entities": (Entity.objects.all(), DEFAULT_SIGNATURE, ENTITY_COLUMNS),
+    "services": (Service.objects.all(), SERVICE_SIGNATURE, SERVICE_COLUMNS),
+}
+
+
+def get_schema(columns):
+    return pa.schema([(column, arrow_type) for column, _, arrow_type in columns])
+
+
+def write_parquet(name, queryset, columns):
+    """
+    Write the rows of `queryset` to a Parquet file in document storage, a
+    row group per chunk so memory use doesn't grow with the table.
+    """
+    schema = get_schema(columns)
+    rows = (
+        queryset.order_by("pk")
+        .values_list(*[lookup for _, lookup, _ in columns])
+        .iterator(chunk_size=SNAPSHOT_CHUNK_SIZE)
+    )
+
+    with TemporaryFile() as temp_file:
+        writer = pq.ParquetWriter(temp_file, schema, compression="zstd")
+
+        while True:
+            chunk = list(islice(rows, SNAPSHOT_CHUNK_SIZE))
+
+            if not chunk:
+                break
+
+            arrays = [
+                pa.array(values, type=arrow_type)
+                for values, (_, _, arrow_type) in zip(zip(*chunk), columns)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+        writer.close()
+        temp_file.seek(0)
+        save_file(name, File(temp_file))
+
+
+def save_file(name, content):
+    # Storage backends pick a new name rather than overwrite existing files
+    delete_file(name)
+    document_storage.save(name, content)
+
+
+def delete_file(name):
+    if document_storage.exists(name):
+        document_storage.delete(name)
+
+
+def get_manifest():
+    if not document_storage.exists(SNAPSHOT_MANIFEST):
+        return {"tables": {}}
+
+    with document_storage.open(SNAPSHOT_MANIFEST) as manifest_file:
+        return json.load(manifest_file)
+
+
+def get_signature(aggregates, row):
+    return [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in (row[name] for name in aggregates)
+    ]
+
+
+def get_table_name(table):
+    return f"{SNAPSHOT_PREFIX}/{table}.parquet"
+
+
+def get_partition_name(table, fiscal_year):
+    return f"{SNAPSHOT_PREFIX}/{table}/fiscal_year={fiscal_year}/{table}.parquet"
+
+
+def publish_table(table, manifest, full=False):
+    queryset, aggregates, columns = TABLES[table]
+    published = manifest["tables"].get(table)
+    result = queryset.aggregate(**aggregates)
+    signature = get_signature(aggregates, result)
+    name = get_table_name(table)
+    updated = full or not published or published["signature"] != signature
+
+    if updated:
+        write_parquet(name, queryset, columns)
+
+    manifest["tables"][table] = {
+        "path": name,
+        "rows": result["count"],
+        "signature": signature,
+    }
+    return updated
+
+
+def publish_partitioned_table(table, manifest, full=False):
+    queryset, date_field, aggregates, columns = PARTITIONED_TABLES[table]
+    published = manifest["tables"].get(table, {}).get("partitions", {})
+    queryset = queryset.annotate(fiscal_year=get_fiscal_year_expression(date_field))
+    rows = queryset.values("fiscal_year").annotate(**aggregates).order_by("fiscal_year")
+    partitions = {}
+    updated = []
+
+    for row in rows:
+        fiscal_year = str(row["fiscal_year"])
+        signature = get_signature(aggregates, row)
+        name = get_partition_name(table, fiscal_year)
+        partition = published.get(fiscal_year)
+
+        if full or not partition or partition["signature"] != signature:
+            # Filter on the date itself, so that its index can be used
+            start_date, _ = get_fiscal_year_range(row["fiscal_year"])
+            end_date, _ = get_fiscal_year_range(row["fiscal_year"] + 1)
+            partition_queryset = queryset.filter(
+                **{f"{date_field}__gte": start_date, f"{date_field}__lt": end_date}
+            )
+            write_parquet(name, partition_queryset, columns)
+            updated.append(fiscal_year)
+
+        partitions[fiscal_year] = {
+            "path": name,
+            "rows": row["count"],
+            "signature": signature,
+        }
+
+    # Fiscal years without contracts anymore
+    for fiscal_year in set(published) - set(partitions):
+        delete_file(get_partition_name(table, fiscal_year))
+        updated.append(fiscal_year)
+
+    manifest["tables"][table] = {
+        "partitioning": "fiscal_year",
+        "partitions": partitions,
+    }
+    return updated
+
+
+def publish_snapshots(full=False):
+    """
+    Publish Parquet snapshots of the dataset to document storage, rewriting
+    only the tables and fiscal year partitions that changed since the last
+    snapshot described by the manifest, or all of them if `full` is set.
+
+    Returns the updated tables, with the fiscal years of partitioned ones.
+    """
+    manifest = get_manifest()
+    updated = {}
+
+    for table in PARTITIONED_TABLES:
+        fiscal_years = publish_partitioned_table(table, manifest, full=full)
+
+        if fiscal_years:
+            updated[table] = sorted(fiscal_years)
+
+    for table in TABLES:
+        if publish_table(table, manifest, full=full):
+            updated[table] = []
+
+    if updated or not document_storage.exists(SNAPSHOT_MANIFEST):
+        manifest["generated_at"] = timezone.now().isoformat()
+        save_file(SNAPSHOT_MANIFEST, ContentFile(json.dumps(manifest, indent=2)))
+
+    return updated
@@ -7,6 +7,8 @@ from dateutil.relativedelta import relativedelta
 from structlog import get_logger
 
 from ..tasks import app
+from .aggregates import refresh_all_aggregates, refresh_related_aggregates
+from .changes import prune_changes
 from .models import (
     CollectionJob,
     Contract,
@@ -16,6 +18,7 @@ from .models import (
     Service,
     ServiceGroup,
 )
+from .rollups import refresh_rollups
 from .scraper import (
     BASE_CONTRACT_URL,
     get_amendments,
@@ -23,7 +26,9 @@ from .scraper import (
     get_contracts,
     send_document_request,
 )
-from .search import index_contract
+from .search import drain_index_queue, queue_contract_index
+from .snapshots import publish_snapshots
+from .utils import get_fiscal_year
 
 logger = get_logger(__name__)
 
@@ -123,13 +128,8 @@ def detect_text(document_id):
 
     document.detect_text()
 
-    for contract in document.contract_set.all():
-        logger.info(
-            "Indexing document contracts",
-            document_id=document_id,
-            contract_id=contract.pk,
-        )
-        index_contract(contract)
+    logger.info("Queueing document contracts for indexing", document_id=document_id)
+    queue_contract_index(document.contract_set.all())
 
     return document
 
@@ -215,11 +215,46 @@ def update_contract(result, parent_id=None, skip_doc_tasks=False):
         artifacts.extend(amendment_artifacts)
 
     if not skip_doc_tasks:
-        index_contract(contract)
+        queue_contract_index([contract])
 
     return artifacts
 
 
+@app.task
+def index_pending_contracts():
+    indexed = drain_index_queue()
+    logger.info("Indexed pending contracts", count=indexed)
+    return indexed
+
+
+@app.task
+def update_contract_totals():
+    refreshed = refresh_all_aggregates()
+    logger.info("Refreshed contract totals", refreshed=refreshed)
+    return refreshed
+
+
+@app.task
+def update_rollups():
+    fiscal_years = refresh_rollups()
+    logger.info("Refreshed rollups", fiscal_years=fiscal_years)
+    return fiscal_years
+
+
+@app.task
+def update_snapshots(full=False):
+    updated = publish_snapshots(full=full)
+    logger.info("Published snapshots", updated=updated)
+    return updated
+
+
+@app.task
+def delete_old_changes():
+    deleted = prune_changes()
+    logger.info("Deleted old changes", count=deleted)
+    return deleted
+
+
 @app.task
 def scrape_contracts(limit=None, max_items=None, **kwargs):
     offset = 0
@@ -232,6 +267,8 @@ def scrape_contracts(limit=None, max_items=None, **kwargs):
     if collection_job_id:
         collection_job = CollectionJob.objects.get(pk=collection_job_id)
 
+    fiscal_years = set()
+
     while offset <= total_records:
         logger.info(
             "Scraping contracts",
@@ -246,15 +283,30 @@ def scrape_contracts(limit=None, max_items=None, **kwargs):
         if not total_records:
             total_records = max_items if max_items else contracts["recordsFiltered"]
 
+        touched = []
+
         for contract in contracts["data"]:
             expanded = expand_contract(contract)
             results = update_contract(expanded, skip_doc_tasks=skip_doc_tasks)
+            touched.extend(result["obj"] for result in results)
+            fiscal_years.update(
+                get_fiscal_year(result["obj"].effective_date_from)
+                for result in results
+                if isinstance(result["obj"], Contract)
+            )
 
             if collection_job:
                 collection_job.create_artifacts(results)
 
+        refresh_related_aggregates(touched)
+
         offset += real_limit
 
+    # Before warming, so the cached pages are built from the new rollups
+    refresh_rollups(fiscal_years)
+
+    app.send_task("contratospr.api.tasks.warm_api_cache")
+
 
 @app.task
 def collect_data(date_of_grant_start=None, date_of_grant_end=None):
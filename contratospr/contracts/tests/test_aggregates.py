@@ -0,0 +1,107 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from ..aggregates import (
+    refresh_aggregates,
+    refresh_all_aggregates,
+    refresh_related_aggregates,
+)
+from ..models import Change, Contract, Contractor, Entity, Service, ServiceGroup
+
+
+def create_contract(source_id, date_of_grant, amount_to_pay, entity, service):
+    date_of_grant = timezone.make_aware(date_of_grant)
+    return Contract.objects.create(
+        entity=entity,
+        service=service,
+        source_id=source_id,
+        number=f"T{source_id}",
+        date_of_grant=date_of_grant,
+        effective_date_from=date_of_grant,
+        effective_date_to=date_of_grant,
+        amount_to_pay=amount_to_pay,
+        has_amendments=False,
+    )
+
+
+@pytest.fixture
+def contracts():
+    entity = Entity.objects.create(name="Salud", source_id=1)
+    group = ServiceGroup.objects.create(name="Servicios Profesionales")
+    service = Service.objects.create(name="Consultoría", group=group)
+    contractor = Contractor.objects.create(name="Contractor", source_id=1)
+
+    first = create_contract(1, datetime.datetime(2019, 8, 1), 1000, entity, service)
+    last = create_contract(2, datetime.datetime(2020, 2, 1), 234.5, entity, service)
+    contractor.contract_set.add(first, last)
+
+    return [entity, group, service, contractor]
+
+
+@pytest.mark.django_db
+def test_refresh_all_aggregates(contracts):
+    Entity.objects.create(name="Hacienda", source_id=2)
+
+    refreshed = refresh_all_aggregates()
+
+    assert refreshed == {"Contractor": 1, "Entity": 2, "Service": 1, "ServiceGroup": 1}
+
+    for obj in contracts:
+        obj.refresh_from_db()
+        assert obj.total_contracts_amount == 1234.5
+        assert obj.total_contracts_count == 2
+        assert obj.first_contract_date.date() == datetime.date(2019, 8, 1)
+        assert obj.last_contract_date.date() == datetime.date(2020, 2, 1)
+
+    entity = Entity.objects.get(source_id=2)
+    assert entity.total_contracts_amount is None
+    assert entity.total_contracts_count == 0
+
+
+@pytest.mark.django_db
+def test_refresh_aggregates_batches(contracts):
+    Entity.objects.create(name="Hacienda", source_id=2)
+
+    assert refresh_aggregates(Entity, batch_size=1) == 2
+    assert Entity.objects.get(source_id=1).total_contracts_count == 2
+
+
+@pytest.mark.django_db
+def test_refresh_related_aggregates(contracts):
+    entity, group, service, contractor = contracts
+    other = Entity.objects.create(name="Hacienda", source_id=2)
+    create_contract(3, datetime.datetime(2020, 3, 1), 100, other, service)
+
+    refresh_related_aggregates([other, service, Contract.objects.get(source_id=3)])
+
+    other.refresh_from_db()
+    service.refresh_from_db()
+    contractor.refresh_from_db()
+    assert other.total_contracts_count == 1
+    assert service.total_contracts_count == 3
+    assert contractor.total_contracts_count == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresh_aggregates_records_changes(contracts):
+    entity, group, service, contractor = contracts
+    refresh_all_aggregates()
+    Change.objects.all().delete()
+
+    other = Entity.objects.create(name="Hacienda", source_id=2)
+    Contract.objects.filter(source_id=2).update(entity=other)
+    Change.objects.all().delete()
+
+    refresh_aggregates(Entity)
+
+    assert sorted(Change.objects.values_list("resource", "object_id", "action")) == [
+        ("entity", entity.pk, Change.UPDATED),
+        ("entity", other.pk, Change.UPDATED),
+    ]
+
+    # Totals that didn't change aren't listed again
+    refresh_aggregates(Entity)
+    refresh_aggregates(Contractor)
+    assert Change.objects.count() == 2
@@ -0,0 +1,115 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from ..models import (
+    Contract,
+    Contractor,
+    ContractorRollup,
+    ContractRollup,
+    Entity,
+    FiscalYearRollup,
+    Service,
+    ServiceGroup,
+)
+from ..rollups import refresh_rollups
+
+
+def create_contract(source_id, effective_date_from, amount_to_pay, parent=None):
+    effective_date_from = timezone.make_aware(effective_date_from)
+    entity, _ = Entity.objects.get_or_create(source_id=1, defaults={"name": "Salud"})
+    group, _ = ServiceGroup.objects.get_or_create(name="Servicios Profesionales")
+    service, _ = Service.objects.get_or_create(name="Consultoría", group=group)
+    return Contract.objects.create(
+        entity=entity,
+        service=service,
+        parent=parent,
+        source_id=source_id,
+        number=f"T{source_id}",
+        date_of_grant=effective_date_from,
+        effective_date_from=effective_date_from,
+        effective_date_to=effective_date_from,
+        amount_to_pay=amount_to_pay,
+        has_amendments=False,
+    )
+
+
+@pytest.fixture
+def contracts():
+    first = create_contract(1, datetime.datetime(2019, 8, 1), 1000)
+    second = create_contract(2, datetime.datetime(2020, 2, 1), 500)
+    amendment = create_contract(3, datetime.datetime(2020, 3, 1), 200, parent=first)
+    previous = create_contract(4, datetime.datetime(2019, 2, 1), 300)
+
+    contractor = Contractor.objects.create(name="Contractor", source_id=1)
+    other = Contractor.objects.create(name="Other Contractor", source_id=2)
+    first.contractors.add(contractor, other)
+    second.contractors.add(contractor)
+    amendment.contractors.add(contractor)
+    previous.contractors.add(other)
+
+    return [first, second, amendment, previous]
+
+
+@pytest.mark.django_db
+def test_refresh_rollups(contracts):
+    assert refresh_rollups() == [2019, 2020]
+
+    rollups = ContractRollup.objects.filter(fiscal_year=2020).order_by("is_amendment")
+    assert [
+        (
+            rollup.is_amendment,
+            rollup.contracts_count,
+            rollup.contracts_total,
+            rollup.min_amount,
+            rollup.max_amount,
+        )
+        for rollup in rollups
+    ] == [(False, 2, 1500, 500, 1000), (True, 1, 200, 200, 200)]
+    assert rollups[0].service_group == Service.objects.get().group
+
+    contractor_rollups = ContractorRollup.objects.filter(
+        fiscal_year=2020, is_amendment=False
+    ).order_by("contractor__source_id")
+    assert [
+        (rollup.contractor.source_id, rollup.contracts_count, rollup.contracts_total)
+        for rollup in contractor_rollups
+    ] == [(1, 2, 1500), (2, 1, 1000)]
+
+    assert ContractRollup.objects.get(fiscal_year=2019).contracts_total == 300
+
+    # Contractors of several contracts, or of amendments, count once
+    rollup = FiscalYearRollup.objects.get(fiscal_year=2020)
+    assert (
+        rollup.contracts_count,
+        rollup.contracts_total,
+        rollup.contracts_median,
+        rollup.contractors_count,
+        rollup.min_contract,
+        rollup.max_contract,
+    ) == (3, 1700, 500, 2, contracts[2], contracts[0])
+
+
+@pytest.mark.django_db
+def test_refresh_rollups_fiscal_years(contracts):
+    refresh_rollups()
+    Contract.objects.filter(source_id=2).update(amount_to_pay=600)
+    Contract.objects.filter(source_id=4).update(amount_to_pay=400)
+
+    assert refresh_rollups([2020]) == [2020]
+
+    rollup = ContractRollup.objects.get(fiscal_year=2020, is_amendment=False)
+    assert rollup.contracts_total == 1600
+    assert ContractRollup.objects.get(fiscal_year=2019).contracts_total == 300
+
+
+@pytest.mark.django_db
+def test_refresh_rollups_removes_empty_fiscal_years(contracts):
+    refresh_rollups()
+    Contract.objects.filter(source_id=4).delete()
+
+    assert refresh_rollups() == [2020]
+    assert not ContractRollup.objects.filter(fiscal_year=2019).exists()
+    assert not ContractorRollup.objects.filter(fiscal_year=2019).exists()
+    assert not FiscalYearRollup.objects.filter(fiscal_year=2019).exists()
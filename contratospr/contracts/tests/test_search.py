@@ -0,0 +1,161 @@
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..models import Contract, Contractor, Entity, PendingIndex
+from ..search import (
+    claim_index_batch,
+    drain_index_queue,
+    get_search_backend,
+    index_contract,
+    queue_contract_index,
+    search_contract_ids,
+    search_contract_results,
+    search_contracts,
+)
+from ..search_backends import SQLiteSearchBackend
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def create_contract():
+    """Returns a factory for saved contracts with an entity and a contractor"""
+
+    def _create_contract(number="T1", source_id=1, contractor_name="Test Contractor"):
+        date_of_grant = timezone.make_aware(datetime.datetime(2019, 8, 1))
+        entity, _ = Entity.objects.get_or_create(
+            source_id=1, defaults={"name": "Departamento de Salud"}
+        )
+        contract = Contract.objects.create(
+            entity=entity,
+            source_id=source_id,
+            number=number,
+            date_of_grant=date_of_grant,
+            effective_date_from=date_of_grant,
+            effective_date_to=date_of_grant,
+            amount_to_pay=1000,
+            has_amendments=False,
+        )
+        contractor = Contractor.objects.create(
+            name=contractor_name, source_id=source_id
+        )
+        contract.contractors.add(contractor)
+        return contract
+
+    return _create_contract
+
+
+@pytest.mark.django_db
+class TestSQLiteSearchBackend:
+    def test_backend_detected_from_database(self):
+        assert isinstance(get_search_backend(), SQLiteSearchBackend)
+
+    def test_search_indexed_contracts(self, create_contract):
+        hospital = create_contract(contractor_name="Hospital Municipal")
+        school = create_contract(
+            number="T2", source_id=2, contractor_name="Escuela Superior"
+        )
+
+        for contract in (hospital, school):
+            index_contract(contract)
+
+        assert list(search_contracts("hospital", None, None)) == [hospital]
+        assert set(search_contracts("salud", None, None)) == {hospital, school}
+        assert list(search_contracts("hospital escuela", None, None)) == []
+
+    def test_search_ignores_query_syntax(self, create_contract):
+        contract = create_contract(contractor_name="Hospital Municipal")
+        index_contract(contract)
+
+        assert list(search_contracts('hospital" * (', None, None)) == [contract]
+        assert list(search_contracts("*", None, None)) == []
+
+    def test_reindex_replaces_document(self, create_contract):
+        contract = create_contract(contractor_name="Hospital Municipal")
+        index_contract(contract)
+
+        contract.contractors.update(name="Escuela Superior")
+        index_contract(contract)
+
+        assert list(search_contracts("hospital", None, None)) == []
+        assert list(search_contracts("escuela", None, None)) == [contract]
+
+    def test_normalized_queries_share_cached_results(
+        self, create_contract, django_assert_num_queries
+    ):
+        contract = create_contract(contractor_name="Hospital Municipal")
+        index_contract(contract)
+
+        assert search_contract_ids("Hospital  Municipal") == [contract.pk]
+
+        with django_assert_num_queries(0):
+            assert search_contract_ids("municipal HOSPITAL ") == [contract.pk]
+            assert search_contract_ids("hóspital, municipal") == [contract.pk]
+
+    def test_search_contract_ids_limit(self, create_contract, settings):
+        settings.API_SEARCH_CACHE_MAX_RESULTS = 1
+
+        for source_id in (1, 2):
+            index_contract(create_contract(number="T1", source_id=source_id))
+
+        assert search_contract_ids("T1") is None
+
+    def test_search_results_over_limit_cached(
+        self, create_contract, settings, django_assert_num_queries
+    ):
+        settings.API_SEARCH_CACHE_MAX_RESULTS = 1
+        contracts = [
+            create_contract(number="T1", source_id=source_id) for source_id in (1, 2)
+        ]
+
+        for contract in contracts:
+            index_contract(contract)
+
+        results = search_contract_results("T1", "pk")
+        assert results.ids == [contracts[0].pk]
+        assert results.count == 2
+        assert not results.complete
+
+        with django_assert_num_queries(0):
+            assert search_contract_results("t1", "pk") == results
+
+
+@pytest.mark.django_db
+class TestIndexQueue:
+    def test_queue_deduplicates_contracts(self, create_contract):
+        contract = create_contract()
+
+        queue_contract_index([contract])
+        queue_contract_index([contract, contract])
+
+        assert PendingIndex.objects.count() == 1
+
+    def test_drain_indexes_each_contract_once(self, create_contract):
+        hospital = create_contract(contractor_name="Hospital Municipal")
+        school = create_contract(
+            number="T2", source_id=2, contractor_name="Escuela Superior"
+        )
+        queue_contract_index([hospital, school, hospital])
+
+        assert list(search_contracts("hospital", None, None)) == []
+        assert drain_index_queue(batch_size=1) == 2
+        assert PendingIndex.objects.count() == 0
+        assert list(search_contracts("hospital", None, None)) == [hospital]
+
+    def test_claim_takes_oldest_contracts_off_queue(self, create_contract):
+        hospital = create_contract(contractor_name="Hospital Municipal")
+        school = create_contract(
+            number="T2", source_id=2, contractor_name="Escuela Superior"
+        )
+        queue_contract_index([hospital])
+        queue_contract_index([school])
+
+        assert claim_index_batch(1) == [hospital.pk]
+        assert claim_index_batch(1) == [school.pk]
+        assert claim_index_batch(1) == []
@@ -0,0 +1,132 @@
+import datetime
+from unittest import mock
+
+import pyarrow.parquet as pq
+import pytest
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from ..models import Contract, Contractor, Entity, Service, ServiceGroup
+from ..snapshots import get_manifest, publish_snapshots
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path):
+    storage = FileSystemStorage(location=str(tmp_path))
+
+    with mock.patch("contratospr.contracts.snapshots.document_storage", storage):
+        yield storage
+
+
+def create_contract(source_id, effective_date_from):
+    effective_date_from = timezone.make_aware(effective_date_from)
+    entity, _ = Entity.objects.get_or_create(source_id=1, defaults={"name": "Salud"})
+    group, _ = ServiceGroup.objects.get_or_create(name="Servicios Profesionales")
+    service, _ = Service.objects.get_or_create(name="Consultoría", group=group)
+    contract = Contract.objects.create(
+        entity=entity,
+        service=service,
+        source_id=source_id,
+        number=f"T{source_id}",
+        date_of_grant=effective_date_from,
+        effective_date_from=effective_date_from,
+        effective_date_to=effective_date_from,
+        amount_to_pay="1234.50",
+        has_amendments=False,
+    )
+    contractor = Contractor.objects.create(
+        name=f"Contractor {source_id}", source_id=source_id
+    )
+    contract.contractors.add(contractor)
+    return contract
+
+
+def read_partition(storage, table, fiscal_year):
+    path = storage.path(f"snapshots/{table}/fiscal_year={fiscal_year}/{table}.parquet")
+    return pq.read_table(path).to_pylist()
+
+
+@pytest.mark.django_db
+def test_publish_snapshots(storage):
+    first = create_contract(1, datetime.datetime(2019, 8, 1))
+    second = create_contract(2, datetime.datetime(2020, 6, 30))
+    third = create_contract(3, datetime.datetime(2020, 7, 1))
+
+    updated = publish_snapshots()
+
+    assert updated["contracts"] == ["2020", "2021"]
+    assert set(updated) == {
+        "contracts",
+        "contract_contractors",
+        "contractors",
+        "entities",
+        "services",
+    }
+
+    rows = read_partition(storage, "contracts", 2020)
+    assert [row["id"] for row in rows] == [first.pk, second.pk]
+    assert str(rows[0]["amount_to_pay"]) == "1234.50"
+
+    rows = read_partition(storage, "contract_contractors", 2021)
+    assert rows == [
+        {"contract_id": third.pk, "contractor_id": third.contractors.get().pk}
+    ]
+
+    rows = pq.read_table(storage.path("snapshots/services.parquet")).to_pylist()
+    assert rows[0]["group_name"] == "Servicios Profesionales"
+
+    manifest = get_manifest()
+    assert manifest["tables"]["contracts"]["partitions"]["2021"]["rows"] == 1
+    assert manifest["tables"]["contractors"]["rows"] == 3
+
+
+@pytest.mark.django_db
+def test_publish_snapshots_incremental(storage):
+    create_contract(1, datetime.datetime(2019, 8, 1))
+    second = create_contract(2, datetime.datetime(2020, 7, 1))
+    publish_snapshots()
+
+    assert publish_snapshots() == {}
+
+    second.amount_to_pay = 10
+    second.save()
+    updated = publish_snapshots()
+
+    assert updated == {"contracts": ["2021"], "contract_contractors": ["2021"]}
+
+    second.delete()
+    updated = publish_snapshots()
+
+    assert updated["contracts"] == ["2021"]
+    assert not storage.exists("snapshots/contracts/fiscal_year=2021/contracts.parquet")
+    assert "2021" not in get_manifest()["tables"]["contracts"]["partitions"]
+
+
+@pytest.mark.django_db
+def test_publish_snapshots_contractors_replaced(storage):
+    contract = create_contract(1, datetime.datetime(2020, 7, 1))
+    publish_snapshots()
+
+    contractor = Contractor.objects.create(name="Contractor 2", source_id=2)
+    contract.contractors.set([contractor])
+    updated = publish_snapshots()
+
+    assert updated["contract_contractors"] == ["2021"]
+    assert read_partition(storage, "contract_contractors", 2021) == [
+        {"contract_id": contract.pk, "contractor_id": contractor.pk}
+    ]
+
+
+@pytest.mark.django_db
+def test_publish_snapshots_service_group_renamed(storage):
+    create_contract(1, datetime.datetime(2020, 7, 1))
+    publish_snapshots()
+
+    group = ServiceGroup.objects.get()
+    group.name = "Servicios Legales"
+    group.save()
+    updated = publish_snapshots()
+
+    assert updated == {"services": []}
+    rows = pq.read_table(storage.path("snapshots/services.parquet")).to_pylist()
+    assert rows[0]["group_name"] == "Servicios Legales"
@@ -1,6 +1,8 @@
 import datetime
 from collections import defaultdict
 
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import ExtractYear
 from django.utils import timezone
 
 
@@ -23,6 +25,20 @@ def get_fiscal_year_range(fiscal_year):
     return start_date, end_date
 
 
+def get_fiscal_year(value):
+    value = timezone.localtime(value)
+    return value.year + 1 if value.month >= 7 else value.year
+
+
+def get_fiscal_year_expression(field_name):
+    # Fiscal years run from July 1st through June 30th of the following year
+    return ExtractYear(field_name) + Case(
+        When(**{f"{field_name}__month__gte": 7}, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
 def get_chart_data(contracts):
     chart_data = []
     chart_data_groups = defaultdict(list)
@@ -0,0 +1,85 @@
+import time
+
+from django.core.cache import cache
+
+DATA_VERSION_PREFIX = "data.version"
+
+CONTRACTS = "contracts"
+CONTRACTORS = "contractors"
+ENTITIES = "entities"
+SERVICES = "services"
+DOCUMENTS = "documents"
+COLLECTIONS = "collections"
+SEARCH = "search"
+CHANGES = "changes"
+ROLLUPS = "rollups"
+
+DATA_RESOURCES = [
+    CONTRACTS,
+    CONTRACTORS,
+    ENTITIES,
+    SERVICES,
+    DOCUMENTS,
+    COLLECTIONS,
+    SEARCH,
+    CHANGES,
+    ROLLUPS,
+]
+
+MODEL_RESOURCES = {
+    "Contract": CONTRACTS,
+    "Contractor": CONTRACTORS,
+    "Entity": ENTITIES,
+    "Service": SERVICES,
+    "ServiceGroup": SERVICES,
+    "Document": DOCUMENTS,
+    "CollectionJob": COLLECTIONS,
+    "CollectionArtifact": COLLECTIONS,
+}
+
+
+def get_data_version_key(resource):
+    return f"{DATA_VERSION_PREFIX}.{resource}"
+
+
+def get_data_version(resources):
+    """
+    Return the time the data of any of `resources` last changed, as a
+    timestamp.
+
+    Versions that aren't known yet, for example after the cache was flushed,
+    start at the current time so that clients never keep stale data.
+    """
+    keys = [get_data_version_key(resource) for resource in resources]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+
+    if missing:
+        now = time.time()
+
+        for key in missing:
+            cache.add(key, now, None)
+
+        added = cache.get_many(missing)
+        versions.update({key: added.get(key, now) for key in missing})
+
+    return max(versions.values())
+
+
+def bump_data_version(resources):
+    now = time.time()
+    cache.set_many(
+        {get_data_version_key(resource): now for resource in resources}, None
+    )
+
+
+def bump_model_data_version(sender, **kwargs):
+    resource = MODEL_RESOURCES.get(sender._meta.object_name)
+
+    if resource:
+        bump_data_version([resource])
+
+
+def bump_contractors_data_version(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_data_version([CONTRACTS, CONTRACTORS])
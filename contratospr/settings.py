@@ -10,6 +10,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 import logging.config
 import os
 
+import dj_database_url
 import structlog
 from configurations import Configuration, values
 
@@ -79,6 +80,7 @@ class Common(Configuration):
 
     MIDDLEWARE = [
         "django.middleware.security.SecurityMiddleware",
+        "contratospr.utils.compression.CompressionMiddleware",
         "corsheaders.middleware.CorsMiddleware",
         "whitenoise.middleware.WhiteNoiseMiddleware",
         "django.contrib.sessions.middleware.SessionMiddleware",
@@ -114,6 +116,11 @@ class Common(Configuration):
     DATABASES = values.DatabaseURLValue(
         "sqlite:///{}".format(os.path.join(BASE_DIR, "db.sqlite3"))
     )
+    # Read replicas of the default database for API reads, as database URLs
+    DATABASE_REPLICA_URLS = values.ListValue([], environ_prefix=None)
+    # Replicas further behind the primary than this, in seconds, aren't used
+    DATABASE_REPLICA_MAX_LAG = values.FloatValue(30, environ_prefix=None)
+    DATABASE_ROUTERS = ["contratospr.utils.routers.ReplicaRouter"]
 
     # Password validation
     # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -159,14 +166,41 @@ class Common(Configuration):
 
     CONTRACTS_DOCUMENT_STORAGE = "django.core.files.storage.FileSystemStorage"
 
+    # Detected from the database vendor when not set
+    CONTRACTS_SEARCH_BACKEND = None
+
     REST_FRAMEWORK = {
         "DEFAULT_PAGINATION_CLASS": "contratospr.api.pagination.PageNumberPagination",
+        "DEFAULT_RENDERER_CLASSES": (
+            "contratospr.api.renderers.ORJSONRenderer",
+            "rest_framework.renderers.BrowsableAPIRenderer",
+        ),
         "DEFAULT_THROTTLE_CLASSES": ("rest_framework.throttling.AnonRateThrottle",),
         "DEFAULT_THROTTLE_RATES": {"anon": "5000/hour"},
         "COERCE_DECIMAL_TO_STRING": False,
     }
 
-    API_CACHE_TIMEOUT = values.IntegerValue(60 * 60 * 24, environ_prefix=None)
+    # Cache keys include the version of the data they depend on, so entries
+    # can live long and are replaced as soon as the data changes.
+    API_CACHE_TIMEOUT = values.IntegerValue(60 * 60 * 24 * 14, environ_prefix=None)
+    API_CACHE_LOCK_TIMEOUT = values.IntegerValue(60, environ_prefix=None)
+    API_CACHE_LOCK_WAIT = values.FloatValue(5, environ_prefix=None)
+    # Scheme and host of the public API, e.g. https://api.contratospr.com, so
+    # warmed responses are cached under the keys clients request
+    API_CACHE_WARMING_URL = values.Value(None, environ_prefix=None)
+    # Threads, each with its own database connection, that views use to run
+    # independent queries at the same time. 1 runs them one after another.
+    QUERY_CONCURRENCY = values.IntegerValue(4, environ_prefix=None)
+    # Seconds those threads keep their connections open between calls.
+    # Requests keep the CONN_MAX_AGE of DATABASE_URL.
+    QUERY_CONN_MAX_AGE = values.IntegerValue(600, environ_prefix=None)
+    API_SEARCH_CACHE_MAX_RESULTS = values.IntegerValue(5000, environ_prefix=None)
+    # Paginated lists report the planner's estimate above this many rows
+    API_COUNT_ESTIMATE_THRESHOLD = values.IntegerValue(100_000, environ_prefix=None)
+    # Seconds estimated counts are cached, as they don't follow data versions
+    API_COUNT_ESTIMATE_TIMEOUT = values.IntegerValue(60 * 10, environ_prefix=None)
+    # Days the changes feed keeps. Clients polling less often must resync.
+    CHANGES_RETENTION_DAYS = values.IntegerValue(90, environ_prefix=None)
 
     @property
     def CELERY_BROKER_URL(self):
@@ -188,6 +222,20 @@ class Common(Configuration):
 
     CORS_ORIGIN_ALLOW_ALL = True
 
+    @classmethod
+    def setup(cls):
+        super().setup()
+
+        # Replicas are added as `replica1`, `replica2`, and so on
+        cls.DATABASE_REPLICAS = []
+
+        for index, url in enumerate(cls.DATABASE_REPLICA_URLS, start=1):
+            alias = f"replica{index}"
+            cls.DATABASES[alias] = dict(
+                dj_database_url.parse(url), TEST={"MIRROR": "default"}
+            )
+            cls.DATABASE_REPLICAS.append(alias)
+
 
 class Development(Common):
     """
@@ -234,7 +282,10 @@ class Production(Common):
             "default": {
                 "BACKEND": "django_redis.cache.RedisCache",
                 "LOCATION": f"{self.REDIS_URL}/1",
-                "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+                "OPTIONS": {
+                    "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                    "COMPRESSOR": "django_redis.compressors.zlib.ZlibCompressor",
+                },
             }
         }
 
@@ -255,6 +306,9 @@ class Testing(Common):
     CELERY_TASK_ALWAYS_EAGER = True
     CELERY_TASK_EAGER_PROPAGATES = True
 
+    # Test databases aren't shared between connections
+    QUERY_CONCURRENCY = 1
+
     SECRET_KEY = "dont-tell-eve"
     AWS_ACCESS_KEY_ID = ""
     AWS_S3_BUCKET_NAME = "pdfs.contratospr.com"
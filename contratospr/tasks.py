@@ -29,5 +29,32 @@ app.conf.beat_schedule = {
     "collect-data": {
         "task": "contratospr.contracts.tasks.collect_data",
         "schedule": crontab(minute="0", hour="0", day_of_month="1"),
-    }
+    },
+    # Reindex contracts touched since the last run, at most once per window
+    "index-pending-contracts": {
+        "task": "contratospr.contracts.tasks.index_pending_contracts",
+        "schedule": crontab(minute="*/5"),
+    },
+    # Recompute contractor, entity and service totals, which scraping only
+    # refreshes for the rows it touches
+    "update-contract-totals": {
+        "task": "contratospr.contracts.tasks.update_contract_totals",
+        "schedule": crontab(minute="30", hour="3"),
+    },
+    # Rebuild every fiscal year's rollups, including years that collection
+    # jobs didn't touch but contracts moved out of
+    "update-rollups": {
+        "task": "contratospr.contracts.tasks.update_rollups",
+        "schedule": crontab(minute="45", hour="3"),
+    },
+    # Publish Parquet snapshots of whatever changed since the last ones
+    "update-snapshots": {
+        "task": "contratospr.contracts.tasks.update_snapshots",
+        "schedule": crontab(minute="0", hour="4"),
+    },
+    # Drop changes older than the feed's retention period
+    "delete-old-changes": {
+        "task": "contratospr.contracts.tasks.delete_old_changes",
+        "schedule": crontab(minute="15", hour="4"),
+    },
 }
@@ -0,0 +1 @@
+default_app_config = "contratospr.utils.apps.UtilsConfig"
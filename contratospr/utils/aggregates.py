@@ -6,3 +6,38 @@ class Median(Aggregate):
     name = "median"
     output_field = FloatField()
     template = "%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)"
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template="MEDIAN(%(expressions)s)", **extra_context
+        )
+
+
+class SQLiteMedian:
+    """
+    Python implementation of the MEDIAN() aggregate for SQLite connections.
+    """
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(float(value))
+
+    def finalize(self):
+        if not self.values:
+            return None
+
+        values = sorted(self.values)
+        middle = len(values) // 2
+
+        if len(values) % 2:
+            return values[middle]
+
+        return (values[middle - 1] + values[middle]) / 2
+
+
+def register_sqlite_aggregates(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        connection.connection.create_aggregate("MEDIAN", 1, SQLiteMedian)
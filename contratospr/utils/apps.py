@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class UtilsConfig(AppConfig):
+    name = "contratospr.utils"
+
+    def ready(self):
+        from .aggregates import register_sqlite_aggregates
+
+        connection_created.connect(register_sqlite_aggregates)
@@ -0,0 +1,122 @@
+import re
+
+import brotli
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESS_LENGTH = 200
+
+BROTLI_QUALITY = 6
+
+# Encodings in order of preference, from smallest output
+CONTENT_ENCODINGS = {
+    "br": lambda content: brotli.compress(content, quality=BROTLI_QUALITY),
+    "gzip": compress_string,
+}
+
+re_accept_encoding = re.compile(r"^\s*([\w*]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$")
+
+
+def parse_accept_encoding(value):
+    """
+    Return the quality of each encoding listed in an Accept-Encoding header,
+    including those refused with a quality of zero.
+    """
+    accepted = {}
+
+    for part in (value or "").split(","):
+        match = re_accept_encoding.match(part)
+
+        if not match:
+            continue
+
+        encoding, quality = match.groups()
+
+        try:
+            quality = 1.0 if quality is None else float(quality)
+        except ValueError:
+            continue
+
+        accepted[encoding.lower()] = quality
+
+    return accepted
+
+
+def get_content_encoding(request, available=CONTENT_ENCODINGS):
+    """
+    Return the available encoding with the highest quality in the request's
+    Accept-Encoding header, preferring the first one on ties. Encodings that
+    aren't listed get the quality of `*`, if any.
+    """
+    accepted = parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING"))
+    default = accepted.get("*", 0)
+    best, best_quality = None, 0
+
+    for encoding in available:
+        quality = accepted.get(encoding, default)
+
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+
+    return best
+
+
+def compress_variants(content):
+    """
+    Return the content compressed with every supported encoding, or an empty
+    dict when it's too small to be worth it.
+    """
+    if len(content) < MIN_COMPRESS_LENGTH:
+        return {}
+
+    variants = {}
+
+    for encoding, compress in CONTENT_ENCODINGS.items():
+        compressed = compress(content)
+
+        if len(compressed) < len(content):
+            variants[encoding] = compressed
+
+    return variants
+
+
+def set_compressed_content(response, content, encoding):
+    response.content = content
+    response["Content-Length"] = str(len(content))
+    response["Content-Encoding"] = encoding
+
+    # Like GZipMiddleware, the representations are only semantically equal
+    if response.has_header("ETag"):
+        response["ETag"] = re.sub(r'^"', 'W/"', response["ETag"])
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with brotli or gzip, depending on what the client
+    accepts. Responses that are already encoded, like precompressed cached
+    responses, are left as they are.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or len(response.content) < MIN_COMPRESS_LENGTH:
+            return response
+
+        if response.has_header("Content-Encoding"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = get_content_encoding(request)
+
+        if encoding is None:
+            return response
+
+        compressed = CONTENT_ENCODINGS[encoding](response.content)
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        set_compressed_content(response, compressed, encoding)
+        return response
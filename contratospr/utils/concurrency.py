@@ -0,0 +1,91 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def keep_worker_connections():
+    """
+    Keep the database connections of the calling worker thread open between
+    calls for QUERY_CONN_MAX_AGE seconds. Connections are per thread, so
+    those of requests and other threads are left alone.
+    """
+    for conn in connections.all():
+        conn.settings_dict = dict(
+            conn.settings_dict, CONN_MAX_AGE=settings.QUERY_CONN_MAX_AGE
+        )
+
+
+def close_worker_connections(executor, workers):
+    """
+    Shut down `executor`, closing the database connections of its threads
+    once they finish their running calls.
+    """
+    # Each thread waits for the others, so that every one takes a call
+    barrier = threading.Barrier(workers)
+
+    def close_connections():
+        barrier.wait()
+        connections.close_all()
+
+    for _ in range(workers):
+        executor.submit(close_connections)
+
+    executor.shutdown(wait=False)
+
+
+def get_executor():
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        # Replaced when QUERY_CONCURRENCY changes, letting running calls finish
+        if _executor is None or _executor_workers != settings.QUERY_CONCURRENCY:
+            if _executor is not None:
+                close_worker_connections(_executor, _executor_workers)
+
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.QUERY_CONCURRENCY,
+                thread_name_prefix="contratospr-queries",
+                initializer=keep_worker_connections,
+            )
+            _executor_workers = settings.QUERY_CONCURRENCY
+
+    return _executor
+
+
+def run_in_worker(func):
+    # Each worker thread has its own database connection, which is reused
+    # across calls until QUERY_CONN_MAX_AGE, or replaced after errors
+    close_old_connections()
+
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+def run_concurrently(*funcs):
+    """
+    Call independent functions that query the database at the same time, on
+    a fixed pool of threads so that the number of connections is bounded.
+    Returns their results in order.
+
+    Functions run one after another when concurrency is disabled, or inside
+    a transaction, whose uncommitted data other connections can't see.
+    """
+    if settings.QUERY_CONCURRENCY <= 1 or connection.in_atomic_block:
+        return [func() for func in funcs]
+
+    # Context variables, like the database routing of the request, carry over
+    executor = get_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, run_in_worker, func)
+        for func in funcs
+    ]
+    return [future.result() for future in futures]
@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds a replica's lag measurement is reused for
+REPLICA_LAG_CHECK_INTERVAL = 10
+
+_replica = ContextVar("replica", default=None)
+_pinned_to_primary = ContextVar("pinned_to_primary", default=False)
+_primary_only = ContextVar("primary_only", default=False)
+
+_replica_lag = {}
+_replica_lag_lock = threading.Lock()
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """
+    Route reads in this context to one replica that isn't lagging behind,
+    until something is written, after which reads go to the primary so they
+    see the write. Every read sees the same replica, even from other threads
+    that copy the context.
+    """
+    replica = None
+
+    if enabled and not _primary_only.get():
+        replicas = get_available_replicas()
+        replica = random.choice(replicas) if replicas else None
+
+    replica_token = _replica.set(replica)
+    pinned_token = _pinned_to_primary.set(False)
+
+    try:
+        yield
+    finally:
+        _replica.reset(replica_token)
+        _pinned_to_primary.reset(pinned_token)
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary in this context, including in `use_replica()`
+    contexts within it, like the views a task renders.
+    """
+    token = _primary_only.set(True)
+
+    try:
+        with use_replica(False):
+            yield
+    finally:
+        _primary_only.reset(token)
+
+
+def get_read_replica():
+    if _pinned_to_primary.get():
+        return None
+
+    return _replica.get()
+
+
+def may_read_stale_data(version):
+    """
+    Whether reads in this context could come from a replica that hasn't
+    replayed changes made at the data `version` timestamp yet. Results read
+    then shouldn't be cached under that version.
+    """
+    replica = get_read_replica()
+
+    if replica is None or version is None:
+        return False
+
+    return version > get_replica_replayed_until(replica)
+
+
+def measure_replica_lag(alias):
+    connection = connections[alias]
+
+    if connection.vendor != "postgresql":
+        return 0
+
+    # The WAL functions were renamed in PostgreSQL 10
+    if connection.pg_version >= 100000:
+        receive, replay = "pg_last_wal_receive_lsn", "pg_last_wal_replay_lsn"
+    else:
+        receive, replay = (
+            "pg_last_xlog_receive_location",
+            "pg_last_xlog_replay_location",
+        )
+
+    # A replica that replayed everything it received isn't behind, even if
+    # its last transaction is old because nothing was written since
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT CASE
+              WHEN {receive}() = {replay}() THEN 0
+              ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+            END
+            """
+        )
+        (lag,) = cursor.fetchone()
+
+    return float(lag or 0)
+
+
+def check_replica(alias):
+    """
+    Return how far behind the primary a replica is, in seconds, and the time
+    up to which it had replayed changes, measured at most once per
+    `REPLICA_LAG_CHECK_INTERVAL`. Replicas that can't be reached count as
+    infinitely behind.
+    """
+    now = time.monotonic()
+
+    with _replica_lag_lock:
+        checked_at, lag, replayed_until = _replica_lag.get(alias, (None, 0, None))
+
+        if checked_at is not None and now - checked_at < REPLICA_LAG_CHECK_INTERVAL:
+            return lag, replayed_until
+
+        # Other threads keep using the previous measurement meanwhile. Before
+        # the first one, nothing is known to be replayed.
+        _replica_lag[alias] = (now, lag, replayed_until or float("-inf"))
+
+    measured_at = time.time()
+
+    try:
+        lag = measure_replica_lag(alias)
+    except DatabaseError:
+        logger.warning("Replica unavailable", alias=alias, exc_info=True)
+        lag = float("inf")
+
+    replayed_until = measured_at - lag
+
+    with _replica_lag_lock:
+        _replica_lag[alias] = (now, lag, replayed_until)
+
+    return lag, replayed_until
+
+
+def get_replica_lag(alias):
+    lag, _ = check_replica(alias)
+    return lag
+
+
+def get_replica_replayed_until(alias):
+    _, replayed_until = check_replica(alias)
+    return replayed_until
+
+
+def get_available_replicas():
+    return [
+        alias
+        for alias in settings.DATABASE_REPLICAS
+        if get_replica_lag(alias) <= settings.DATABASE_REPLICA_MAX_LAG
+    ]
+
+
+class ReplicaRouter:
+    """
+    Send reads made within `use_replica()` to the replica picked for it, and
+    everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_read_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if _replica.get() is not None:
+            _pinned_to_primary.set(True)
+
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS